@@ -25,7 +25,7 @@ def make_dist_dir():
     os.mkdir(DIST_DIR)
 
 def copy_files():
-    PYFILES = ['batch_locator.py', 'cmdline.py', 'consume_batch.py', 'post_process.py', 'unit_convert.py']
+    PYFILES = ['batch_locator.py', 'binary_results.py', 'cmdline.py', 'consume_batch.py', 'csv_writer.py', 'post_process.py', 'unit_convert.py']
     for f in PYFILES:
         shutil.copyfile(f, '{}/{}'.format(DIST_DIR, f))
     for f in glob.glob('output*.csv'):
@@ -0,0 +1,277 @@
+''' ---------------------------------------------------------------------------
+Binary (columnar) batch results.
+
+consume_batch.py --format npy|npz writes the output columns (the same
+selected, converted, renamed, and rounded columns as the csv) as .npy arrays,
+one per column, plus a json manifest:
+
+    npy     a directory                 npz     a zip file of the same files
+        consume_results/                    consume_results.npz
+            manifest.json
+            c000.npy
+            c001.npy
+            c001_nulls.npy
+            ...
+
+The manifest lists the columns in output order with their file names:
+
+    {"format": 1, "rows": 1000, "columns": [
+        {"name": "fuelbeds", "file": "c000.npy", "kind": "str", "nulls": ...},
+        {"name": "c_total", "file": "c001.npy", "kind": "num"}, ...]}
+
+Numeric columns keep their dtype. Text columns are fixed width unicode arrays
+with missing values stored as '' plus a boolean nulls array, so nothing is
+pickled. npy columns can be memory mapped; npz is compressed and is read a
+column at a time. BinaryResults reads either one.
+
+BinaryWriter takes the columns a block of rows at a time. Numeric blocks are
+spooled to disk as they arrive, so memory use is bounded by the block size
+(and the text columns, which are held until the end).
+---------------------------------------------------------------------------- '''
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+BINARY_FORMATS = ['npy', 'npz']
+
+def output_path(outfile, output_format):
+    ''' The results file name for a format, e.g. consume_results.csv becomes the
+        directory consume_results or consume_results.npz. Other names are kept.
+    '''
+    name, ext = os.path.splitext(outfile)
+    if '.csv' != ext.lower():
+        return outfile
+    return name + ('.npz' if 'npz' == output_format else '')
+
+def is_binary_results(path):
+    ''' True for a results directory or npz file written by BinaryWriter '''
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, MANIFEST_FILE))
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            return MANIFEST_FILE in zf.namelist()
+    return False
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+def _numeric(values):
+    ''' values as an array if they are numeric, otherwise None '''
+    array = values if isinstance(values, np.ndarray) else np.asarray(values)
+    return array if array.dtype.kind in 'biuf' else None
+
+
+class BinaryWriter(object):
+    ''' Write results columns, a list of (name, values) tuples, a block of rows at
+        a time. The output is assembled when the writer is closed; until then
+        it is built in a temporary directory next to outfile.
+    '''
+    def __init__(self, outfile, output_format):
+        assert output_format in BINARY_FORMATS, "Error: unknown binary format '{}'".format(output_format)
+        self.outfile = outfile
+        self.output_format = output_format
+        self.rows = 0
+        self._columns = None
+        self._tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(outfile) + '.',
+            dir=os.path.dirname(os.path.abspath(outfile)))
+
+    @property
+    def started(self):
+        return self._columns is not None
+
+    def write(self, columns):
+        if self._columns is None:
+            self._columns = [{'name': name, 'file': 'c{:03d}.npy'.format(i), 'kind': 'num', 'dtype': None}
+                for i, (name, values) in enumerate(columns)]
+        assert [col['name'] for col in self._columns] == [name for name, values in columns], \
+            "Error: the results columns changed between blocks"
+        for col, (name, values) in zip(self._columns, columns):
+            array = _numeric(values) if 'num' == col['kind'] else None
+            if array is None:
+                self._append_text(col, values)
+            else:
+                self._append_numeric(col, array)
+        self.rows += len(columns[0][1]) if columns else 0
+
+    def _part(self, col):
+        return os.path.join(self._tmp_dir, col['file'] + '.part')
+
+    def _read_part(self, col):
+        return np.fromfile(self._part(col), dtype=col['dtype']) if col['dtype'] else np.empty(0)
+
+    def _append_numeric(self, col, array):
+        dtype = array.dtype if col['dtype'] is None else np.result_type(col['dtype'], array.dtype)
+        if col['dtype'] is not None and dtype != col['dtype']:
+            # - e.g. an int column that has a NaN in a later block, rewrite what is there
+            self._read_part(col).astype(dtype).tofile(self._part(col))
+        col['dtype'] = dtype
+        with open(self._part(col), 'ab') as part:
+            part.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+    def _append_text(self, col, values):
+        if 'num' == col['kind']:
+            # - numbers in an earlier block, text now: the whole column is text
+            col['text'] = self._read_part(col).tolist()
+            col['kind'] = 'str'
+            if os.path.exists(self._part(col)):
+                os.remove(self._part(col))
+        col['text'].extend(values)
+
+    def _entries(self):
+        ''' (file name, writer) of each file of the output, and the manifest '''
+        manifest = {'format': FORMAT_VERSION, 'rows': self.rows, 'columns': []}
+        entries = []
+        for col in (self._columns or []):
+            item = {'name': col['name'], 'file': col['file'], 'kind': col['kind']}
+            if 'num' == col['kind']:
+                entries.append((col['file'], self._numeric_writer(col)))
+            else:
+                nulls = np.array([_is_null(v) for v in col['text']], dtype=bool)
+                values = np.array(['' if null else str(v) for v, null in zip(col['text'], nulls)], dtype=str)
+                entries.append((col['file'], self._array_writer(values)))
+                if nulls.any():
+                    item['nulls'] = col['file'].replace('.npy', '_nulls.npy')
+                    entries.append((item['nulls'], self._array_writer(nulls)))
+            manifest['columns'].append(item)
+        return entries, manifest
+
+    def _numeric_writer(self, col):
+        def write(outfile):
+            dtype = col['dtype'] if col['dtype'] else np.dtype(float)
+            count = os.path.getsize(self._part(col)) // dtype.itemsize if col['dtype'] else 0
+            np.lib.format.write_array_header_1_0(outfile,
+                {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (count,)})
+            if count:
+                with open(self._part(col), 'rb') as part:
+                    shutil.copyfileobj(part, outfile, 1 << 20)
+        return write
+
+    def _array_writer(self, array):
+        return lambda outfile: np.lib.format.write_array(outfile, array, allow_pickle=False)
+
+    def close(self):
+        ''' Assemble the output, replacing any existing outfile '''
+        try:
+            entries, manifest = self._entries()
+            if 'npy' == self.output_format:
+                result = os.path.join(self._tmp_dir, 'results')
+                os.mkdir(result)
+                for name, write in entries:
+                    with open(os.path.join(result, name), 'wb') as outfile:
+                        write(outfile)
+                with open(os.path.join(result, MANIFEST_FILE), 'w') as outfile:
+                    json.dump(manifest, outfile, indent=1)
+            else:
+                result = os.path.join(self._tmp_dir, 'results.npz')
+                with zipfile.ZipFile(result, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                    for name, write in entries:
+                        with zf.open(name, 'w', force_zip64=True) as outfile:
+                            write(outfile)
+                    zf.writestr(MANIFEST_FILE, json.dumps(manifest, indent=1))
+
+            if os.path.isdir(self.outfile):
+                shutil.rmtree(self.outfile)
+            elif os.path.exists(self.outfile):
+                os.remove(self.outfile)
+            os.rename(result, self.outfile)
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+class BinaryResults(Mapping):
+    ''' Read-only mapping from column name to the column of a binary results
+        directory or npz file. Columns are loaded when they are first asked for;
+        with mmap=True the numeric columns of a directory are memory mapped.
+        take() reads some of the rows of a column; with mmap=True that holds for
+        text columns too, so a large directory can be read a block at a time.
+    '''
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self._mmap = mmap
+        self._zip = None if os.path.isdir(path) else zipfile.ZipFile(path)
+        if self._zip:
+            manifest = json.loads(self._read(MANIFEST_FILE).decode('utf-8'))
+        else:
+            with open(os.path.join(path, MANIFEST_FILE), 'r') as infile:
+                manifest = json.load(infile)
+        assert FORMAT_VERSION == manifest.get('format'), "Error: unsupported results format in '{}'".format(path)
+        self.rows = manifest['rows']
+        self._columns = dict([(col['name'], col) for col in manifest['columns']])
+        self._loaded = {}
+        self._arrays = {}
+
+    def _read(self, name):
+        with self._zip.open(name) as infile:
+            return infile.read()
+
+    def _load(self, name, mmap=False):
+        if self._zip:
+            with self._zip.open(name) as infile:
+                return np.lib.format.read_array(infile, allow_pickle=False)
+        return np.load(os.path.join(self.path, name), mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            col = self._columns[name]
+            if 'num' == col['kind']:
+                data = self._load(col['file'], self._mmap)
+            else:
+                data = self._load(col['file']).astype(object)
+                if col.get('nulls'):
+                    data[self._load(col['nulls'])] = np.nan
+            self._loaded[name] = data
+        return self._loaded[name]
+
+    def _array(self, name):
+        ''' The stored array of a file for take(). A memory map holds a file handle, so
+            maps are opened for each take() rather than kept; loaded arrays are kept.
+        '''
+        if self._mmap and not self._zip:
+            return self._load(name, True)
+        if name not in self._arrays:
+            self._arrays[name] = self._load(name, self._mmap)
+        return self._arrays[name]
+
+    def take(self, name, positions):
+        ''' The values of a column at positions (an index array or a slice) '''
+        col = self._columns[name]
+        data = np.array(self._array(col['file'])[positions])
+        if 'num' != col['kind']:
+            data = data.astype(object)
+            if col.get('nulls'):
+                data[self._array(col['nulls'])[positions]] = np.nan
+        return data
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def to_dataframe(self, columns=None):
+        ''' The columns (all by default) as a DataFrame '''
+        names = list(self._columns) if columns is None else columns
+        return pd.DataFrame(dict([(name, self[name]) for name in names]), columns=names)
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
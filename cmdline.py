@@ -13,6 +13,7 @@ import argparse
 import logging
 
 DEFAULT_OUTPUT = 'output_all.csv'
+OUTPUT_FORMATS = ['csv', 'npy', 'npz']
 
 def safe_sequence(item):
     try:
@@ -28,7 +29,7 @@ def make_parser():
 
     Consume predicts fuel consumption, pollutant emissions, and heat release
     based on input fuel loadings and environmental variables.  This command
-    line interface requires a specified burn type (either activity or natural),
+    line interface requires a specified burn type (activity, natural, or mixed),
     environmental variables input file (csv format), and fuel loadings file
     (generated by FCCS 3.0, csv format), and.  A sample fuel loadings file
     (fuel_loadings.csv) and environmental inputs file (input.csv) have been
@@ -49,9 +50,17 @@ Examples:
     // Specify an alternative loadings file
     consume_batch.exe natural input_natural.csv -f my_loadings.xml
 
+    // Natural and activity rows in one file: the activity columns plus a burn_type
+    // column that is 'natural' or 'activity' for each row
+    python consume_batch.py mixed input_mixed.csv
+
     // Specify a column configuration file. Please see the documentation for details. 
     // note: output_all.csv is the default column configuration file.
-    consume_batch.exe activity input_activity.csv -x output_all.csv'''
+    consume_batch.exe activity input_activity.csv -x output_all.csv
+
+    // Write the output columns as binary .npy arrays (the directory consume_results)
+    // that post_process.py and numpy can read without parsing text
+    python consume_batch.py natural input_natural.csv --format npy'''
 
     # - build the parser
     parser = argparse.ArgumentParser(
@@ -60,7 +69,7 @@ Examples:
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     # - add the positional arguments
-    parser.add_argument('burn_type', metavar='burn type\t(activity | natural)', nargs='?')
+    parser.add_argument('burn_type', metavar='burn type\t(activity | natural | mixed)', nargs='?')
     parser.add_argument('csv_file', metavar='input file\t(csv format)', nargs='?')
 
     # - specify an alternative loadings file
@@ -96,6 +105,21 @@ Examples:
         dest='feps_input_filename', metavar='feps input filename',
         help='Specify the name of the FEPS emissions input file.'
         )
+    # - process the input in blocks of rows to limit memory use
+    parser.add_argument('--chunksize', action='store', nargs=1, dest='chunk_size', metavar='rows',
+        help='Process the input file this many rows at a time, appending each block of results \
+            to the output file. Use for input files too large to process at once.'
+        )
+    # - spread the work over several processes
+    parser.add_argument('--workers', action='store', nargs=1, dest='workers', metavar='processes',
+        help='Split the input rows into blocks and calculate them in this many worker processes. \
+            Results are written in the original row order.'
+        )
+    # - write binary columns instead of csv
+    parser.add_argument('--format', action='store', nargs=1, dest='output_format', metavar='csv | npy | npz',
+        help='Specify the output format. npy writes a directory with one .npy file per output column \
+            and npz writes the same files to a compressed zip file. The default is csv.'
+        )
     return parser
 
 class ConsumeParserException(Exception):
@@ -113,6 +137,9 @@ class ConsumeParser(object):
         self._msg_level = logging.ERROR
         self._do_metric = False
         self._no_sera = False
+        self._chunk_size = None
+        self._workers = 1
+        self._output_format = 'csv'
 
     def do_parse(self, argv):
         parser = make_parser()
@@ -125,8 +152,8 @@ class ConsumeParser(object):
             # - verify burn_type
             if not args.burn_type:
                 raise(ConsumeParserException("\nError: A burn_type is required."))
-            if 'natural' != args.burn_type and 'activity' != args.burn_type:
-                raise(ConsumeParserException("\nError: The burn_type must be 'natural' or 'activity'."))
+            if args.burn_type not in ['natural', 'activity', 'mixed']:
+                raise(ConsumeParserException("\nError: The burn_type must be 'natural', 'activity', or 'mixed'."))
             self._burn_type = args.burn_type
 
             # check for valid input file
@@ -171,6 +198,29 @@ class ConsumeParser(object):
             if args.no_sera:
                 self._no_sera = True
 
+            if args.chunk_size:
+                try:
+                    self._chunk_size = int(args.chunk_size[0])
+                except ValueError:
+                    self._chunk_size = 0
+                if self._chunk_size < 1:
+                    raise(ConsumeParserException("\nError: The chunk size must be a positive number of rows."))
+
+            if args.workers:
+                try:
+                    self._workers = int(args.workers[0])
+                except ValueError:
+                    self._workers = 0
+                if self._workers < 1:
+                    raise(ConsumeParserException("\nError: The number of workers must be a positive number."))
+
+            if args.output_format:
+                self._output_format = args.output_format[0].lower()
+                if self._output_format not in OUTPUT_FORMATS:
+                    raise(ConsumeParserException("\nError: The output format must be 'csv', 'npy', or 'npz'."))
+                if 'csv' != self._output_format and self._col_cfg_file and self._col_cfg_file.lower() in self._special_args:
+                    raise(ConsumeParserException("\nError: The '{}' format needs a column configuration file.".format(self._output_format)))
+
 
     def exists(self, filename):
         return True if os.path.exists(filename) else False
@@ -189,6 +239,12 @@ class ConsumeParser(object):
     def do_metric(self): return self._do_metric
     @property
     def no_sera(self): return self._no_sera
+    @property
+    def chunk_size(self): return self._chunk_size
+    @property
+    def workers(self): return self._workers
+    @property
+    def output_format(self): return self._output_format
 
 
 def main():
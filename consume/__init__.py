@@ -1,5 +1,7 @@
 from . emissions import Emissions
 from . fuel_consumption import FuelConsumption
+from . monte_carlo import MonteCarlo
+from . consume_results import ConsumeResults
 from . data_desc import list_valid_units
 from . data_desc import list_valid_fm_types
 from . data_desc import list_valid_burntypes
@@ -7,6 +9,7 @@ from . data_desc import list_valid_ecoregions
 from . data_desc import list_valid_emissions_species
 from . data_desc import list_valid_combustion_stages
 from . data_desc import list_valid_consumption_strata
+from . data_desc import list_valid_emissions_strata
 from . data_desc import perarea
 from . util_consume import get_version
 
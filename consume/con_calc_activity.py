@@ -417,7 +417,8 @@ def ccon_ffr(fm_duff, ecoregion_masks, LD):
 def calc_and_reduce_ff(LD, ff_reduction, key):
     # if the depth of the layer (LD[key]) is less than the available reduction
     #  use the depth of the layer. Otherwise, use the available reduction
-    layer_reduction = np.where(LD[key] < ff_reduction, LD[key], ff_reduction)
+    depth = values(LD, key)
+    layer_reduction = np.where(depth < ff_reduction, depth, ff_reduction)
     # reduce the available reduction by the calculated amount
     ff_reduction -= layer_reduction
     # should never be less than zero
@@ -425,33 +426,34 @@ def calc_and_reduce_ff(LD, ff_reduction, key):
     assert False == np.isnan(ff_reduction).any(), "Error: NaN found in calc_and_reduce_ff()"
     return layer_reduction
 
-def ccon_forest_floor(LD, ff_reduction, key_depth, key_loading, csd):
+def ccon_forest_floor(LD, ff_reduction, key_depth, key_loading, csd, out=None):
     ''' Same procedure for litter, lichen, moss
     '''
     # - get per-layer reduction
     layer_reduction = calc_and_reduce_ff(LD, ff_reduction, key_depth)
 
     # - how much was it reduced relative to the layer depth
-    proportional_reduction = np.where(LD[key_depth] > 0.0,
-        layer_reduction / LD[key_depth], 0.0)
+    depth = values(LD, key_depth)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportional_reduction = np.where(depth > 0.0, layer_reduction / depth, 0.0)
 
     total = proportional_reduction * values(LD, key_loading)
-    return util.csdist(total, csd)
+    return util.csdist(total, csd, out)
 
 # todo: duplicate, pull into common include file    
 FSR_PROP_BAS_ACC = [0.10, 0.40, 0.50]
 FSR_PROP_SQ_MID = [0.10, 0.30, 0.60]
-def ccon_bas(basal_loading, ff_redux_proportion):
+def ccon_bas(basal_loading, ff_redux_proportion, out=None):
     """ Basal accumulations consumption, activity & natural
     """
     basal_consumption = np.array([])
     basal_consumption = basal_loading * ff_redux_proportion
-    return util.csdist(basal_consumption, FSR_PROP_BAS_ACC)
+    return util.csdist(basal_consumption, FSR_PROP_BAS_ACC, out)
 
-def ccon_sqm(sqm_loading, ff_redux_proportion):
+def ccon_sqm(sqm_loading, ff_redux_proportion, out=None):
     """ Squirrel middens consumption, activity & natural
     """
     csd_sqm = [0.10, 0.30, 0.60]
     sqm_consumption = sqm_loading * ff_redux_proportion
-    return util.csdist(sqm_consumption, FSR_PROP_SQ_MID)
+    return util.csdist(sqm_consumption, FSR_PROP_SQ_MID, out)
 
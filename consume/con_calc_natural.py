@@ -9,7 +9,7 @@ def bracket(load, cons):
 
 
 # Consumption calculation methods
-def ccon_canopy(can_con_pct, LD):
+def ccon_canopy(can_con_pct, LD, out=None):
     pct = can_con_pct / 100.0
     can_params = [['overstory', [0.75, 0.05, 0.0]],
                   ['midstory', [0.80, 0.05, 0.0]],
@@ -21,9 +21,9 @@ def ccon_canopy(can_con_pct, LD):
                   ['snag3', [0.10, 0.20, 0.20]],
                   ['ladder', [0.75, 0.10, 0.0]]]
 
-    return [util.csdist(values(LD, t[0]) * pct, t[1]) for t in can_params]
+    return [util.csdist(values(LD, t[0]) * pct, t[1], util.slot(out, i)) for (i, t) in enumerate(can_params)]
 
-def multi_layer_calc(loadings, ecoregion_masks, primary, secondary, calculator):
+def multi_layer_calc(loadings, ecoregion_masks, primary, secondary, calculator, out=None):
     ''' This function is called by both the shrub and herb calculators. The general tasks are handled
         here, and the specific setup is done in the respective calling functions
     '''
@@ -49,9 +49,12 @@ def multi_layer_calc(loadings, ecoregion_masks, primary, secondary, calculator):
 
         fsr = [0.90, 0.10, 0.0]
 
-        return (util.csdist(primary_total, fsr), util.csdist(secondary_total, fsr))
+        return (util.csdist(primary_total, fsr, util.slot(out, 0)), util.csdist(secondary_total, fsr, util.slot(out, 1)))
     else:
-        hold = util.csdist(np.array([0.0] * len(loadings['fccs_id']), dtype=float), [0.0, 0.0, 0.0])
+        if out is not None:
+            out.fill(0.0)
+            return out[0], out[1]
+        hold = util.csdist(np.zeros(len(total_load), dtype=float), [0.0, 0.0, 0.0])
         return hold, hold
 
 CVT_MGHA_TO_TONS = 0.44609
@@ -66,7 +69,7 @@ def to_tons(mgha):
 SEASON_SPRING = 1
 SEASON_ALL_OTHER = 0
 
-def shrub_calc(shrub_black_pct, loadings, ecoregion_masks, season=SEASON_ALL_OTHER):
+def shrub_calc(shrub_black_pct, loadings, ecoregion_masks, season=SEASON_ALL_OTHER, out=None):
     """ Shrub consumption, western, southern, activity """
     def get_calculator(shrub_black_pct, season):
         class Calculator(object):
@@ -86,9 +89,9 @@ def shrub_calc(shrub_black_pct, loadings, ecoregion_masks, season=SEASON_ALL_OTH
         return Calculator(shrub_black_pct, season)
 
     return multi_layer_calc(loadings, ecoregion_masks,
-                'shrub_prim', 'shrub_seco', get_calculator(shrub_black_pct/100, season))
+                'shrub_prim', 'shrub_seco', get_calculator(shrub_black_pct/100, season), out)
 
-def herb_calc(loadings, ecoregion_masks):
+def herb_calc(loadings, ecoregion_masks, out=None):
     """ Herbaceous consumption, activity & natural, p.169 """
     def get_calculator():
         class Calculator(object):
@@ -100,7 +103,7 @@ def herb_calc(loadings, ecoregion_masks):
             
         return Calculator()
 
-    return multi_layer_calc(loadings, ecoregion_masks, 'nw_prim', 'nw_seco', get_calculator())
+    return multi_layer_calc(loadings, ecoregion_masks, 'nw_prim', 'nw_seco', get_calculator(), out)
 
 
 ###################################################################
@@ -114,7 +117,7 @@ def western_cons_litter(load, fm_duff):
     return 0.6804*load - 0.00312263*fm_duff
 
 FSR_PROP_LITTER = [0.9, 0.1, 0.0]        
-def litter_calc(loadings, fm_duff, fm_1000, ecoregion_masks):
+def litter_calc(loadings, fm_duff, fm_1000, ecoregion_masks, out=None):
     
     load = values(loadings, 'litter_loading')
     cons = np.where(load > 0,
@@ -127,10 +130,10 @@ def litter_calc(loadings, fm_duff, fm_1000, ecoregion_masks):
     with np.errstate(invalid='ignore', divide='ignore'):
         proportion_consumed = np.where(load > 0, cons / load, 0)
     
-    return util.csdist(cons, FSR_PROP_LITTER), proportion_consumed
+    return util.csdist(cons, FSR_PROP_LITTER, out), proportion_consumed
     
 def use_proportional_litter_cons(loadings, fsr_prop,
-        fm_duff, fm_litter, ecoregion_masks, proportional_consumption):
+        fm_duff, fm_litter, ecoregion_masks, proportional_consumption, out=None):
     cons = np.where(loadings > 0,
         np.where(proportional_consumption > 0,
             loadings * proportional_consumption,
@@ -139,17 +142,17 @@ def use_proportional_litter_cons(loadings, fsr_prop,
             western_cons_litter(loadings, fm_duff))),
         0)
     cons = bracket(loadings, cons)
-    return util.csdist(cons, fsr_prop)
+    return util.csdist(cons, fsr_prop, out)
     
-def lichen_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed):
+def lichen_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed, out=None):
     lichen_load = values(loadings, 'lichen_loading')
     return use_proportional_litter_cons(lichen_load,
-            [0.95, 0.05, 0.0], fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed)
+            [0.95, 0.05, 0.0], fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed, out)
     
-def moss_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed):
+def moss_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed, out=None):
     moss_load = values(loadings, 'moss_loading')
     return use_proportional_litter_cons(moss_load,
-            [0.95, 0.05, 0.0], fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed)
+            [0.95, 0.05, 0.0], fm_duff, fm_litter, ecoregion_masks, proportion_litter_consumed, out)
     
 def southern_cons_duff(load, fm_litter):
     # mgha dependent equation: return 2.9711 + load*0.0702 + fm_litter*-0.1715
@@ -159,7 +162,7 @@ def western_cons_duff(load, fm_duff):
     #mgha dependent equation: return 0.6456*load - 0.0969*fm_duff
     return 0.6456*load - 0.0432*fm_duff
 
-def duff_calc(loadings, fm_duff, fm_litter, ecoregion_masks, duff_pct_available):
+def duff_calc(loadings, fm_duff, fm_litter, ecoregion_masks, duff_pct_available, out=None):
     duff_load_total = values(loadings, 'duff_upper_loading') + values(loadings, 'duff_lower_loading')
     
     pct = (duff_pct_available/100.0)
@@ -184,7 +187,8 @@ def duff_calc(loadings, fm_duff, fm_litter, ecoregion_masks, duff_pct_available)
         (cons - values(loadings, 'duff_upper_loading')*(pct)), 0)
     assert(np.all(cons_duff_lower >= 0))
     
-    return util.csdist(cons_duff_upper, [0.1, 0.7, 0.2]), util.csdist(cons_duff_lower, [0, 0.2, 0.8]), proportion_consumed
+    return (util.csdist(cons_duff_upper, [0.1, 0.7, 0.2], util.slot(out, 0)),
+            util.csdist(cons_duff_lower, [0, 0.2, 0.8], util.slot(out, 1)), proportion_consumed)
 
 
 
@@ -196,7 +200,7 @@ FSR_PROP_BAS_ACC = [0.10, 0.40, 0.50]
 FSR_PROP_SQ_MID = [0.10, 0.30, 0.60]
 
 def use_proportional_duff_cons(loadings, fsr_prop,
-        fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption):
+        fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption, out=None):
     cons = np.where(loadings > 0,
         np.where(proportional_duff_consumption > 0,
             loadings * proportional_duff_consumption,
@@ -205,17 +209,17 @@ def use_proportional_duff_cons(loadings, fsr_prop,
             western_cons_duff(loadings, fm_duff))),
         0)
     cons = bracket(loadings, cons)
-    return util.csdist(cons, fsr_prop)
+    return util.csdist(cons, fsr_prop, out)
 
-def basal_accumulation_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption):
+def basal_accumulation_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption, out=None):
     basal_load = values(loadings, 'bas_loading')
     return use_proportional_duff_cons(
-        basal_load, FSR_PROP_BAS_ACC, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption)
+        basal_load, FSR_PROP_BAS_ACC, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption, out)
     
-def squirrel_midden_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption):
+def squirrel_midden_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption, out=None):
     sq_mid_load = values(loadings, 'sqm_loading')
     return use_proportional_duff_cons(
-        sq_mid_load, FSR_PROP_SQ_MID, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption)
+        sq_mid_load, FSR_PROP_SQ_MID, fm_duff, fm_litter, ecoregion_masks, proportional_duff_consumption, out)
 
 
 ##############################
@@ -223,55 +227,55 @@ def squirrel_midden_calc(loadings, fm_duff, fm_litter, ecoregion_masks, proporti
 ##############################
 # p. 169-175 in the manual
 
-def stump_calc(LD):
+def stump_calc(LD, out=None):
     """ STUMP CONSUMPTION - ACTIVITY and NATURAL """
     stump_params = [['stump_sound', 0.10, [0.50, 0.50, 0.0]],
                     ['stump_rotten', 0.50, [0.10, 0.30, 0.60]],
                     ['stump_lightered', 0.50, [0.40, 0.30, 0.30]]]
 
-    return [util.csdist(values(LD, s[0]) * s[1], s[2]) for s in stump_params]
+    return [util.csdist(values(LD, s[0]) * s[1], s[2], util.slot(out, i)) for (i, s) in enumerate(stump_params)]
 
-def pile_calc(pct_consumed, LD):
+def pile_calc(pct_consumed, LD, out=None):
     """  pile loading appears as clean, dirty, and verydirty """
     # Flaming, smoldering, residual
     csd = [0.70, 0.15, 0.15]
     pct = pct_consumed * 0.01
     total_pile_loading = values(LD, 'pile_clean_loading') + values(LD, 'pile_dirty_loading') + values(LD, 'pile_vdirty_loading')
     total_consumed = pct * total_pile_loading
-    return util.csdist(total_consumed, csd)
+    return util.csdist(total_consumed, csd, out)
 
 ### WOODY FUEL CONSUMPTION NATURAL EQUATIONS ###
-def sound_one_calc(loadings, ecos_mask):
+def sound_one_calc(loadings, ecos_mask, out=None):
     """ 1-hr (0 to 1/4"), natural """
     csd = [0.95, 0.05, 0.00]
     total = np.where(
             np.equal(ecos_mask, 1),       # if southern ecoregion,
             values(loadings, 'one_hr_sound') * 0.8259,    # true
             values(loadings, 'one_hr_sound') * 0.8469)    # false
-    return util.csdist(total, csd)
+    return util.csdist(total, csd, out)
 
-def sound_ten_calc(loadings, ecos_mask):
+def sound_ten_calc(loadings, ecos_mask, out=None):
     """ 10-hr (1/4" to 1"), natural, p.169"""
     csd = [0.90, 0.10, 0.00]
     total = np.where(
             np.equal(ecos_mask, 1),       # if southern ecoregion,
             values(loadings, 'ten_hr_sound') * 0.3727,    # true
             values(loadings, 'ten_hr_sound') * 0.8469)    # false
-    return util.csdist(total, csd)
+    return util.csdist(total, csd, out)
 
-def sound_hundred_calc(loadings, ecos_mask):
+def sound_hundred_calc(loadings, ecos_mask, out=None):
     """ 100-hr (1 to 3"), natural """
     csd = [0.85, 0.10, 0.05]
     total = np.where(
             np.equal(ecos_mask, 1),       # if southern ecoregion,
             values(loadings, 'hun_hr_sound') * 0.5725,    # true
             values(loadings, 'hun_hr_sound') * 0.7127)    # false
-    return util.csdist(total, csd)
+    return util.csdist(total, csd, out)
 
 TIMELAG_RATIO_SOUND_WOOD_1K = 0.5    
 TIMELAG_RATIO_SOUND_WOOD_10K = 0.3    
 TIMELAG_RATIO_SOUND_WOOD_10K_PLUS = 0.2    
-def sound_large_wood_calc(loadings, fm_1000, sound_cwd_pct_available):
+def sound_large_wood_calc(loadings, fm_1000, sound_cwd_pct_available, out=None):
     pct = (sound_cwd_pct_available/100.0)
     sound_wood_columns = ['oneK_hr_sound', 'tenK_hr_sound', 'tnkp_hr_sound']
     total_swload = sum([values(loadings, col)*pct for col in sound_wood_columns])
@@ -279,9 +283,9 @@ def sound_large_wood_calc(loadings, fm_1000, sound_cwd_pct_available):
     # mgha dependent: cons_total = 2.735 + 0.3285*total_swload - 0.0457*fm_1000
     cons_total = 1.2201 + 0.3285*total_swload - 0.0203863*fm_1000
     
-    onek_load = loadings['oneK_hr_sound']
-    tenk_load = loadings['tenK_hr_sound']
-    tenk_plus_load = loadings['tnkp_hr_sound']
+    onek_load = values(loadings, 'oneK_hr_sound')
+    tenk_load = values(loadings, 'tenK_hr_sound')
+    tenk_plus_load = values(loadings, 'tnkp_hr_sound')
     
     ideal_onek = onek_load * TIMELAG_RATIO_SOUND_WOOD_1K
     ideal_tenk = tenk_load * TIMELAG_RATIO_SOUND_WOOD_10K
@@ -290,20 +294,21 @@ def sound_large_wood_calc(loadings, fm_1000, sound_cwd_pct_available):
     
     # determine a correction factor based on the relationship of the ideal total to the 
     #  calculated consumption (done on a single loading value)
-    correction = np.where(ideal_sw_total > 0, cons_total/ideal_sw_total, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correction = np.where(ideal_sw_total > 0, cons_total/ideal_sw_total, 0)
     
     one_k_cons = bracket(onek_load, ideal_onek * correction)
     ten_k_cons = bracket(tenk_load, ideal_tenk * correction)
     ten_k_plus_cons = bracket(tenk_plus_load, ideal_tenk_plus * correction)
     
-    return (util.csdist(one_k_cons, [.6, .3, .1]),
-            util.csdist(ten_k_cons, [.4, .4, .2]),
-            util.csdist(ten_k_plus_cons, [.2, .4, .4]))    
+    return (util.csdist(one_k_cons, [.6, .3, .1], util.slot(out, 0)),
+            util.csdist(ten_k_cons, [.4, .4, .2], util.slot(out, 1)),
+            util.csdist(ten_k_plus_cons, [.2, .4, .4], util.slot(out, 2)))    
 
 TIMELAG_RATIO_ROTTEN_WOOD_1K = 0.47    
 TIMELAG_RATIO_ROTTEN_WOOD_10K = 0.33   
 TIMELAG_RATIO_ROTTEN_WOOD_10K_PLUS = 0.2    
-def rotten_large_wood_calc(loadings, fm_1000, rotten_cwd_pct_available):
+def rotten_large_wood_calc(loadings, fm_1000, rotten_cwd_pct_available, out=None):
     pct = (rotten_cwd_pct_available/100.0)
     rotten_wood_columns = ['oneK_hr_rotten', 'tenK_hr_rotten', 'tnkp_hr_rotten']
     total_rload = sum([values(loadings, col)*pct for col in rotten_wood_columns])
@@ -311,9 +316,9 @@ def rotten_large_wood_calc(loadings, fm_1000, rotten_cwd_pct_available):
     # mgha dependent: cons_total = 1.9024 + 0.4933*load - 0.0338*fm_1000
     cons_total =  0.848641616 + 0.4933*total_rload - 0.015077842*fm_1000
     
-    onek_load = loadings['oneK_hr_rotten']
-    tenk_load = loadings['tenK_hr_rotten']
-    tenk_plus_load = loadings['tnkp_hr_rotten']
+    onek_load = values(loadings, 'oneK_hr_rotten')
+    tenk_load = values(loadings, 'tenK_hr_rotten')
+    tenk_plus_load = values(loadings, 'tnkp_hr_rotten')
     
     ideal_onek = onek_load * TIMELAG_RATIO_ROTTEN_WOOD_1K
     ideal_tenk = tenk_load * TIMELAG_RATIO_ROTTEN_WOOD_10K
@@ -322,15 +327,16 @@ def rotten_large_wood_calc(loadings, fm_1000, rotten_cwd_pct_available):
     
     # determine a correction factor based on the relationship of the ideal total to the 
     #  calculated consumption (done on a single loading value)
-    correction = np.where(ideal_rw_total > 0, cons_total/ideal_rw_total, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correction = np.where(ideal_rw_total > 0, cons_total/ideal_rw_total, 0)
     
     one_k_cons = bracket(onek_load, ideal_onek * correction)
     ten_k_cons = bracket(tenk_load, ideal_tenk * correction)
     ten_k_plus_cons = bracket(tenk_plus_load, ideal_tenk_plus * correction)
     
-    return (util.csdist(one_k_cons, [.2, .3, .5]),
-            util.csdist(ten_k_cons, [.1, .3, .6]),
-            util.csdist(ten_k_plus_cons, [.1, .3, .6]))    
+    return (util.csdist(one_k_cons, [.2, .3, .5], util.slot(out, 0)),
+            util.csdist(ten_k_cons, [.1, .3, .6], util.slot(out, 1)),
+            util.csdist(ten_k_plus_cons, [.1, .3, .6], util.slot(out, 2)))    
 
 
 
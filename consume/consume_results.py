@@ -0,0 +1,97 @@
+''' ---------------------------------------------------------------------------
+Columnar access to consumption and emissions results.
+
+results(columnar=True) returns a ConsumeResults instead of the nested
+results dictionary. It holds the calculated arrays as they are:
+
+    cons_data   (strata, phase, rows)           see dd.ConsumptionStrata
+    heat_data   (1, phase, rows)                the total only
+    emis_data   (species, strata, phase, rows)  species in emis_species
+
+and is a read-only mapping from the flattened column names used in
+output_all.csv (e.g. 'consumption_summary_total_flaming',
+'emissions_stratum_co2_canopy_total', 'parameters_area') to the values. A
+value is a view of one row of the arrays, so nothing is copied until it is
+written out. to_dict() builds the legacy nested dictionary. column_keys()
+describes each column as a (category, stratum, phase, species) tuple, e.g.
+so that a caller can work out what has to be calculated for a set of columns.
+---------------------------------------------------------------------------- '''
+from collections.abc import Mapping
+from . import data_desc as dd
+from . import util_consume as util
+
+PHASES = dd.list_valid_combustion_stages()
+_STRATUM_INDEX = dict([(stratum, i) for i, stratum in enumerate(dd.ConsumptionStrata)])
+
+def _name(*parts):
+    return '_'.join(parts).replace(' ', '_')
+
+def column_keys(parameters=(), emis_species=dd.EmissionsSpecies, emis_strata='first-order'):
+    ''' The flattened column names of results, each mapped to what it holds as a
+        (category, stratum, phase, species) tuple:
+            consumption                 ('canopy', 'overstory', 'flaming', None)
+            emissions                   ('summary', 'total', 'flaming', 'co2')
+            1st-order strata emissions  ('summary', 'canopy', 'flaming', 'co2')
+            heat release                ('heat release', 'total', 'flaming', None)
+            parameters                  ('parameters', 'area', None, None)
+    '''
+    columns = {}
+    for key in parameters:
+        columns[_name('parameters', key)] = ('parameters', key, None, None)
+    for phase in PHASES:
+        columns[_name('heat release', phase)] = ('heat release', 'total', phase, None)
+    for category, stratum in dd.ConsumptionStrata:
+        for phase in PHASES:
+            columns[_name('consumption', category, stratum, phase)] = (category, stratum, phase, None)
+    for species in emis_species:
+        for phase in PHASES:
+            columns[_name('emissions', species, phase)] = ('summary', 'total', phase, species)
+    if dd.EmissionsStrataCount[emis_strata] >= dd.EmissionsStrataCount['first-order']:
+        for species in emis_species:
+            for category, stratum in dd.ConsumptionStrata[1:dd.EmissionsStrataCount['first-order']]:
+                for phase in PHASES:
+                    columns[_name('emissions', 'stratum', species, stratum, phase)] = (category, stratum, phase, species)
+    return columns
+
+class ConsumeResults(Mapping):
+    ''' Results by flattened column name, see the top of this file
+    '''
+    def __init__(self, cons_data, heat_data, emis_data, inputs, emis_species=dd.EmissionsSpecies):
+        self.cons_data = cons_data
+        self.heat_data = heat_data
+        self.emis_data = emis_data
+        self.inputs = inputs
+        self.emis_species = tuple(emis_species)
+        if len(emis_data) == 0:
+            self._columns = column_keys(inputs.keys(), ())
+        else:
+            strata = 'first-order' if len(emis_data[0]) >= dd.EmissionsStrataCount['first-order'] else 'summary'
+            self._columns = column_keys(inputs.keys(), self.emis_species, strata)
+
+    def __getitem__(self, name):
+        category, stratum, phase, species = self._columns[name]
+        if 'parameters' == category:
+            return self.inputs[stratum]
+        if 'heat release' == category:
+            return self.heat_data[0][PHASES.index(phase)]
+        if species is None:
+            return self.cons_data[_STRATUM_INDEX[(category, stratum)]][PHASES.index(phase)]
+        return self.emis_data[self.emis_species.index(species)][_STRATUM_INDEX[(category, stratum)]][PHASES.index(phase)]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    @property
+    def rows(self):
+        ''' The number of rows (scenarios) '''
+        return len(self.inputs['fuelbeds'])
+
+    def to_dict(self):
+        ''' The legacy nested results dictionary '''
+        return util.make_dictionary_of_lists(cons_data = self.cons_data,
+                                        heat_data = self.heat_data,
+                                        emis_data = self.emis_data, inputs = self.inputs,
+                                        emis_species = self.emis_species)
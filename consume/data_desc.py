@@ -5,7 +5,7 @@ def list_valid_fm_types():
 
 def list_valid_burntypes():
     """Returns a list of valid burn types"""
-    return ['natural', 'activity'] #, 'piles']
+    return ['natural', 'activity', 'mixed'] #, 'piles']
 
 def list_valid_units():
     """Returns a list of valid output units for consumption/emissions data."""
@@ -21,6 +21,18 @@ def list_valid_emissions_species():
     """
     return ["pm", "pm10", "pm25", "co", "co2", "ch4", "nmhc"]
 
+# all emissions species, in the order of the rows of the emissions output
+EmissionsSpecies = ("pm", "pm10", "pm25", "co", "co2", "ch4", "nmhc", "nmoc", "nh3", "no", "no2", "nox", "so2")
+
+def list_valid_emissions_strata():
+    """Returns a list of valid levels of emissions strata detail: 'summary'
+       (totals only), 'first-order' (totals and the 1st-order strata), 'all'
+    """
+    return ["summary", "first-order", "all"]
+
+# number of leading consumption strata needed for each level of emissions strata detail
+EmissionsStrataCount = {"summary": 1, "first-order": 7, "all": 40}
+
 def list_valid_combustion_stages():
     """Returns a list of valid combustion stages for consumption/emissions data
     """
@@ -32,6 +44,50 @@ def list_valid_consumption_strata():
     return ["summary", "canopy", "woody fuels", "shrub", "nonwoody",
             "ground fuels", "litter-lichen-moss"]
 
+# consumption strata, in the order of the rows of the consumption output, as
+# (1st-order category, stratum) named as in the results() dictionary
+ConsumptionStrata = (
+    ("summary", "total"),
+    ("summary", "canopy"),
+    ("summary", "shrub"),
+    ("summary", "nonwoody"),
+    ("summary", "litter-lichen-moss"),
+    ("summary", "ground fuels"),
+    ("summary", "woody fuels"),
+    ("canopy", "overstory"),
+    ("canopy", "midstory"),
+    ("canopy", "understory"),
+    ("canopy", "snags class 1 foliage"),
+    ("canopy", "snags class 1 wood"),
+    ("canopy", "snags class 1 no foliage"),
+    ("canopy", "snags class 2"),
+    ("canopy", "snags class 3"),
+    ("canopy", "ladder fuels"),
+    ("shrub", "primary live"),
+    ("shrub", "secondary live"),
+    ("nonwoody", "primary live"),
+    ("nonwoody", "secondary live"),
+    ("litter-lichen-moss", "litter"),
+    ("litter-lichen-moss", "lichen"),
+    ("litter-lichen-moss", "moss"),
+    ("ground fuels", "duff upper"),
+    ("ground fuels", "duff lower"),
+    ("ground fuels", "basal accumulations"),
+    ("ground fuels", "squirrel middens"),
+    ("woody fuels", "piles"),
+    ("woody fuels", "stumps sound"),
+    ("woody fuels", "stumps rotten"),
+    ("woody fuels", "stumps lightered"),
+    ("woody fuels", "1-hr fuels"),
+    ("woody fuels", "10-hr fuels"),
+    ("woody fuels", "100-hr fuels"),
+    ("woody fuels", "1000-hr fuels sound"),
+    ("woody fuels", "1000-hr fuels rotten"),
+    ("woody fuels", "10000-hr fuels sound"),
+    ("woody fuels", "10000-hr fuels rotten"),
+    ("woody fuels", "10k+-hr fuels sound"),
+    ("woody fuels", "10k+-hr fuels rotten"))
+
 def perarea():
     """ Returns list of valid output units that are area weighted """
     return ['tons_ac', 'lbs_ac', 'kg_ha', 'kg_m^2', 'tonnes_ha', 'kg_km^2',
@@ -91,3 +147,31 @@ LoadDefs = (('fuelbed_number', 'fccs_id'),
             ('srm_id', 'srm_id'),
             ('srm_description', 'srm_description'))
 
+
+# LoadDefs columns that are only descriptive. The consumption and emissions
+# calculations don't use them, so FCCSDB loads them on demand (info(), browse())
+DescriptiveLoadDefs = ('site_name', 'site_description', 'ecoregion', 'srm_id', 'srm_description')
+
+# columns, not in LoadDefs, that the consumption and emissions calculations use
+EngineExtraColumns = ('filename', 'cover_type')
+
+# LoadDefs columns that are identifiers rather than loadings/depths/percents
+IdentifierLoadDefs = ('fuelbed_number', 'efg_natural', 'efg_activity')
+
+# internal names of the loadings that FCCSDB.gather() packs into a LoadingsMatrix,
+# and the row of each in the matrix
+LoadingsMatrixColumns = tuple([item[1] for item in LoadDefs
+    if item[0] not in DescriptiveLoadDefs and item[0] not in IdentifierLoadDefs])
+LoadingsMatrixIndex = {name : i for (i, name) in enumerate(LoadingsMatrixColumns)}
+
+def list_engine_load_columns():
+    """Returns the loadings file columns (file names, not internal names) used
+       by the consumption and emissions calculations"""
+    return [item[0] for item in LoadDefs if item[0] not in DescriptiveLoadDefs] + list(EngineExtraColumns)
+
+def engine_load_dtypes():
+    """Returns the dtype map used when reading the engine columns of a loadings file"""
+    dtypes = {item[0] : float for item in LoadDefs
+        if item[0] not in DescriptiveLoadDefs and item[0] not in IdentifierLoadDefs}
+    dtypes.update({'fuelbed_number' : object, 'filename' : object})
+    return dtypes
@@ -31,6 +31,15 @@ Default output units for emissions are lbs/ac.
 
 >>> e_obj.output_units = 'kg_ha'
 
+By default all emissions species are calculated for every consumption stratum.
+To calculate only some species, or less strata detail ('summary' for totals
+only, 'first-order' for totals and the 1st-order strata reported in .results()),
+set these before calling .results(). The species and strata that are not
+requested are left out of the results.
+
+>>> e_obj.species = ['co2', 'pm25']
+>>> e_obj.strata = 'summary'
+
 
 ### OUTPUTS ###
 
@@ -205,6 +214,10 @@ sum(e_obj.results()['emissions']['co2']['total'])
 To view units that the emissions data are in:
 e_obj.results()['parameters']['units_emissions']
 
+The same values by their flattened (output_all.csv) column names, without
+building the dictionary:
+e_obj.results(columnar=True)['emissions_co2_total']
+
 *Note: if outputs units are per-area units (i.e. tons/acre or kg/ha), these
  sum' functions will not provide an accurate representation of the overall
  consumption rate for the scenario.
@@ -308,11 +321,16 @@ Index 1           Index 2              Index 3                     Index 4
 """
 import numpy as np
 from eflookup.fccs2ef import Fccs2SeraEf
-from eflookup.fccs2ef import CoverType2SeraEf
 
 from . emissions_db import EmissionsFactorDB as edb
+from . emissions_db import SERA_FACTORS
+from . consume_results import ConsumeResults
 from . import data_desc as dd
 from . import util_consume as util
+from . util_consume import values
+
+# - the loadings the pile emissions calculations read
+PILE_LOADINGS = ('pile_clean_loading', 'pile_dirty_loading', 'pile_vdirty_loading')
 
 
 #class Emissions(object):
@@ -329,6 +347,34 @@ class Emissions(util.FrozenClass):
     def no_sera(self, value):
         self._no_sera = value
 
+    @property
+    def species(self): return self._species
+    @species.setter
+    def species(self, value):
+        """ The emissions species to calculate, e.g. ['co2', 'pm25']. None selects all of them. """
+        tmp = dd.EmissionsSpecies if value is None else [v.lower() for v in value]
+        unknown = [v for v in tmp if v not in dd.EmissionsSpecies]
+        if unknown:
+            print("Error: unknown emissions species {}. Valid values are:".format(unknown))
+            for i in dd.EmissionsSpecies:
+                print("\t{}".format(i))
+        else:
+            # - keep the standard row order
+            self._species = tuple([v for v in dd.EmissionsSpecies if v in tmp])
+
+    @property
+    def strata(self): return self._strata
+    @strata.setter
+    def strata(self, value):
+        """ The level of strata detail to calculate: 'summary', 'first-order', or 'all' """
+        tmp = value.lower()
+        if tmp in dd.list_valid_emissions_strata():
+            self._strata = tmp
+        else:
+            print("Error: the only permitted values for strata are:")
+            for i in dd.list_valid_emissions_strata():
+                print("\t{}".format(i))
+
     @property
     def output_units(self): return self._output_units
     @output_units.setter
@@ -371,9 +417,11 @@ class Emissions(util.FrozenClass):
             self._emis_data = None
             self._emis_summ = None
             self._no_sera = False
+            self._species = dd.EmissionsSpecies
+            self._strata = 'all'
             self._freeze()
 
-    def results(self):
+    def results(self, columnar=False):
         """Returns a python DICTIONARY of emissions estimates.
 
         Returns a python dictionary variable comprised of input and output data.
@@ -382,18 +430,31 @@ class Emissions(util.FrozenClass):
         top of this file for detailed information on the structure of
         the dictionary and examples on how to extract information from the
         dictionary.
+
+        With columnar=True a ConsumeResults is returned instead, which gives
+        the results by the flattened column names of output_all.csv without
+        building the dictionary (see consume_results.py).
         """
 
         self._calculate()
         self._convert_units()
 
-        ins = self._cons_object._settings.package(self._cons_object.FCCS.loadings_data_)
+        ins = self._cons_object._settings.package(self._cons_object.FCCS)
         ins['emissions_fac_group'] = self._emissions_factor_groups
         # - single-value settings must be converted to a list so that results can be treated the same way
         ins['units_emissions'] = list([self._output_units] * len(self._cons_object._settings.get('fuelbeds')))
-        return util.make_dictionary_of_lists(cons_data = self._cons_object._cons_data,
+        results = ConsumeResults(cons_data = self._cons_object._cons_data,
                                         heat_data = self._cons_object._heat_data,
-                                        emis_data = self._emis_data, inputs = ins)
+                                        emis_data = self._emis_data, inputs = ins,
+                                        emis_species = self._species)
+        return results if columnar else results.to_dict()
+
+    def grid_results(self):
+        """ results() with each per-row value shaped (scenario, fuelbed), for a
+            scenario grid loaded with FuelConsumption.load_scenario_grid() """
+        shape = self._cons_object.grid_shape
+        assert shape, "Error: no scenario grid is loaded"
+        return util.to_grid(self.results(), shape)
 
     def report(self, csv = ""):
         """Displays a report of emissions estimates.
@@ -411,6 +472,10 @@ class Emissions(util.FrozenClass):
 
         """
 
+        if self._species != dd.EmissionsSpecies or 'all' != self._strata:
+            print("Error: the emissions report requires all species and strata")
+            return
+
         if self._calculate():
             self._convert_units()
             categories = ["pm", "pm10", "pm2.5", "co", "co2", "ch4", "nmhc"]
@@ -513,8 +578,13 @@ class Emissions(util.FrozenClass):
         consumption data, which is set upon object initialization.
 
         """
-        if self._have_cons_data == 0:
+        # - recalculate consumption the first time, after its settings change, and after
+        #   _convert_units() has converted it (emissions are calculated from tons_ac)
+        if self._have_cons_data == 0 or self._internal_units != "lbs_ac" or self._cons_object._inputs_changed():
             self._cons_object._calculate() # to generate consumption values
+            # - consumption is back in tons_ac, so emissions start over in lbs_ac and
+            #   _convert_units() converts both again
+            self._internal_units = "lbs_ac"
             if not None is self._cons_object._cons_data:
                 self._have_cons_data = len(self._cons_object._cons_data[0][0])
 
@@ -548,61 +618,54 @@ class Emissions(util.FrozenClass):
         # helper functions
         def get_clean_dirty_vdirty_ratio(loadings, pile_loading_total):
             # - ensure float for divisior
-            plt_as_float = pile_loading_total.copy(float)
-            plt_as_float[:] = pile_loading_total
-            clean_ratio =  np.where(pile_loading_total, loadings['pile_clean_loading']  / plt_as_float, 0.0)
-            dirty_ratio =  np.where(pile_loading_total, loadings['pile_dirty_loading']  / plt_as_float, 0.0)
-            vdirty_ratio = np.where(pile_loading_total, loadings['pile_vdirty_loading'] / plt_as_float, 0.0)
+            plt_as_float = np.asarray(pile_loading_total, dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                clean_ratio =  np.where(pile_loading_total, values(loadings, 'pile_clean_loading')  / plt_as_float, 0.0)
+                dirty_ratio =  np.where(pile_loading_total, values(loadings, 'pile_dirty_loading')  / plt_as_float, 0.0)
+                vdirty_ratio = np.where(pile_loading_total, values(loadings, 'pile_vdirty_loading') / plt_as_float, 0.0)
             pile_loading_ratios = np.array([clean_ratio] + [dirty_ratio] + [vdirty_ratio])
             return pile_loading_ratios.transpose()
 
-        def calc_pm(pile_loadings, cdv_ratios, pm_type, pile_black_pct):
+        def calc_pm(pile_loadings, cdv_ratios, pm_factors, pile_black_pct):
+            """ (species, phases, fuelbeds) emissions from (fuelbeds, 3) clean/dirty/vdirty
+                ratios and (species, 3) clean/dirty/vdirty emission factors """
             # - emission factor * clean/dirty/vdirty ratio
-            adjusted_pm_value = pm_type * cdv_ratios
+            adjusted_pm_values = pm_factors[:, np.newaxis, :] * cdv_ratios[np.newaxis]
 
             # get consumed mass
-            total_consumed = (pile_loadings * pile_black_pct).values
+            total_consumed = pile_loadings * pile_black_pct
 
-            cdv_results = np.zeros(len(total_consumed))
-            for i in range(0, len(total_consumed)):
-                summ = 0.0
-                for adj_value in adjusted_pm_value[i]:
-                    summ += total_consumed[i] * adj_value
-                cdv_results[i] = summ
+            # - consumed * adjusted factor, summed over clean, dirty, vdirty in that order
+            cdv_products = total_consumed[:, np.newaxis] * adjusted_pm_values
+            cdv_results = util.sum_into(np.empty(cdv_products.shape[:2]), np.moveaxis(cdv_products, -1, 0))
 
-            return util.csdist(cdv_results, [0.70, 0.15, 0.15])
+            return util.csdist(cdv_results, [0.70, 0.15, 0.15]).transpose(1, 0, 2)
 
         # Start -----------
         pile_ratios = get_clean_dirty_vdirty_ratio(all_loadings, pile_loadings)
-        pm_piles = calc_pm(pile_loadings, pile_ratios, util.pile_particulatematter_emission_factors['PM'], pile_black_pct)
-        pm10_piles = calc_pm(pile_loadings, pile_ratios, util.pile_particulatematter_emission_factors['PM10'], pile_black_pct)
-        pm25_piles = calc_pm(pile_loadings, pile_ratios, util.pile_particulatematter_emission_factors['PM25'], pile_black_pct)
+        pm_factors = np.array([util.pile_particulatematter_emission_factors[k] for k in ['PM', 'PM10', 'PM25']], dtype=float)
+        (pm_piles, pm10_piles, pm25_piles) = calc_pm(pile_loadings, pile_ratios, pm_factors, pile_black_pct)
         return (pm_piles, pm10_piles, pm25_piles)
 
     def _emissions_calc_pollutants_piles(self, pile_loadings, pile_black_pct):
         # helper function
-        def calc_pollutant(pile_loadings, pollutant_type, pile_black_pct):
+        def calc_pollutants(pile_loadings, pollutant_factors, pile_black_pct):
+            """ (species, phases, fuelbeds) emissions from (species, phases) emission factors """
             # get consumed mass
             total_consumed = pile_loadings * pile_black_pct
-            phase_consumed = util.csdist(total_consumed.values, [0.70, 0.15, 0.15])
+            phase_consumed = util.csdist(total_consumed, [0.70, 0.15, 0.15])
 
-            results = np.zeros_like(phase_consumed)
-            for i in range(0, len(pile_loadings)):
-                tmp = phase_consumed[:,i] * pollutant_type
-                results[:,i] = np.array([tmp[0]] + [tmp[1]] + [tmp[2]] + [sum(tmp)])
+            results = phase_consumed[np.newaxis] * pollutant_factors[:, :, np.newaxis]
+            # - the total is the sum of the phase products, in phase order
+            total_product = results[:, 3].copy()
+            util.sum_into(results[:, 3], [results[:, 0], results[:, 1], results[:, 2], total_product])
             return results
 
         # Start -----------
-        pile_co = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['CO'], pile_black_pct)
-        pile_co2 = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['CO2'], pile_black_pct)
-        pile_ch4= calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['CH4'], pile_black_pct)
-        pile_nmhc = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NMHC'], pile_black_pct)
-        pile_nmoc = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NMOC'], pile_black_pct)
-        pile_nh3 = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NH3'], pile_black_pct)
-        pile_no = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NO'], pile_black_pct)
-        pile_no2 = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NO2'], pile_black_pct)
-        pile_nox = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['NOx'], pile_black_pct)
-        pile_so2 = calc_pollutant(pile_loadings, util.pile_pollutant_emission_factors['SO2'], pile_black_pct)
+        pollutant_factors = np.array([util.pile_pollutant_emission_factors[k] for k in
+            ['CO', 'CO2', 'CH4', 'NMHC', 'NMOC', 'NH3', 'NO', 'NO2', 'NOx', 'SO2']], dtype=float)
+        (pile_co, pile_co2, pile_ch4, pile_nmhc, pile_nmoc, pile_nh3, pile_no, pile_no2, pile_nox, pile_so2) = \
+            calc_pollutants(pile_loadings, pollutant_factors, pile_black_pct)
 
         return (pile_co, pile_co2, pile_ch4, pile_nmhc, pile_nmoc, pile_nh3, pile_no, pile_no2, pile_nox, pile_so2)
 
@@ -614,228 +677,60 @@ class Emissions(util.FrozenClass):
         each emissions species.
 
         """
-        def calc_species(cons_data, ef):
-            """ Gets summed data """
-            temp = cons_data * ef
-            for i in range(0, len(temp)):
-                summ = sum(temp[i])
-                temp[i][3] = summ
-            return temp
+        def calc_emissions(cons_data, piles, ef):
+            """ (species, strata, phases, fuelbeds) emissions from (strata, phases, fuelbeds)
+                consumption and (species, phases, fuelbeds) emissions factors. Pile
+                consumption is left out of the totals (index 0) and the woody stratum
+                (index 6); cons_data is not modified. The total phase is the sum of the
+                phase products, added in phase order. """
+            emis = np.empty((len(ef),) + cons_data.shape)
+            np.multiply(cons_data[np.newaxis], ef[:, np.newaxis], out=emis)
+            for i in [i for i in (0, 6) if i < len(cons_data)]:
+                np.multiply(np.subtract(cons_data[i], piles)[np.newaxis], ef, out=emis[:, i])
+            total_product = emis[:, :, 3].copy()
+            util.sum_into(emis[:, :, 3], [emis[:, :, 0], emis[:, :, 1], emis[:, :, 2], total_product])
+            return emis
 
         def get_emis_summ(p):
             """ Sums emissions data by area for each species/fccs id """
-            alls = []
-            base = self._emis_data[p]
-            for i in range(0, len(self._cons_object._cons_data)):
-                base2 = area * np.array(base[i])
-                alls.append(np.sum(base2, axis=1))
-            return alls / tot_area
-
-        def arrayize(d):
-            """ Converts list to numpy array """
-            return np.array(d)
+            return np.sum(area * self._emis_data[p], axis=-1) / tot_area
 
         def pile_info(cons_obj):
             """ Get commonly used pile information """
-            loadings = \
-                cons_obj._get_loadings_for_specified_files(cons_obj._settings.get('fuelbeds'))
+            loadings = cons_obj._get_loadings_for_specified_files(
+                cons_obj._settings.get('fuelbeds'), columns=PILE_LOADINGS)
             pile_black_pct = (cons_obj._settings.get('pile_black_pct') * 0.01)
-            pile_loading_total = loadings['pile_clean_loading'] \
-                                + loadings['pile_dirty_loading'] \
-                                + loadings['pile_vdirty_loading']
+            pile_loading_total = values(loadings, 'pile_clean_loading') \
+                                + values(loadings, 'pile_dirty_loading') \
+                                + values(loadings, 'pile_vdirty_loading')
             return (loadings, pile_loading_total, pile_black_pct)
 
         self._emis_data = None
         self._emis_summ = None
 
-        # - subtract out pile loading -- restore it at the end of routine
-        all_fsrt = self._cons_object._cons_data
-        all_fsrt[0] = all_fsrt[0] - self._cons_object._cons_data_piles
-        all_fsrt[6] = all_fsrt[6] - self._cons_object._cons_data_piles
+        # - read-only views of the requested strata; piles are taken out of the woody and
+        #   total strata in calc_emissions
+        all_fsrt = self._cons_object._cons_data[:dd.EmissionsStrataCount[self._strata]]
+        all_fsrt.flags.writeable = False
+        cons_piles = self._cons_object._cons_data_piles.view()
+        cons_piles.flags.writeable = False
 
-        # Load default emissions factors (average of all factors...)
-        t = self._emission_factor_db.data[0]
         num_fuelbeds = int(self._have_cons_data)# <<< ucons
 
         if self._no_sera:
-            ef_flamg_pm = np.array([t['PM_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_pm10 = np.array([t['PM10b_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_pm25 = np.array([t['PM25_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_co = np.array([t['CO_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_co2 = np.array([t['CO2_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_ch4 = np.array([t['CH4_flaming']] * num_fuelbeds, dtype = float)
-            ef_flamg_nmhc = np.array([t['NMHC_flaming']] * num_fuelbeds, dtype = float)
-            # these are in SERA lookup, but not Consume
-            ef_flamg_nmoc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nh3 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_no = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_no2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nox = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_so2 = np.array([0] * num_fuelbeds, dtype = float)
-
-            ef_smres_pm = np.array([t['PM_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_pm10 = np.array([t['PM10b_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_pm25 = np.array([t['PM25_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_co = np.array([t['CO_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_co2 = np.array([t['CO2_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_ch4 = np.array([t['CH4_smold_resid']] * num_fuelbeds, dtype = float)
-            ef_smres_nmhc = np.array([t['NMHC_smold_resid']] * num_fuelbeds, dtype = float)
-            # these are in SERA lookup, but not Consume
-            ef_smres_nmoc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smres_nh3 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smres_no = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smres_no2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smres_nox = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smres_so2 = np.array([0] * num_fuelbeds, dtype = float)
-
-            # And go fetch factors from the chosen emissions factor groups
-            for i in range(0, num_fuelbeds):
-                data = self._emission_factor_db.data[int(efg[i])]
-                ef_flamg_pm25[i] = data['PM25_flaming']; ef_smres_pm25[i] = data['PM25_smold_resid']
-                ef_flamg_co[i] = data['CO_flaming']; ef_smres_co[i] = data['CO_smold_resid']
-                ef_flamg_co2[i] = data['CO2_flaming']; ef_smres_co2[i] = data['CO2_smold_resid']
-                ef_flamg_ch4[i] = data['CH4_flaming']; ef_smres_ch4[i] = data['CH4_smold_resid']
-                ef_flamg_nmhc[i] = data['NMHC_flaming']; ef_smres_nmhc[i] = data['NMHC_smold_resid']
-                ef_flamg_pm[i] = data['PM_flaming']; ef_smres_pm[i] = data['PM_smold_resid']
-                ef_flamg_pm10[i] = data['PM10b_flaming']; ef_smres_pm10[i] = data['PM10b_smold_resid']
-
-            fill = [np.array([0] * num_fuelbeds, dtype=float)]
-
-            ef_pm = np.array([ef_flamg_pm] + [ef_smres_pm] + [ef_smres_pm] + fill)
-            ef_pm10 = np.array([ef_flamg_pm10] + [ef_smres_pm10] + [ef_smres_pm10] + fill)
-            ef_pm25 = np.array([ef_flamg_pm25] + [ef_smres_pm25] + [ef_smres_pm25] + fill)
-            ef_co = np.array([ef_flamg_co] + [ef_smres_co] + [ef_smres_co] + fill)
-            ef_co2 = np.array([ef_flamg_co2] + [ef_smres_co2] + [ef_smres_co2] + fill)
-            ef_ch4 = np.array([ef_flamg_ch4] + [ef_smres_ch4] + [ef_smres_ch4] + fill)
-            ef_nmhc = np.array([ef_flamg_nmhc] + [ef_smres_nmhc] + [ef_smres_nmhc] + fill)
-            # these will all be zeros
-            ef_nmoc = np.array([ef_flamg_nmoc] + [ef_smres_nmoc] + [ef_smres_nmoc] + fill)
-            ef_nh3 = np.array([ef_flamg_nh3] + [ef_smres_nh3] + [ef_smres_nh3] + fill)
-            ef_no = np.array([ef_flamg_no] + [ef_smres_no] + [ef_smres_no] + fill)
-            ef_no2 = np.array([ef_flamg_no2] + [ef_smres_no2] + [ef_smres_no2] + fill)
-            ef_nox = np.array([ef_flamg_nox] + [ef_smres_nox] + [ef_smres_nox] + fill)
-            ef_so2 = np.array([ef_flamg_so2] + [ef_smres_so2] + [ef_smres_so2] + fill)
+            # - (species, phases, fuelbeds) factors of the chosen emissions factor groups
+            ef = self._emission_factor_db.get_factors(efg).transpose(1, 2, 0)
 
         else:
-            # using SERA numbers
-            # set up some arrays
-            ef_flamg_pm = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_pm10 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_pm25 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_co = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_co2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_ch4 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nh3 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nmhc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nmoc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_no = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_no2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_nox = np.array([0] * num_fuelbeds, dtype = float)
-            ef_flamg_so2 = np.array([0] * num_fuelbeds, dtype = float)
-
-            ef_smold_pm = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_pm10 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_pm25 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_co = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_co2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_ch4 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_nh3 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_nmhc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_nmoc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_no = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_no2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_nox = np.array([0] * num_fuelbeds, dtype = float)
-            ef_smold_so2 = np.array([0] * num_fuelbeds, dtype = float)
-
-            ef_resid_pm = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_pm10 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_pm25 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_co = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_co2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_ch4 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_nh3 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_nmhc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_nmoc = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_no = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_no2 = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_nox = np.array([0] * num_fuelbeds, dtype = float)
-            ef_resid_so2 = np.array([0] * num_fuelbeds, dtype = float)
-
+            # using SERA numbers, looked up once per cover type
             fuelbeds = self._cons_object._settings.get('fuelbeds')
+            fccsDB = self._cons_object.FCCS
+            cover_types = fccsDB.loadings_data_.cover_type.values[fccsDB.positions(fuelbeds)]
+            ef = SERA_FACTORS.gather(cover_types).transpose(1, 2, 0)
 
-            for i in range(0, num_fuelbeds):
-                fuelbedNum = fuelbeds[i]
-
-                ## get the cover_type, then use it to do lu = CoverType2SeraEf(cover_type)
-
-                indexForFCCSObject = self._cons_object.FCCS.loadings_data_.fccs_id==fuelbedNum
-                cover_type = int(self._cons_object.FCCS.loadings_data_[indexForFCCSObject].cover_type.values[0])
-
-                lu = CoverType2SeraEf(cover_type)
-
-                ef_flamg_pm25[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="PM2.5")
-                ef_smold_pm25[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="PM2.5")
-                ef_resid_pm25[i] = ef_smold_pm25[i]
-
-                ef_flamg_pm10[i] = ef_flamg_pm25[i] * 1.111
-                ef_smold_pm10[i] = ef_smold_pm25[i] * 1.111
-                ef_resid_pm10[i] = ef_smold_pm10[i]
-
-                ef_flamg_co[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="CO")
-                ef_smold_co[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="CO")
-                ef_resid_co[i] = ef_smold_co[i]
-
-                ef_flamg_co2[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="CO2")
-                ef_smold_co2[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="CO2")
-                ef_resid_co2[i] = ef_smold_co2[i]
-
-                ef_flamg_ch4[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="CH4")
-                ef_smold_ch4[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="CH4")
-                ef_resid_ch4[i] = ef_smold_ch4[i]
-
-                # NMHC ? PM ? instead of showing old values, leave these set to zero.
-                # In other words, NHMC and PM are unsupported. Instead of NMHC, we return NMOC
-
-                ef_flamg_nmoc[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="NMOC")
-                ef_smold_nmoc[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="NMOC")
-                ef_resid_nmoc[i] = ef_smold_nmoc[i]
-
-                # new pollutants follow: NH3, NOx, SO2
-                ef_flamg_nh3[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="NH3")
-                ef_smold_nh3[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="NH3")
-                ef_resid_nh3[i] = ef_smold_nh3[i]
-
-                # ef_flamg_no[i] = None
-                # ef_smold_no[i] = None
-                # ef_resid_no[i] = None
-
-                # ef_flamg_no2[i] = None
-                # ef_smold_no2[i] = None
-                # ef_resid_no2[i] = None
-
-                ef_flamg_nox[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="NOx")
-                ef_smold_nox[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="NOx")
-                ef_resid_nox[i] = ef_smold_nox[i]
-
-                ef_flamg_so2[i] = 2 * lu.get(phase="flaming",fuel_category="canopy",fuel_sub_category="overstory",species="SO2")
-                ef_smold_so2[i] = 2 * lu.get(phase="smoldering",fuel_category="canopy",fuel_sub_category="overstory",species="SO2")
-                ef_resid_so2[i] = ef_smold_so2[i]
-
-            fill = [np.array([0] * num_fuelbeds, dtype=float)]
-            ef_pm = np.array([ef_flamg_pm] + [ef_smold_pm] + [ef_resid_pm] + fill)
-            ef_pm10 = np.array([ef_flamg_pm10] + [ef_smold_pm10] + [ef_resid_pm10] + fill)
-            ef_pm25 = np.array([ef_flamg_pm25] + [ef_smold_pm25] + [ef_resid_pm25] + fill)
-            ef_co = np.array([ef_flamg_co] + [ef_smold_co] + [ef_resid_co] + fill)
-            ef_co2 = np.array([ef_flamg_co2] + [ef_smold_co2] + [ef_resid_co2] + fill)
-            ef_ch4 = np.array([ef_flamg_ch4] + [ef_smold_ch4] + [ef_resid_ch4] + fill)
-            ef_nmhc = np.array([ef_flamg_nmhc] + [ef_smold_nmhc] + [ef_resid_nmhc] + fill)
-            ef_nmoc = np.array([ef_flamg_nmoc] + [ef_smold_nmoc] + [ef_resid_nmoc] + fill)
-            ef_nh3 = np.array([ef_flamg_nh3] + [ef_smold_nh3] + [ef_resid_nh3] + fill)
-            ef_no = np.array([ef_flamg_no] + [ef_smold_no] + [ef_resid_no] + fill)
-            ef_no2 = np.array([ef_flamg_no2] + [ef_smold_no2] + [ef_resid_no2] + fill)
-            ef_nox = np.array([ef_flamg_nox] + [ef_smold_nox] + [ef_resid_nox] + fill)
-            ef_so2 = np.array([ef_flamg_so2] + [ef_smold_so2] + [ef_resid_so2] + fill)
-
+        # - only the requested species
+        if self._species != dd.EmissionsSpecies:
+            ef = ef[[dd.EmissionsSpecies.index(species) for species in self._species]]
 
 
 ###---------------------------------------------------
@@ -843,65 +738,31 @@ class Emissions(util.FrozenClass):
 
         # Emissions calculations:
        # consumption (tons/acre) * emissions factor (lb/ton) = lbs/ac emissions
-       # Emissions for all fuels combined
-        emis_pm_fsrt = calc_species(all_fsrt, ef_pm)
-        emis_pm10_fsrt = calc_species(all_fsrt, ef_pm10)
-        emis_pm25_fsrt = calc_species(all_fsrt, ef_pm25)
-        emis_co_fsrt = calc_species(all_fsrt, ef_co)
-        emis_co2_fsrt = calc_species(all_fsrt, ef_co2)
-        emis_ch4_fsrt = calc_species(all_fsrt, ef_ch4)
-        emis_nmhc_fsrt = calc_species(all_fsrt, ef_nmhc)
-        emis_nmoc_fsrt = calc_species(all_fsrt, ef_nmoc)
-        emis_nh3_fsrt = calc_species(all_fsrt, ef_nh3)
-        emis_no_fsrt = calc_species(all_fsrt, ef_no)
-        emis_no2_fsrt = calc_species(all_fsrt, ef_no2)
-        emis_nox_fsrt = calc_species(all_fsrt, ef_nox)
-        emis_so2_fsrt = calc_species(all_fsrt, ef_so2)
+       # All species, strata, and phases at once
+        emis = calc_emissions(all_fsrt, cons_piles, ef)
 
         # --- Separate pile calculations ---
         (all_loadings, pile_loadings, pile_black_pct) = pile_info(self._cons_object)
         (pile_pm, pile_pm10, pile_pm25) = \
             self._emissions_calc_pm_piles(all_loadings, pile_loadings, pile_black_pct)
-
-        # Add pile PM contribution in. Add to the totals (index 0) and the woody stratum (index 6)
-        if self._no_sera:
-            emis_pm_fsrt[0] = emis_pm_fsrt[0] + pile_pm
-            emis_pm_fsrt[6] = emis_pm_fsrt[6] + pile_pm
-        emis_pm10_fsrt[0] = emis_pm10_fsrt[0] + pile_pm10
-        emis_pm10_fsrt[6] = emis_pm10_fsrt[6] + pile_pm10
-        emis_pm25_fsrt[0] = emis_pm25_fsrt[0] + pile_pm25
-        emis_pm25_fsrt[6] = emis_pm25_fsrt[6] + pile_pm25
-
         (pile_co, pile_co2, pile_ch4, pile_nmhc, pile_nmoc, pile_nh3, pile_no, pile_no2, pile_nox, pile_so2) = \
             self._emissions_calc_pollutants_piles(pile_loadings, pile_black_pct)
-        emis_co_fsrt[0] = emis_co_fsrt[0] + pile_co
-        emis_co_fsrt[6] = emis_co_fsrt[6] + pile_co
-        emis_co2_fsrt[0] = emis_co2_fsrt[0] + pile_co2
-        emis_co2_fsrt[6] = emis_co2_fsrt[6] + pile_co2
-        emis_ch4_fsrt[0] = emis_ch4_fsrt[0] + pile_ch4
-        emis_ch4_fsrt[6] = emis_ch4_fsrt[6] + pile_ch4
+
+        # Add pile contributions in. Add to the totals (index 0) and the woody stratum (index 6).
+        # PM and NMHC piles only count with the consume emissions factors.
+        pile_emis = [('pm10', pile_pm10), ('pm25', pile_pm25), ('co', pile_co), ('co2', pile_co2),
+            ('ch4', pile_ch4), ('nmoc', pile_nmoc), ('nh3', pile_nh3), ('no', pile_no),
+            ('no2', pile_no2), ('nox', pile_nox), ('so2', pile_so2)]
         if self._no_sera:
-            emis_nmhc_fsrt[0] = emis_nmhc_fsrt[0] + pile_nmhc
-            emis_nmhc_fsrt[6] = emis_nmhc_fsrt[6] + pile_nmhc
-        emis_nmoc_fsrt[0] = emis_nmoc_fsrt[0] + pile_nmoc
-        emis_nmoc_fsrt[6] = emis_nmoc_fsrt[6] + pile_nmoc
-        # new pollutants from SERA
-        emis_nh3_fsrt[0] = emis_nh3_fsrt[0] + pile_nh3
-        emis_nh3_fsrt[6] = emis_nh3_fsrt[6] + pile_nh3
-        emis_no_fsrt[0] = emis_no_fsrt[0] + pile_no
-        emis_no_fsrt[6] = emis_no_fsrt[6] + pile_no
-        emis_no2_fsrt[0] = emis_no2_fsrt[0] + pile_no2
-        emis_no2_fsrt[6] = emis_no2_fsrt[6] + pile_no2
-        emis_nox_fsrt[0] = emis_nox_fsrt[0] + pile_nox
-        emis_nox_fsrt[6] = emis_nox_fsrt[6] + pile_nox
-        emis_so2_fsrt[0] = emis_so2_fsrt[0] + pile_so2
-        emis_so2_fsrt[6] = emis_so2_fsrt[6] + pile_so2
+            pile_emis += [('pm', pile_pm), ('nmhc', pile_nmhc)]
+        for (species, pile) in [sp for sp in pile_emis if sp[0] in self._species]:
+            s = self._species.index(species)
+            emis[s, 0] += pile
+            if len(all_fsrt) > 6:
+                emis[s, 6] += pile
         # ^^^ Separate pile calculations ^^^
 
-        #print "UNPACKING"
-        self._emis_data = arrayize([emis_pm_fsrt, emis_pm10_fsrt, emis_pm25_fsrt,
-                   emis_co_fsrt, emis_co2_fsrt, emis_ch4_fsrt, emis_nmhc_fsrt, emis_nmoc_fsrt,
-                   emis_nh3_fsrt, emis_no_fsrt, emis_no2_fsrt, emis_nox_fsrt, emis_so2_fsrt])
+        self._emis_data = emis
 
         #print "ADDING PER AREA STUFF"
         # And emissions per-unit-area summaries:
@@ -910,27 +771,9 @@ class Emissions(util.FrozenClass):
             area = np.array(np.array([1] * num_fuelbeds), dtype=float) * area
         tot_area = sum(area)
 
-        pm_all = get_emis_summ(0)
-        pm10_all = get_emis_summ(1)
-        pm25_all = get_emis_summ(2)
-        co_all = get_emis_summ(3)
-        co2_all = get_emis_summ(4)
-        ch4_all = get_emis_summ(5)
-        nmhc_all = get_emis_summ(6)
-        nmoc_all = get_emis_summ(7)
-        nh3_all = get_emis_summ(8)
-        no_all = get_emis_summ(9)
-        no2_all = get_emis_summ(10)
-        nox_all = get_emis_summ(11)
-        so2_all = get_emis_summ(12)
-
         # ks todo - what does this do?
-        self._emis_summ = np.array([pm_all, pm10_all, pm25_all, co_all, co2_all, ch4_all, nmhc_all, nmoc_all, nh3_all, no_all, no2_all, nox_all, so2_all])
+        self._emis_summ = np.array([get_emis_summ(p) for p in range(len(self._species))])
         # the only problem this line causes is if unit conversion is involved
         # self._emis_summ = np.array([0, 0, 0, 0, 0, 0, 0])
 
-        # - restore pile consumption
-        all_fsrt[0] = all_fsrt[0] + self._cons_object._cons_data_piles
-        all_fsrt[6] = all_fsrt[6] + self._cons_object._cons_data_piles
-
 
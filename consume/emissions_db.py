@@ -1,5 +1,12 @@
 import os
+import numpy as np
+import pandas as pan
+from eflookup.fccs2ef import CoverType2SeraEf
 from .module_locator import module_path
+from . import data_desc as dd
+
+# - emissions factor database tag for each of dd.EmissionsSpecies the database supplies
+FACTOR_TAGS = {'pm': 'PM', 'pm10': 'PM10b', 'pm25': 'PM25', 'co': 'CO', 'co2': 'CO2', 'ch4': 'CH4', 'nmhc': 'NMHC'}
 
 class EmissionsFactorDB:
     """ Emissions Factor Database object
@@ -33,6 +40,7 @@ class EmissionsFactorDB:
 
         root = get_rootnode(self.xml_file)
         self.data = self._load_emissions_factor_groups(root)
+        (self.factors, self.group_rows) = self._build_factor_array()
 
         # this data comes from the loadings input file
         self.fccs_emissions_groups = {}
@@ -53,15 +61,45 @@ class EmissionsFactorDB:
             efg_map[efg_id] = components
         return efg_map
 
+    def _build_factor_array(self):
+        """ The factors of all groups as a dense (groups, species, phases) array.
+            Species follow dd.EmissionsSpecies and phases the combustion stages.
+            Smoldering and residual share the smold_resid factor. The total phase,
+            and species not in the database, are 0. Also returns an array that
+            maps a group id to its row in the factor array (-1 if unknown).
+        """
+        ids = sorted(self.data.keys())
+        group_rows = np.full(max(ids) + 1, -1, dtype=int)
+        group_rows[ids] = np.arange(len(ids))
+        factors = np.zeros((len(ids), len(dd.EmissionsSpecies), len(dd.list_valid_combustion_stages())))
+        for row, group in enumerate(ids):
+            for s, species in enumerate(dd.EmissionsSpecies):
+                if species in FACTOR_TAGS:
+                    factors[row, s, 0] = self.data[group][FACTOR_TAGS[species] + '_flaming']
+                    factors[row, s, 1] = factors[row, s, 2] = self.data[group][FACTOR_TAGS[species] + '_smold_resid']
+        factors.flags.writeable = False
+        return (factors, group_rows)
+
+    def get_factors(self, efgs):
+        """ (fuelbeds, species, phases) emissions factors for a sequence of
+            emissions factor group ids, e.g. the result of get_efgs()
+        """
+        efgs = np.asarray(efgs, dtype=int)
+        assert ((efgs >= 0) & (efgs < len(self.group_rows))).all(), "Error: unknown emissions factor group"
+        rows = self.group_rows[efgs]
+        assert (rows >= 0).all(), "Error: unknown emissions factor group"
+        return self.factors[rows]
+
     def _get_emissions_factor_eqid(self, fccs_id):
         """Loads EFs when needed, and caches in self.fccs_emissions_groups"""
         if fccs_id not in self.fccs_emissions_groups:
             loadings = self._fco.FCCS.loadings_data_
             try:
-                l = loadings.loc[loadings['fccs_id'] == str(fccs_id)]
+                row = self._fco.FCCS.positions(fccs_id)[0]
+                assert row >= 0, 'not in the loadings file'
                 self.fccs_emissions_groups[fccs_id] = {
-                    'natural': int(l.efg_natural.iloc[0]),
-                    'activity': int(l.efg_activity.iloc[0])
+                    'natural': int(loadings.efg_natural.values[row]),
+                    'activity': int(loadings.efg_activity.values[row])
                 }
 
             except Exception as e:
@@ -80,6 +118,12 @@ class EmissionsFactorDB:
         assert key == 'natural' or key == 'activity'
         return key
 
+    def get_burn_types(self, count):
+        """ The burn type of each of count rows. A 'mixed' burn type is set per row. """
+        if 'mixed' == self._fco.burn_type:
+            return np.broadcast_to(np.asarray(self._fco._settings.get('burn_type'), dtype=str), count)
+        return np.full(count, self.get_key(self._fco.burn_type))
+
 
     def get_efgs(self, fuelbed_list):
         """Gets the appropriate emissions factor groups for the given FCCS IDs
@@ -88,11 +132,23 @@ class EmissionsFactorDB:
         appropriate emissions factors from the EmissionsFactorDatabase.xml,
         If multiple cover types exist the first is chosen and mapped to SAF data.
         """
+        # - look all the fuelbeds up at once when they are all valid
+        burn_types = self.get_burn_types(len(fuelbed_list))
+        rows = self._fco.FCCS.positions(fuelbed_list)
+        keys = np.unique(burn_types)
+        if (rows >= 0).all() and set(['efg_' + k for k in keys]).issubset(self._fco.FCCS.loadings_data_.columns):
+            groups = None
+            for eq_id_key in keys:
+                column = np.asarray(self._fco.FCCS.loadings_data_['efg_' + eq_id_key].values[rows])
+                groups = column if groups is None else np.where(eq_id_key == burn_types, column, groups)
+            if groups is not None and 'O' != groups.dtype.kind and not np.isnan(groups.astype(float)).any():
+                return groups.astype(int).tolist()
+
+        # - otherwise one at a time, reporting the fuelbeds that have no group
         ef_nums = []
-        for f in fuelbed_list:
+        for f, eq_id_key in zip(fuelbed_list, burn_types):
             efgs = self._get_emissions_factor_eqid(f)
             if efgs:
-                eq_id_key = self.get_key(self._fco.burn_type)
                 group = efgs[eq_id_key]
                 ef_nums.append(group)
             else:
@@ -158,6 +214,53 @@ class EmissionsFactorDB:
             print(txt)
 
 
+# - eflookup species name for each of dd.EmissionsSpecies taken from the SERA tables.
+#   pm10 is derived from pm25; pm, nmhc, no, and no2 are not supported (0).
+SERA_SPECIES = {'pm25': 'PM2.5', 'co': 'CO', 'co2': 'CO2', 'ch4': 'CH4', 'nmoc': 'NMOC',
+    'nh3': 'NH3', 'nox': 'NOx', 'so2': 'SO2'}
+PM10_PER_PM25 = 1.111
+
+class SeraFactorTable(object):
+    """ SERA emissions factors by cover type
+
+        Each distinct cover type is looked up in eflookup once per process and
+        kept as a (species, phases) array laid out like
+        EmissionsFactorDB.factors. The residual factors are the smoldering
+        ones. Per-fuelbed factors are then a gather from those arrays.
+    """
+    def __init__(self):
+        self._factors = {}
+
+    def get(self, cover_type):
+        """ The (species, phases) factors of one cover type """
+        cover_type = int(cover_type)
+        if cover_type not in self._factors:
+            lu = CoverType2SeraEf(cover_type)
+            factors = np.zeros((len(dd.EmissionsSpecies), len(dd.list_valid_combustion_stages())))
+            for species, sera_species in SERA_SPECIES.items():
+                s = dd.EmissionsSpecies.index(species)
+                factors[s, 0] = 2 * lu.get(phase="flaming", fuel_category="canopy",
+                    fuel_sub_category="overstory", species=sera_species)
+                factors[s, 1] = 2 * lu.get(phase="smoldering", fuel_category="canopy",
+                    fuel_sub_category="overstory", species=sera_species)
+            pm10 = dd.EmissionsSpecies.index('pm10')
+            factors[pm10, :2] = factors[dd.EmissionsSpecies.index('pm25'), :2] * PM10_PER_PM25
+            factors[:, 2] = factors[:, 1]
+            factors.flags.writeable = False
+            self._factors[cover_type] = factors
+        return self._factors[cover_type]
+
+    def gather(self, cover_types):
+        """ (fuelbeds, species, phases) factors for a sequence of cover types """
+        (codes, distinct) = pan.factorize(np.asarray(cover_types))
+        assert (codes >= 0).all(), "Error: missing cover type"
+        table = np.array([self.get(ct) for ct in distinct]).reshape(
+            (len(distinct), len(dd.EmissionsSpecies), len(dd.list_valid_combustion_stages())))
+        return table[codes]
+
+# - shared by all Emissions objects in the process
+SERA_FACTORS = SeraFactorTable()
+
 def tabs(tsize, nm):
     t = 2 - (int(len(nm)) / tsize)
     return nm + "\t" * t
@@ -1,33 +1,67 @@
 import os
+import numpy as np
 import pandas as pan
-import functools
 from collections import namedtuple
 from . import data_desc as dd
 from . import module_locator
+from . import loadings_cache
 
 FCCS_LOADINGS_FILE = './input_data/fccs_loadings.csv'
 
 
-@functools.cache
-def _load_data_from_csv(loadings_file):
+DataInfo = namedtuple('DataInfo', ['generator_name', 'generator_version', 'date_generated'])
+
+def _load_data_from_csv(loadings_file, signature=None, columns='all'):
     """Load FCCS data from an external file.
+
+    columns selects what is read:
+        'all'         : every column in the file
+        'engine'      : only the columns used by the consumption and emissions
+                        calculations (see data_desc.list_engine_load_columns())
+        'descriptive' : everything else (site names, descriptions, ...)
+
+    The parsed data is kept in an on-disk cache next to the loadings file (see
+    loadings_cache.py) so that only the first load of a given file pays for the
+    csv parse. Callers should go through loadings_cache.REGISTRY, which also
+    keeps the parsed data in memory.
     """
+    signature = signature if signature else loadings_cache.file_signature(loadings_file)
+    cached = loadings_cache.read(loadings_file, signature, variant=columns)
+    if cached:
+        loadings_data, extra = cached
+        loadings_metadata = DataInfo(*extra['metadata'])
+        if not extra['found_metadata']:
+            _warn_no_metadata()
+        return(loadings_data, loadings_metadata)
+
     found_loadings_metadata, loadings_metadata = _get_loadings_metadata(loadings_file)
     column_header_begins = 1 if found_loadings_metadata else 0
 
     # - Note that fuelbed_number is treated as an object (basically 'string' versus 'number')
-    loadings_data = pan.read_csv(loadings_file, dtype={'fuelbed_number': object}, header=column_header_begins)
+    engine_columns = set(dd.list_engine_load_columns())
+    if 'engine' == columns:
+        usecols, dtype = (lambda c: c in engine_columns), dd.engine_load_dtypes()
+    elif 'descriptive' == columns:
+        usecols, dtype = (lambda c: c not in engine_columns), None
+    else:
+        usecols, dtype = None, {'fuelbed_number': object}
+    loadings_data = pan.read_csv(loadings_file, dtype=dtype, header=column_header_begins, usecols=usecols)
 
     # - todo: convert percentage data. should this be done in FCCS?
-    pct_data = ['shrubs_primary_perc_live', 'shrubs_secondary_perc_live', 'nw_primary_perc_live', 'nw_secondary_perc_live']
-    loadings_data[pct_data] = loadings_data[pct_data] * 0.01
+    if 'descriptive' != columns:
+        pct_data = ['shrubs_primary_perc_live', 'shrubs_secondary_perc_live', 'nw_primary_perc_live', 'nw_secondary_perc_live']
+        loadings_data[pct_data] = loadings_data[pct_data] * 0.01
 
     # - rename columns to match internal names
-    for item in dd.LoadDefs:
-        loadings_data.rename(columns={item[0] : item[1]}, inplace=True)
+    loadings_data.rename(columns=dict(dd.LoadDefs), inplace=True)
 
+    loadings_cache.write(loadings_file, loadings_data,
+        {'found_metadata': found_loadings_metadata, 'metadata': list(loadings_metadata)}, signature, variant=columns)
     return(loadings_data, loadings_metadata)
 
+def _warn_no_metadata():
+    print("\nWarning: consume loadings file has no metadata information!\n")
+
 def _get_loadings_metadata(loadings_file):
     ''' The calculator information is in the first line of the file. It
         should look like this:
@@ -36,7 +70,6 @@ def _get_loadings_metadata(loadings_file):
 
         Return a tuple of (found|not found, parsed data or stubs)
     '''
-    DataInfo = namedtuple('DataInfo', ['generator_name', 'generator_version', 'date_generated'])
     found = False
     with open(loadings_file, 'r') as infile:
         first_line = infile.readline().rstrip()
@@ -48,14 +81,82 @@ def _get_loadings_metadata(loadings_file):
             date = chunks[2].split('=')[1]
             loadings_metadata = DataInfo(name, version, date)
         else:
-            print("\nWarning: consume loadings file has no metadata information!\n")
+            _warn_no_metadata()
             loadings_metadata = DataInfo("unknown", "unknown", "unknown")
     return (found, loadings_metadata)
 
+class LoadingsMatrix(object):
+    ''' The loadings of a set of fuelbeds, packed into a single contiguous
+        (columns, fuelbeds) float64 array. Row order is fixed by
+        data_desc.LoadingsMatrixColumns, so LD['litter_loading'] is a plain numpy
+        array with one value per fuelbed. This is what the consumption
+        calculators work on (see FCCSDB.gather()). With columns, data holds
+        just those rows, in that order.
+    '''
+    def __init__(self, data, fccs_ids, columns=None):
+        self.data = data
+        self.fccs_ids = fccs_ids
+        self._columns = dd.LoadingsMatrixColumns if columns is None else tuple(columns)
+        self._index = dd.LoadingsMatrixIndex if columns is None else \
+            dict([(name, i) for (i, name) in enumerate(self._columns)])
+
+    def __getitem__(self, key):
+        if 'fccs_id' == key:
+            return self.fccs_ids
+        return self.data[self._index[key]]
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @property
+    def columns(self): return self._columns
+
+    def take(self, indices):
+        ''' A LoadingsMatrix with the fuelbeds at the given indices
+        '''
+        return LoadingsMatrix(np.take(self.data, indices, axis=1), self.fccs_ids[indices], self._columns)
+
+class TiledLoadingsMatrix(LoadingsMatrix):
+    ''' The loadings of a set of fuelbeds, repeated for each of a number of
+        scenarios (scenario-major). data holds one copy of the loadings, and a
+        column is expanded to its full (repeats * fuelbeds) length the first
+        time it is read. The expanded column is kept and returned read-only on
+        later reads, so each column is copied once per calculation (a new
+        matrix is gathered for each one); memory grows by one full-length
+        array per column read, up to the size of an untiled matrix.
+        scale optionally maps loadings columns to per-row multipliers, e.g.
+        Monte Carlo draws of the uncertainty of the loadings.
+    '''
+    def __init__(self, data, fccs_ids, repeats, scale=None, columns=None):
+        LoadingsMatrix.__init__(self, data, fccs_ids, columns)
+        self.repeats = repeats
+        # - only the multipliers of the columns that are here
+        self.scale = dict([(k, v) for k, v in scale.items() if k in self._index]) if scale else {}
+        self._expanded = {}
+
+    def __getitem__(self, key):
+        if key not in self._expanded:
+            column = np.tile(LoadingsMatrix.__getitem__(self, key), self.repeats)
+            if key in self.scale:
+                column *= self.scale[key]
+            column.setflags(write=False)
+            self._expanded[key] = column
+        return self._expanded[key]
+
+    def __len__(self):
+        return self.data.shape[1] * self.repeats
+
+    def take(self, indices):
+        indices = np.asarray(indices)
+        data = np.take(self.data, indices % self.data.shape[1], axis=1)
+        for key, multipliers in self.scale.items():
+            data[self._index[key]] *= multipliers[indices]
+        return LoadingsMatrix(data, self.fccs_ids[indices % self.data.shape[1]], self._columns)
+
 class FCCSDB():
     """ A class the stores, retrieves, and distributes FCCS fuelbed information
     """
-    def __init__(self, fccs_file=""):
+    def __init__(self, fccs_file="", load_all_columns=False):
         """ FCCSDB class constructor.
 
         Upon initialization, FCCS data is loaded into the DB object.
@@ -63,15 +164,89 @@ class FCCSDB():
         Argument:
 
         fccs_file : directory location of the FCCS Loadings XML provided
-                    with the consume.py package"""
+                    with the consume.py package
+
+        load_all_columns : by default only the columns used by the consumption
+                    and emissions calculations are loaded into loadings_data_.
+                    The descriptive columns (site name, description, etc.) are
+                    loaded the first time info() or browse() needs them. Set
+                    this to True to load every column up front."""
 
         self.loadings_file_ = fccs_file
         if fccs_file == "":
             mod_path = module_locator.module_path()
             self.loadings_file_ = os.path.join(mod_path, FCCS_LOADINGS_FILE)
 
-        (self.loadings_data_, self.loadings_metadata_) = _load_data_from_csv(self.loadings_file_)
+        self.load_all_columns_ = load_all_columns
+        (self.loadings_data_, self.loadings_metadata_) = loadings_cache.REGISTRY.get(
+            self.loadings_file_, _load_data_from_csv, 'all' if load_all_columns else 'engine')
+        self.descriptive_data_ = self.loadings_data_ if load_all_columns else None
+        self.loadings_matrix_ = None
         self.valid_fuelbeds_ = [i for i in self.loadings_data_.fccs_id]
+        self._build_fuelbed_index()
+
+    def _build_fuelbed_index(self):
+        ''' Build the fccs_id -> row position index once, at load time. If a fuelbed
+            appears more than once in the loadings file the first row wins, which
+            is what the old linear scans returned.
+        '''
+        ids = self.loadings_data_.fccs_id
+        first = ~ids.duplicated(keep='first').to_numpy()
+        self.fuelbed_index_ = pan.Index(ids.to_numpy()[first])
+        self.fuelbed_rows_ = np.flatnonzero(first)
+
+    def positions(self, fccs_ids):
+        ''' Return the row positions in loadings_data_ of the requested fuelbeds as
+            a numpy integer array (one hash lookup per id). Unknown fuelbeds are
+            reported as -1.
+        '''
+        ids = [fccs_ids] if isinstance(fccs_ids, (str, int)) else fccs_ids
+        found = self.fuelbed_index_.get_indexer([str(i) for i in ids])
+        return np.where(found < 0, -1, self.fuelbed_rows_[found])
+
+    def _get_loadings_matrix(self):
+        ''' All fuelbeds as a read-only (columns, fuelbeds) array, built on first use
+        '''
+        if self.loadings_matrix_ is None:
+            missing = [c for c in dd.LoadingsMatrixColumns if c not in self.loadings_data_.columns]
+            assert not missing, "Error: the loadings file is missing {}".format(missing)
+            matrix = np.ascontiguousarray(
+                self.loadings_data_[list(dd.LoadingsMatrixColumns)].to_numpy(dtype=float).T)
+            matrix.setflags(write=False)
+            self.loadings_matrix_ = matrix
+        return self.loadings_matrix_
+
+    def gather(self, positions, repeats=1, scale=None, columns=None):
+        ''' The loadings of the fuelbeds at the given row positions (see positions())
+            as a LoadingsMatrix. With repeats or scale, the fuelbeds are repeated that
+            many times over and scaled (see TiledLoadingsMatrix). columns limits the
+            matrix to those loadings (see data_desc.LoadingsMatrixColumns).
+        '''
+        matrix = self._get_loadings_matrix()
+        if columns is None:
+            data = np.take(matrix, positions, axis=1)
+        else:
+            data = matrix[np.ix_([dd.LoadingsMatrixIndex[c] for c in columns], positions)]
+        fccs_ids = self.loadings_data_.fccs_id.values[positions]
+        if repeats > 1 or scale:
+            return TiledLoadingsMatrix(data, fccs_ids, repeats, scale, columns)
+        return LoadingsMatrix(data, fccs_ids, columns)
+
+    def _get_descriptive_data(self):
+        ''' The descriptive columns, loaded on first use
+        '''
+        if self.descriptive_data_ is None:
+            (self.descriptive_data_, unused) = loadings_cache.REGISTRY.get(
+                self.loadings_file_, _load_data_from_csv, 'descriptive')
+        return self.descriptive_data_
+
+    def _get_fuelbed_row(self, position):
+        ''' All of the columns, descriptive and engine, for a single fuelbed
+        '''
+        row = self.loadings_data_.iloc[position]
+        if not self.load_all_columns_:
+            row = pan.concat([row, self._get_descriptive_data().iloc[position]])
+        return row
 
     @property
     def data_source_info(self): return self.loadings_metadata_
@@ -87,9 +262,10 @@ class FCCSDB():
         as a quick reference.
 
         """
-        for c in self.loadings_data_.index:
-            print("ID# " + str(self.loadings_data_.loc[c].get('fccs_id')) \
-                 + "\t: " + str(self.loadings_data_.loc[c].get('site_name')))
+        descriptive = self._get_descriptive_data()
+        site_names = descriptive.site_name.values if 'site_name' in descriptive.columns else [None] * len(descriptive)
+        for (fccs_id, site_name) in zip(self.loadings_data_.fccs_id.values, site_names):
+            print("ID# " + str(fccs_id) + "\t: " + str(site_name))
 
         print("\nFor more information on a specific fuelbed, use the " +
                ".info(id#, detail=True/False) method.\n")
@@ -183,8 +359,9 @@ class FCCSDB():
 
         """
         try:
-            fb_index = (self.loadings_data_.fccs_id == str(fccs_id)).to_numpy().nonzero()[0][0]
-            row = self.loadings_data_.loc[fb_index]
+            fb_index = self.positions(fccs_id)[0]
+            assert fb_index >= 0
+            row = self._get_fuelbed_row(fb_index)
             text = "\nFCCS ID# : " + str(row.get('fccs_id'))
             text += "\nSite name: " + str(row.get('site_name'))
             text += "\n\nSite description: " + str(row.get('site_description'))
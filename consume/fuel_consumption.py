@@ -33,7 +33,7 @@ There are two alternative options for setting input values:
 
 
     2. Individually set/change input values manually:
-        >>> fc_obj.burn_type = <'natural' or 'activity'>
+        >>> fc_obj.burn_type = <'natural', 'activity', or 'mixed'>
         >>> fc_obj.fuelbed_fccs_ids = [FCCSID#1,FCCSID#2,...]
         >>> fc_obj.fuelbed_area_acres = [AREA#1,AREA#2,...]
         >>> fc_obj.fuelbed_ecoregion = [ECOREGION#1, ECOREGION#2,...]
@@ -68,6 +68,10 @@ There are two alternative options for setting input values:
                   'activity' burns require 6 additional input parameters:
                   10hr fuel moisture, slope, windpseed, fuel moisture type,
                   days since significant rainfall, and length of ignition.
+                  'mixed' takes the 'activity' inputs plus a per-row burn
+                  type ('natural' or 'activity'), the 'burn_type' column of
+                  the scenario file, and calculates each row with the
+                  equations of its burn type in a single run.
 
         fuelbed_fccs_ids
                 : a list of Fuel Characteristic Classification System (FCCS)
@@ -455,15 +459,22 @@ Index 1           Index 2              Index 3                     Index 4
 """
 import math
 import numpy as np
+import pandas as pan
 from . import fccs_db as fccs
 from . import data_desc as dd
 from . import util_consume as util
 from . import con_calc_natural as ccn
 from . import con_calc_activity as cca
 from . import input_settings as settings
+from . consume_results import ConsumeResults
 import logging
+from collections import namedtuple
 from . util_consume import values
 
+# - an entry of the stratum node table, see FuelConsumption._consumption_calc(). settings
+#   are the inputs the calculator reads; state the values it leaves for its dependents.
+StratumNode = namedtuple('StratumNode', ['name', 'rows', 'prereqs', 'settings', 'state', 'calc'])
+
 msg = logging.getLogger(__name__)
 msg.addHandler(logging.StreamHandler())
 
@@ -504,6 +515,10 @@ class FuelConsumption(util.FrozenClass):
                   'activity' burns require 6 additional input parameters:
                   10hr fuel moisture, slope, windpseed, fuel moisture type,
                   days since significant rainfall, and length of ignition.
+                  'mixed' takes the 'activity' inputs plus a per-row burn
+                  type ('natural' or 'activity'), the 'burn_type' column of
+                  the scenario file, and calculates each row with the
+                  equations of its burn type in a single run.
 
         fuelbed_fccs_ids
                 : a list of Fuel Characteristic Classification System (FCCS)
@@ -721,6 +736,17 @@ class FuelConsumption(util.FrozenClass):
     def length_of_ignition(self, value):
         self._settings.set('length_of_ignition', value)
 
+    @property
+    def dedup_stats(self):
+        """ Number of input rows and of distinct scenarios calculated in the last run """
+        return dict(self._dedup_stats)
+
+    @property
+    def recalculated(self):
+        """ The calculator nodes that ran in the last run (the rest reused the results
+            of the run before), when incremental is set """
+        return list(self._recalculated)
+
     @property
     def msg_level(self): return self._msg_level
     @msg_level.setter
@@ -771,6 +797,7 @@ class FuelConsumption(util.FrozenClass):
         self._calc_success = False
         self._unq_inputs = []
         self._runlnk = []
+        self._dedup_stats = {}
         self._internal_units = 'tons_ac'
         self.output_units = self._internal_units
         self._conv_success = False
@@ -778,6 +805,21 @@ class FuelConsumption(util.FrozenClass):
         self._heat_data = None
         self._cons_data = None
 
+        ### - calculate repeated scenarios only once
+        self.deduplicate = True
+
+        ### - only recalculate the strata whose settings changed, see _consumption_calc().
+        ###   Off by default: it keeps a copy of the consumption results between runs.
+        self.incremental = False
+        self._node_cache = {}
+        self._recalculated = []
+        self._calc_version = None
+
+        ### - (scenario count, fuelbeds) loaded by load_scenario_grid()
+        self._grid = None
+        ### - per-row multipliers of loadings columns for a grid, see monte_carlo.py
+        self._loadings_scale = None
+
         self._freeze()
 
     def _reset_outputs(self):
@@ -794,6 +836,7 @@ class FuelConsumption(util.FrozenClass):
         self._calc_success = False
         self._unq_inputs = []
         self._runlnk = []
+        self._dedup_stats = {}
         self._internal_units = 'tons_ac'
         self.output_units = self._internal_units
         self._conv_success = False
@@ -804,8 +847,9 @@ class FuelConsumption(util.FrozenClass):
     def reset_all(self):
         self._reset_outputs()
         self._settings.reset_to_empty()
+        self._node_cache = {}
 
-    def results(self):
+    def results(self, strata=None, columnar=False):
         """Output fuel consumption results as a python DICTIONARY object
 
         Returns a python dictionary comprised of input and output data.
@@ -816,16 +860,30 @@ class FuelConsumption(util.FrozenClass):
         of this file for detailed information on the structure of the dictionary
         and examples of how to extract information from the dictionary.
 
+        Optional arguments:
+
+        strata      : Only calculate what is needed for these strata, e.g.
+                      ['canopy', ('woody fuels', '1-hr fuels')]. Items are
+                      'total', a 1st-order category, or a (category, stratum)
+                      pair as named in the results dictionary. Strata that are
+                      not needed are NaN in the results. Note that 'total'
+                      needs every stratum. Default is everything.
+
+        columnar    : Return a ConsumeResults, which gives the results by the
+                      flattened column names of output_all.csv without
+                      building the dictionary (see consume_results.py).
+
         """
-        self._calculate()
+        self._calculate(strata)
         if self._calc_success:
             self._convert_units()  # does nothing
             self._conv_success = True
             if self._conv_success:
-                return util.make_dictionary_of_lists(cons_data = self._cons_data,
+                results = ConsumeResults(cons_data = self._cons_data,
                                           heat_data = self._heat_data,
                                           emis_data = [],
-                                          inputs = self._settings.package(self.FCCS.loadings_data_))
+                                          inputs = self._settings.package(self.FCCS))
+                return results if columnar else results.to_dict()
 
     def report(self, csv = "", stratum = "all", ret=False, incl_heat=False):
         """Output fuel consumption results as a TABULAR REPORT and/or CSV FILE
@@ -913,6 +971,96 @@ class FuelConsumption(util.FrozenClass):
         """
         return self._settings.load_from_file(load_file)
 
+    def load_scenario_from_dataframe(self, contents, display=True):
+        """Loads scenario input parameters from a pandas DataFrame
+
+        Required argument:
+
+        contents   : DataFrame with the columns of a scenario CSV file, e.g.
+                     one block of rows read with pandas.read_csv(chunksize=...)
+
+        """
+        return self._settings.load_from_dataframe(contents)
+
+    def load_scenario_grid(self, fuelbeds, scenarios, display=True):
+        """Loads every combination of a set of fuelbeds and a set of scenarios
+
+        Required arguments:
+
+        fuelbeds   : the N fuelbeds (FCCS IDs) to calculate
+
+        scenarios  : DataFrame with the columns of a scenario CSV file, less
+                     'fuelbeds', one row for each of M scenarios
+
+        Every fuelbed is calculated with every scenario, scenario-major: row
+        m * N + n of the results is scenario m applied to fuelbed n. The
+        loadings are kept once, not once per scenario. Use grid_results() to
+        get the results shaped (scenario, fuelbed).
+
+        """
+        fuelbeds = np.asarray([str(f) for f in fuelbeds])
+        scenarios = pan.DataFrame(scenarios).reset_index(drop=True)
+        assert 'fuelbeds' not in scenarios.columns, "Error: the fuelbeds are specified separately from the scenarios"
+        contents = scenarios.iloc[np.repeat(np.arange(len(scenarios)), len(fuelbeds))].reset_index(drop=True)
+        contents['fuelbeds'] = np.tile(fuelbeds, len(scenarios))
+        self._grid = None
+        if self._settings.load_from_dataframe(contents):
+            self._grid = (len(scenarios), fuelbeds)
+            return True
+        return False
+
+    def replace_settings(self, settings, grid=None):
+        """Replaces the scenario with a ConsumeInputSettings object, e.g. one made
+        with subset() from the settings of another FuelConsumption object
+
+        Optional argument:
+
+        grid       : (scenario count, fuelbeds) if the rows of settings are a
+                     scenario grid, see load_scenario_grid()
+
+        Any loadings scale (see set_loadings_scale()) is dropped.
+
+        """
+        self._settings = settings
+        self._grid = None if grid is None else (grid[0], np.asarray([str(f) for f in grid[1]]))
+        self._loadings_scale = None
+
+    def set_loadings_scale(self, scale):
+        """Multiplies loadings columns by per-row values, e.g. Monte Carlo draws of
+        the uncertainty of the loadings. Only used with a scenario grid.
+
+        Required argument:
+
+        scale      : dictionary of loadings column (see data_desc.LoadingsMatrixColumns)
+                     to an array with one multiplier per row, or None
+
+        """
+        self._loadings_scale = scale
+        # - the settings haven't changed, but the last calculation is out of date
+        self._calc_version = None
+
+    @property
+    def grid_shape(self):
+        """ (scenarios, fuelbeds) of the scenario grid that is loaded, or None, see
+            load_scenario_grid() """
+        fuelbeds = self._settings.get('fuelbeds')
+        if fuelbeds is None or not self._grid_matches(fuelbeds):
+            return None
+        return (self._grid[0], len(self._grid[1]))
+
+    def grid_results(self, strata=None):
+        """ results() with each per-row value shaped (scenario, fuelbed), for a
+            scenario grid loaded with load_scenario_grid() """
+        shape = self.grid_shape
+        assert shape, "Error: no scenario grid is loaded"
+        return util.to_grid(self.results(strata), shape)
+
+    def _grid_matches(self, ids):
+        """ Are ids the fuelbeds of the loaded scenario grid """
+        if self._grid is None or len(ids) != self._grid[0] * len(self._grid[1]):
+            return False
+        return bool((np.asarray(ids).astype(str).reshape(self._grid[0], -1) == self._grid[1]).all())
+
     def load_scenario_from_dict(self, params, display=True):
         """Loads scenario input parameters from a CSV file
 
@@ -1105,7 +1253,7 @@ class FuelConsumption(util.FrozenClass):
             print(txt)
         else: return txt
 
-    def _calculate(self):
+    def _calculate(self, strata=None):
         """ Validates input parameters before executing Consume 3.0 equations
 
         Validates and modifies all input parameters and calls the function that
@@ -1116,14 +1264,21 @@ class FuelConsumption(util.FrozenClass):
         self._reset_outputs()
 
         if self._settings.settings_are_complete():
-            self._consumption_calc()
+            self._consumption_calc(strata)
             self._heat_release_calc()
             self._calc_success = True
+            # - a partial calculation doesn't count as up to date for Emissions
+            self._calc_version = self._settings.version if strata is None else None
             return True
         else:
             return False
 
 
+    def _inputs_changed(self):
+        """ Have the settings changed since the last calculation? Compares the settings
+            version (see ConsumeInputSettings._changed()), so this doesn't look at the values """
+        return self._calc_version != self._settings.version
+
     def _convert_units(self, explicit_units=None):
         """ Checks units and runs the unit conversion method for output data """
         # Convert to the desired output units
@@ -1159,7 +1314,8 @@ class FuelConsumption(util.FrozenClass):
         key = self._settings.units.split('_')[0]
         assert key in btu_dict.keys()
         BTU_PER_UNIT = btu_dict[key]
-        self._heat_data = (self._cons_data * BTU_PER_UNIT)
+        # - heat release is only reported for the total (stratum 0)
+        self._heat_data = (self._cons_data[:1] * BTU_PER_UNIT)
 
     '''
     This is an efficient way to get the specified fuelbeds. However, if the user has
@@ -1175,21 +1331,46 @@ class FuelConsumption(util.FrozenClass):
         return self.FCCS.loadings_data_.ix[selector_mask]
     '''
 
-    def _get_loadings_for_specified_files(self, ids):
-        ''' gets the specified fuelbeds from the dataframe.
+    def _get_loadings_for_specified_files(self, ids, columns=None):
+        ''' gets the specified fuelbeds from the loadings as a LoadingsMatrix
+            (a single 2-D float array, one column per fuelbed). columns limits
+            it to those loadings, see FCCSDB.gather().
         '''
-        results = []
-        for id in ids:
-            try:
-                tmp =  self.FCCS.loadings_data_[self.FCCS.loadings_data_.fccs_id==id].index[0]
-                results.append(tmp)
-            except:
-                assert False, "Error: Invalid fuelbed specified"
-        return self.FCCS.loadings_data_.iloc[results]
+        if self._grid_matches(ids):
+            # - a scenario grid: one copy of the loadings of its fuelbeds
+            results = self.FCCS.positions(self._grid[1])
+            assert (results >= 0).all(), "Error: Invalid fuelbed specified"
+            return self.FCCS.gather(results, repeats=self._grid[0], scale=self._loadings_scale, columns=columns)
+        results = self.FCCS.positions(ids)
+        assert (results >= 0).all(), "Error: Invalid fuelbed specified"
+        return self.FCCS.gather(results, columns=columns)
+
+    def _strata_rows(self, strata):
+        """ The set of consumption output rows (see dd.ConsumptionStrata) that have
+            to be calculated for the requested strata. Each item of strata is
+            'total', a 1st-order category (e.g. 'canopy'), or a
+            (category, stratum) pair such as ('woody fuels', '1-hr fuels').
+            None requests everything.
+        """
+        leaves = [i for i, s in enumerate(dd.ConsumptionStrata) if 'summary' != s[0]]
+        if strata is None:
+            return set(leaves)
+        rows = set()
+        for item in strata:
+            if isinstance(item, str):
+                item = ('summary', item)
+            assert tuple(item) in dd.ConsumptionStrata, "Unknown consumption stratum: {}".format(item)
+            category, stratum = item
+            if 'summary' != category:
+                rows.add(dd.ConsumptionStrata.index((category, stratum)))
+            else:
+                rows.update([i for i in leaves if stratum in ('total', dd.ConsumptionStrata[i][0])])
+        return rows
 
     def calc_ff_redux_proportion(self, LD, ff_reduction):
         # total forest floor depth (inches)
-        ff_depth = (LD['duff_upper_depth'] + LD['duff_lower_depth'] + LD['lit_depth'] + LD['lch_depth'] + LD['moss_depth']).values
+        ff_depth = (values(LD, 'duff_upper_depth') + values(LD, 'duff_lower_depth') +
+            values(LD, 'lit_depth') + values(LD, 'lch_depth') + values(LD, 'moss_depth'))
 
         # - this works correctly but still generates a warning, use the
         #   context manager to swallow the benign warning
@@ -1201,11 +1382,36 @@ class FuelConsumption(util.FrozenClass):
 
         return ff_redux_proportion
 
-    def _consumption_calc(self):
+    def _dedup_inputs(self):
+        """ Returns the settings to calculate consumption for.
+
+        Rows whose fuelbed and settings are all identical give identical
+        results, so when there are repeats only the first occurrence of each
+        distinct scenario is calculated. _unq_inputs holds the rows that are
+        calculated and _runlnk maps every input row to its calculated column;
+        the results are expanded back to all rows with util._unpack().
+        """
+        nrows = len(self._settings.get('fuelbeds'))
+        # - rows with the same settings differ if their loadings are scaled differently
+        rows = self._settings.unique_rows() if self.deduplicate and not self._loadings_scale else None
+        if rows is not None and len(rows[0]) < nrows:
+            self._unq_inputs, self._runlnk = rows
+            self._unique_check = True
+        self._dedup_stats = {
+            'rows': nrows,
+            'unique': len(self._unq_inputs) if self._unique_check else nrows}
+        msg.info("Consumption calculated for {unique} unique of {rows} input rows".format(**self._dedup_stats))
+        return self._settings.subset(self._unq_inputs) if self._unique_check else self._settings
+
+    def _consumption_calc(self, strata=None):
         """Calculates fuel consumption estimates.
 
         Input parameters must be set prior to running this method.
 
+        strata limits the calculation to the calculators needed for the listed
+        strata, see _strata_rows(). The rows of strata that are not calculated
+        are NaN. By default everything is calculated.
+
         Calculates fuel consumption for each of 36 sub-categories and 7 major
         categories of fuel types from the given inputs using the equations
         found in the Consume 3.0 User's Manual.
@@ -1221,195 +1427,299 @@ class FuelConsumption(util.FrozenClass):
 
 
         """
-        LD = self._get_loadings_for_specified_files(self._settings.get('fuelbeds'))
+        # - identical scenarios are only calculated once, see _dedup_inputs()
+        inputs = self._dedup_inputs()
+        LD = self._get_loadings_for_specified_files(inputs.get('fuelbeds'))
 
         # Setup ecoregion masks for equations that vary by ecoregion
-        ecodict = {"maskb": {"boreal":1, "western":0, "southern":0},
-                     "masks": {"boreal":0, "western":0, "southern":1},
-                     "maskw": {"boreal":0, "western":1, "southern":0}}
-        ecoregion = self._settings.get('ecoregion')
-        ecob_mask = [ecodict["maskb"][e] for e in ecoregion]
-        ecos_mask = [ecodict["masks"][e] for e in ecoregion]
-        ecow_mask = [ecodict["maskw"][e] for e in ecoregion]
-        ecoregion_masks = {'boreal':ecob_mask, 'southern':ecos_mask , 'western':ecow_mask}
+        def get_ecoregion_masks(inputs):
+            ecodict = {"maskb": {"boreal":1, "western":0, "southern":0},
+                         "masks": {"boreal":0, "western":0, "southern":1},
+                         "maskw": {"boreal":0, "western":1, "southern":0}}
+            ecoregion = inputs.get('ecoregion')
+            ecob_mask = [ecodict["maskb"][e] for e in ecoregion]
+            ecos_mask = [ecodict["masks"][e] for e in ecoregion]
+            ecow_mask = [ecodict["maskw"][e] for e in ecoregion]
+            return {'boreal':ecob_mask, 'southern':ecos_mask , 'western':ecow_mask}
+        ecoregion_masks = get_ecoregion_masks(inputs)
 
            ########################################################
         ############ Fuel Consumption Calculation Execution ##########
            ########################################################
 
-        [can_over_fsrt, can_mid_fsrt, can_under_fsrt, can_snag1f_fsrt,
-         can_snag1w_fsrt, can_snag1nf_fsrt, can_snag2_fsrt, can_snag3_fsrt,
-         can_ladder_fsrt] = ccn.ccon_canopy(self._settings.get('can_con_pct'), LD)
-
-        season = np.where('spring' == self._settings.get('season') , 1, 0)
-        [shb_prim_fsrt, shb_seco_fsrt] =\
-            ccn.shrub_calc(self._settings.get('shrub_black_pct'), LD, ecoregion_masks, season)
-
-        [nw_prim_fsrt, nw_seco_fsrt] = ccn.herb_calc(LD, ecoregion_masks)
-
-        [stump_snd_fsrt, stump_rot_fsrt, stump_ltr_fsrt] = ccn.stump_calc(LD)
-
-        # special case for piles
-        pile_fsrt = ccn.pile_calc(self._settings.get('pile_black_pct'), LD)
-        self._cons_data_piles = pile_fsrt
-
-        fm_1000hr = self._settings.get('fm_1000hr')
-        fm_duff =  self._settings.get('fm_duff')
-        fm_litter =  self._settings.get('fm_litter')
-        duff_pct_available = self._settings.get('duff_pct_available')
-        sound_cwd_pct_available = self._settings.get('sound_cwd_pct_available')
-        rotten_cwd_pct_available = self._settings.get('rotten_cwd_pct_available')
-        if self._settings.burn_type in ['natural', ['natural']]:
-            one_hr_fsrt = ccn.sound_one_calc(LD, ecos_mask)
-            ten_hr_fsrt = ccn.sound_ten_calc(LD, ecos_mask)
-            hun_hr_fsrt = ccn.sound_hundred_calc(LD, ecos_mask)
-            oneK_hr_snd_fsrt, tenK_hr_snd_fsrt, tnkp_hr_snd_fsrt = \
-                ccn.sound_large_wood_calc(LD, fm_1000hr, sound_cwd_pct_available)
-            oneK_hr_rot_fsrt, tenK_hr_rot_fsrt, tnkp_hr_rot_fsrt = \
-                ccn.rotten_large_wood_calc(LD, fm_1000hr, rotten_cwd_pct_available)
-
-            lit_fsrt, litter_proportion_consumed  = ccn.litter_calc(LD, fm_duff, fm_litter, ecoregion_masks)
-            lch_fsrt = ccn.lichen_calc(LD, fm_duff, fm_litter, ecoregion_masks, litter_proportion_consumed)
-            moss_fsrt = ccn.moss_calc(LD, fm_duff, fm_litter, ecoregion_masks, litter_proportion_consumed)
-
-            duff_upper_fsrt, duff_lower_fsrt, duff_proportion_consumed = ccn.duff_calc(LD, fm_duff, fm_litter, ecoregion_masks, duff_pct_available)
-            bas_fsrt = ccn.basal_accumulation_calc(LD, fm_duff, fm_litter, ecoregion_masks, duff_proportion_consumed)
-            sqm_fsrt = ccn.squirrel_midden_calc(LD, fm_duff, fm_litter, ecoregion_masks, duff_proportion_consumed)
-        else:
-            fm_type = self._settings.fm_type
-            windspeed =  self._settings.get('windspeed')
-            slope =  self._settings.get('slope')
-            area =  self._settings.get('area')
-            days_since_rain =  self._settings.get('days_since_rain')
-            fm_10hr =  self._settings.get('fm_10hr')
-            length_of_ignition =  self._settings.get('length_of_ignition')
-
-            [one_hr_fsrt, ten_hr_fsrt, hun_hr_fsrt,
-            [oneK_hr_snd_fsrt, oneK_hr_rot_fsrt],
-            [tenK_hr_snd_fsrt, tenK_hr_rot_fsrt],
-            [tnkp_hr_snd_fsrt, tnkp_hr_rot_fsrt],
-            ff_reduction] = cca.ccon_activity(fm_1000hr, fm_type,
-                windspeed, slope, area, days_since_rain, fm_10hr, length_of_ignition, LD,
-                duff_pct_available, sound_cwd_pct_available, rotten_cwd_pct_available)
-
-            # The ff reduction is a destructive process (modifies the ff_reduction array)
-            # Make a copy for use in basal area and sq midden calcs
-            ff_redux_copy = ff_reduction.copy()
-            lch_fsrt = cca.ccon_forest_floor(LD, ff_reduction, 'lch_depth', 'lichen_loading', [0.95, 0.05, 0.00])
-            moss_fsrt = cca.ccon_forest_floor(LD, ff_reduction, 'moss_depth', 'moss_loading', [0.95, 0.05, 0.00])
-            lit_fsrt = cca.ccon_forest_floor(LD, ff_reduction, 'lit_depth', 'litter_loading', [0.90, 0.10, 0.00])
-
-            layer_reduction = cca.calc_and_reduce_ff(LD, ff_reduction, 'duff_upper_depth')
-            # - how much was it reduced relative to the layer depth
-            proportional_reduction = np.where(LD['duff_upper_depth'] > 0.0, layer_reduction / LD['duff_upper_depth'], 0.0)
+        # - every calculator writes straight into its slice of the output array
+        #   (strata in the order of the output rows, see dd.ConsumptionStrata)
+        cons = np.zeros((40, 4, len(LD)))
+        # - values passed from a calculator to the calculators that depend on it
+        state = {}
+
+        def canopy():
+            ccn.ccon_canopy(inputs.get('can_con_pct'), LD, out=cons[7:16])
+
+        def shrub():
+            season = np.where('spring' == inputs.get('season') , 1, 0)
+            ccn.shrub_calc(inputs.get('shrub_black_pct'), LD, ecoregion_masks, season, out=cons[16:18])
+
+        def nonwoody():
+            ccn.herb_calc(LD, ecoregion_masks, out=cons[18:20])
+
+        def stumps():
+            ccn.stump_calc(LD, out=cons[28:31])
+
+        def piles():
+            # special case for piles
+            ccn.pile_calc(inputs.get('pile_black_pct'), LD, out=cons[27])
+
+        # - the stratum node table, in evaluation order. A node's prerequisites always
+        #   come before it.
+        nodes = [
+            StratumNode('canopy', range(7, 16), [], ['can_con_pct'], [], canopy),
+            StratumNode('shrub', [16, 17], [], ['shrub_black_pct', 'season', 'ecoregion'], [], shrub),
+            StratumNode('nonwoody', [18, 19], [], ['ecoregion'], [], nonwoody),
+            StratumNode('stumps', [28, 29, 30], [], [], [], stumps),
+            StratumNode('piles', [27], [], ['pile_black_pct'], [], piles)]
+
+        # - the woody and forest floor calculators of each burn type. They write to the
+        #   cons they are given, which has a column for each row of inputs and LD.
+        def natural_nodes(inputs, LD, cons):
+            ecoregion_masks = get_ecoregion_masks(inputs)
+            ecos_mask = ecoregion_masks['southern']
+            fm_1000hr = inputs.get('fm_1000hr')
+            fm_duff =  inputs.get('fm_duff')
+            fm_litter =  inputs.get('fm_litter')
+            duff_pct_available = inputs.get('duff_pct_available')
+            sound_cwd_pct_available = inputs.get('sound_cwd_pct_available')
+            rotten_cwd_pct_available = inputs.get('rotten_cwd_pct_available')
+
+            def one_hr():
+                ccn.sound_one_calc(LD, ecos_mask, out=cons[31])
+
+            def ten_hr():
+                ccn.sound_ten_calc(LD, ecos_mask, out=cons[32])
+
+            def hundred_hr():
+                ccn.sound_hundred_calc(LD, ecos_mask, out=cons[33])
+
+            def sound_large_wood():
+                # - 1000hr, 10khr, and >10khr alternate sound and rotten in the output
+                ccn.sound_large_wood_calc(LD, fm_1000hr, sound_cwd_pct_available, out=cons[34:40:2])
+
+            def rotten_large_wood():
+                ccn.rotten_large_wood_calc(LD, fm_1000hr, rotten_cwd_pct_available, out=cons[35:40:2])
+
+            def litter():
+                lit_fsrt, state['litter_proportion_consumed'] = \
+                    ccn.litter_calc(LD, fm_duff, fm_litter, ecoregion_masks, out=cons[20])
+
+            def lichen():
+                ccn.lichen_calc(LD, fm_duff, fm_litter, ecoregion_masks, state['litter_proportion_consumed'], out=cons[21])
+
+            def moss():
+                ccn.moss_calc(LD, fm_duff, fm_litter, ecoregion_masks, state['litter_proportion_consumed'], out=cons[22])
+
+            def duff():
+                duff_upper_fsrt, duff_lower_fsrt, state['duff_proportion_consumed'] = \
+                    ccn.duff_calc(LD, fm_duff, fm_litter, ecoregion_masks, duff_pct_available, out=cons[23:25])
+
+            def basal_accumulations():
+                ccn.basal_accumulation_calc(LD, fm_duff, fm_litter, ecoregion_masks, state['duff_proportion_consumed'], out=cons[25])
+
+            def squirrel_middens():
+                ccn.squirrel_midden_calc(LD, fm_duff, fm_litter, ecoregion_masks, state['duff_proportion_consumed'], out=cons[26])
+
+            forest_floor = ['fm_duff', 'fm_litter', 'ecoregion']
+            return [
+                StratumNode('1-hr', [31], [], ['ecoregion'], [], one_hr),
+                StratumNode('10-hr', [32], [], ['ecoregion'], [], ten_hr),
+                StratumNode('100-hr', [33], [], ['ecoregion'], [], hundred_hr),
+                StratumNode('sound large wood', [34, 36, 38], [],
+                    ['fm_1000hr', 'sound_cwd_pct_available'], [], sound_large_wood),
+                StratumNode('rotten large wood', [35, 37, 39], [],
+                    ['fm_1000hr', 'rotten_cwd_pct_available'], [], rotten_large_wood),
+                StratumNode('litter', [20], [], forest_floor, ['litter_proportion_consumed'], litter),
+                StratumNode('lichen', [21], ['litter'], forest_floor, [], lichen),
+                StratumNode('moss', [22], ['litter'], forest_floor, [], moss),
+                StratumNode('duff', [23, 24], [], forest_floor + ['duff_pct_available'],
+                    ['duff_proportion_consumed'], duff),
+                StratumNode('basal accumulations', [25], ['duff'], forest_floor, [], basal_accumulations),
+                StratumNode('squirrel middens', [26], ['duff'], forest_floor, [], squirrel_middens)]
+
+        def activity_nodes(inputs, LD, cons):
+            fm_1000hr = inputs.get('fm_1000hr')
+            duff_pct_available = inputs.get('duff_pct_available')
+            sound_cwd_pct_available = inputs.get('sound_cwd_pct_available')
+            rotten_cwd_pct_available = inputs.get('rotten_cwd_pct_available')
+            fm_type = inputs.fm_type
+            windspeed =  inputs.get('windspeed')
+            slope =  inputs.get('slope')
+            area =  inputs.get('area')
+            days_since_rain =  inputs.get('days_since_rain')
+            fm_10hr =  inputs.get('fm_10hr')
+            length_of_ignition =  inputs.get('length_of_ignition')
 
             tempTotalDuffValues = values(LD, 'duff_upper_loading') + values(LD, 'duff_lower_loading')
-
             tempUpperValues = values(LD, 'duff_upper_loading')
-            tempLowerValues = values(LD, 'duff_lower_loading')
-
-            revisedUpperValues = np.where(tempUpperValues < tempTotalDuffValues * (duff_pct_available/100.0), tempUpperValues, tempTotalDuffValues * (duff_pct_available/100.0))
-            # example: 5 upper, 5 lower, pct_available = 80 or 30
-            # if 5 <= 8, set to 5.
-            # if 5 > 3, set to 3  (use 3 of 5 upper)
-
-            totalUpper = proportional_reduction * revisedUpperValues
-            duff_upper_fsrt = util.csdist(totalUpper, [0.10, 0.70, 0.20])
 
-            revisedLowerValues = np.where(tempUpperValues < tempTotalDuffValues * (duff_pct_available/100.0), tempTotalDuffValues * (duff_pct_available/100.0) - tempUpperValues, 0.0)
-            # if 5 < 8, set to 8-5
-            # if 5 >= 3, set to zero
-
-            layer_reduction = cca.calc_and_reduce_ff(LD, ff_reduction, 'duff_lower_depth')
-            # - how much was it reduced relative to the layer depth
-            proportional_reduction = np.where(LD['duff_lower_depth'] > 0.0, layer_reduction / LD['duff_lower_depth'], 0.0)
-
-            totalLower = proportional_reduction * revisedLowerValues
-            duff_lower_fsrt = util.csdist(totalLower, [0.00, 0.20, 0.80])
-
-            ff_redux_proportion = self.calc_ff_redux_proportion(LD, ff_redux_copy)
-            bas_fsrt = cca.ccon_bas(values(LD, 'bas_loading'), ff_redux_proportion)
-            sqm_fsrt = cca.ccon_sqm(values(LD, 'sqm_loading'), ff_redux_proportion)
-
-
-        # Category summations
-        can_fsrt = sum([can_over_fsrt, can_mid_fsrt, can_under_fsrt,
-                        can_snag1f_fsrt, can_snag1w_fsrt, can_snag1nf_fsrt,
-                        can_snag2_fsrt, can_snag3_fsrt, can_ladder_fsrt])
-        shb_fsrt = sum([shb_prim_fsrt, shb_seco_fsrt])
-        nw_fsrt = sum([nw_prim_fsrt, nw_seco_fsrt])
-        llm_fsrt = sum([lch_fsrt, moss_fsrt, lit_fsrt])
-        gf_fsrt = sum([duff_upper_fsrt, duff_lower_fsrt, bas_fsrt, sqm_fsrt])
-        woody_fsrt = sum([pile_fsrt, stump_snd_fsrt, stump_rot_fsrt, stump_ltr_fsrt,
-                    one_hr_fsrt, ten_hr_fsrt, hun_hr_fsrt, oneK_hr_snd_fsrt,
-                    oneK_hr_rot_fsrt, tenK_hr_snd_fsrt, tenK_hr_rot_fsrt,
-                    tnkp_hr_snd_fsrt, tnkp_hr_rot_fsrt])
-
-        all_fsrt = sum([can_fsrt, shb_fsrt, nw_fsrt,
-                        llm_fsrt, gf_fsrt, woody_fsrt])
+            def woody():
+                [cons[31], cons[32], cons[33],
+                cons[34:36], cons[36:38], cons[38:40],
+                state['ff_reduction']] = cca.ccon_activity(fm_1000hr, fm_type,
+                    windspeed, slope, area, days_since_rain, fm_10hr, length_of_ignition, LD,
+                    duff_pct_available, sound_cwd_pct_available, rotten_cwd_pct_available)
+
+                # The ff reduction is a destructive process (modifies the ff_reduction array)
+                # Make a copy for use in basal area and sq midden calcs
+                state['ff_redux_copy'] = state['ff_reduction'].copy()
+
+            # - the forest floor layers each reduce ff_reduction in turn, top down
+            def lichen():
+                cca.ccon_forest_floor(LD, state['ff_reduction'], 'lch_depth', 'lichen_loading', [0.95, 0.05, 0.00], out=cons[21])
+
+            def moss():
+                cca.ccon_forest_floor(LD, state['ff_reduction'], 'moss_depth', 'moss_loading', [0.95, 0.05, 0.00], out=cons[22])
+
+            def litter():
+                cca.ccon_forest_floor(LD, state['ff_reduction'], 'lit_depth', 'litter_loading', [0.90, 0.10, 0.00], out=cons[20])
+
+            def duff_upper():
+                layer_reduction = cca.calc_and_reduce_ff(LD, state['ff_reduction'], 'duff_upper_depth')
+                # - how much was it reduced relative to the layer depth
+                duff_upper_depth = values(LD, 'duff_upper_depth')
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    proportional_reduction = np.where(duff_upper_depth > 0.0, layer_reduction / duff_upper_depth, 0.0)
+
+                revisedUpperValues = np.where(tempUpperValues < tempTotalDuffValues * (duff_pct_available/100.0), tempUpperValues, tempTotalDuffValues * (duff_pct_available/100.0))
+                # example: 5 upper, 5 lower, pct_available = 80 or 30
+                # if 5 <= 8, set to 5.
+                # if 5 > 3, set to 3  (use 3 of 5 upper)
+
+                totalUpper = proportional_reduction * revisedUpperValues
+                util.csdist(totalUpper, [0.10, 0.70, 0.20], out=cons[23])
+
+            def duff_lower():
+                revisedLowerValues = np.where(tempUpperValues < tempTotalDuffValues * (duff_pct_available/100.0), tempTotalDuffValues * (duff_pct_available/100.0) - tempUpperValues, 0.0)
+                # if 5 < 8, set to 8-5
+                # if 5 >= 3, set to zero
+
+                layer_reduction = cca.calc_and_reduce_ff(LD, state['ff_reduction'], 'duff_lower_depth')
+                # - how much was it reduced relative to the layer depth
+                duff_lower_depth = values(LD, 'duff_lower_depth')
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    proportional_reduction = np.where(duff_lower_depth > 0.0, layer_reduction / duff_lower_depth, 0.0)
+
+                totalLower = proportional_reduction * revisedLowerValues
+                util.csdist(totalLower, [0.00, 0.20, 0.80], out=cons[24])
+
+            def ff_redux_proportion():
+                state['ff_redux_proportion'] = self.calc_ff_redux_proportion(LD, state['ff_redux_copy'])
+
+            def basal_accumulations():
+                cca.ccon_bas(values(LD, 'bas_loading'), state['ff_redux_proportion'], out=cons[25])
+
+            def squirrel_middens():
+                cca.ccon_sqm(values(LD, 'sqm_loading'), state['ff_redux_proportion'], out=cons[26])
+
+            return [
+                StratumNode('woody', range(31, 40), [],
+                    ['fm_1000hr', 'fm_type', 'windspeed', 'slope', 'area', 'days_since_rain', 'fm_10hr',
+                    'length_of_ignition', 'duff_pct_available', 'sound_cwd_pct_available',
+                    'rotten_cwd_pct_available'], ['ff_reduction', 'ff_redux_copy'], woody),
+                StratumNode('lichen', [21], ['woody'], [], ['ff_reduction'], lichen),
+                StratumNode('moss', [22], ['lichen'], [], ['ff_reduction'], moss),
+                StratumNode('litter', [20], ['moss'], [], ['ff_reduction'], litter),
+                StratumNode('duff upper', [23], ['litter'], ['duff_pct_available'], ['ff_reduction'], duff_upper),
+                StratumNode('duff lower', [24], ['duff upper'], ['duff_pct_available'], ['ff_reduction'], duff_lower),
+                StratumNode('ff redux proportion', [], ['woody'], [], ['ff_redux_proportion'], ff_redux_proportion),
+                StratumNode('basal accumulations', [25], ['ff redux proportion'], [], [], basal_accumulations),
+                StratumNode('squirrel middens', [26], ['ff redux proportion'], [], [], squirrel_middens)]
+
+        def subset_nodes(make_nodes, burn_type, subset):
+            """ The nodes of a burn type calculated for a subset of the rows. Each node
+                calculates into a cons of its own and copies its rows to its columns. """
+            sub_cons = np.zeros((40, 4, len(subset)))
+            def scatter(node):
+                def calc():
+                    node.calc()
+                    for row in node.rows:
+                        cons[row][:, subset] = sub_cons[row]
+                return calc
+            return [node._replace(name='{} ({})'.format(node.name, burn_type),
+                        prereqs=['{} ({})'.format(p, burn_type) for p in node.prereqs], calc=scatter(node))
+                    for node in make_nodes(inputs.subset(subset), LD.take(subset), sub_cons)]
+
+        if 'mixed' == inputs.burn_type:
+            # - each row uses the equations of its own burn type, see subset_nodes()
+            row_burn_types = np.broadcast_to(np.asarray(inputs.get('burn_type')), len(LD))
+            for burn_type, make_nodes in [('natural', natural_nodes), ('activity', activity_nodes)]:
+                subset = np.nonzero(burn_type == row_burn_types)[0]
+                if len(subset):
+                    nodes += subset_nodes(make_nodes, burn_type, subset)
+        elif inputs.burn_type in ['natural', ['natural']]:
+            nodes += natural_nodes(inputs, LD, cons)
+        else:
+            nodes += activity_nodes(inputs, LD, cons)
+
+        # - run the nodes that produce the requested rows, and their prerequisites
+        rows = self._strata_rows(strata)
+        needed = set([node.name for node in nodes if rows.intersection(node.rows)])
+        for node in reversed(nodes):
+            if node.name in needed:
+                needed.update(node.prereqs)
+
+        # - with incremental, a node whose settings and prerequisites are unchanged since
+        #   the last calculation reuses its previous rows and state
+        cache = self._node_cache if self.incremental else {}
+        if self.incremental and (cache.get('fuelbeds') != inputs.fingerprint(['burn_type', 'fuelbeds'])
+                or cache.get('loadings') is not self.FCCS.loadings_data_):
+            cache = {'fuelbeds': inputs.fingerprint(['burn_type', 'fuelbeds']),
+                'loadings': self.FCCS.loadings_data_, 'nodes': {}}
+        recalculated = set()
+        for node in nodes:
+            node_rows = list(node.rows)
+            if node.name not in needed:
+                # - not calculated, and neither are the summaries that include it
+                cons[node_rows] = np.nan
+                if self.incremental:
+                    cache['nodes'].pop(node.name, None)
+                continue
+            if not self.incremental:
+                node.calc()
+                continue
+            digest = inputs.fingerprint(node.settings)
+            previous = cache['nodes'].get(node.name)
+            if previous and previous[0] == digest and not recalculated.intersection(node.prereqs):
+                cons[node_rows] = cache['cons'][node_rows]
+                state.update([(k, np.array(v, copy=True)) for k, v in previous[1].items()])
+            else:
+                node.calc()
+                recalculated.add(node.name)
+                cache['nodes'][node.name] = (digest, dict([(k, np.array(state[k], copy=True)) for k in node.state]))
+        if self.incremental:
+            cache['cons'] = cons.copy()
+            self._recalculated = [node.name for node in nodes if node.name in recalculated]
+        self._node_cache = cache
+
+        # - a copy, not a view: unit conversion scales the output array in place
+        self._cons_data_piles = cons[27].copy()
+
+        # Category summations, in place. The order of the parts matters to the last bit.
+        util.sum_into(cons[1], cons[7:16])                  # canopy
+        util.sum_into(cons[2], cons[16:18])                 # shrub
+        util.sum_into(cons[3], cons[18:20])                 # nonwoody
+        util.sum_into(cons[4], cons[[21, 22, 20]])          # litter-lichen-moss
+        util.sum_into(cons[5], cons[23:27])                 # ground fuels
+        util.sum_into(cons[6], cons[27:40])                 # woody
+        util.sum_into(cons[0], cons[1:7])                   # all
 
         #######################
         #### OUTPUT EXPORT ####
         #######################
 
-        self._ucons_data = np.array(
-            [all_fsrt,
-            can_fsrt,
-            shb_fsrt,
-            nw_fsrt,
-            llm_fsrt,
-            gf_fsrt,
-            woody_fsrt,
-            can_over_fsrt,
-            can_mid_fsrt,
-            can_under_fsrt,
-            can_snag1f_fsrt,
-            can_snag1w_fsrt,
-            can_snag1nf_fsrt,
-            can_snag2_fsrt,
-            can_snag3_fsrt,
-            can_ladder_fsrt,
-            shb_prim_fsrt,
-            shb_seco_fsrt,
-            nw_prim_fsrt,
-            nw_seco_fsrt,
-            lit_fsrt,
-            lch_fsrt,
-            moss_fsrt,
-            duff_upper_fsrt,
-            duff_lower_fsrt,
-            bas_fsrt,
-            sqm_fsrt,
-            pile_fsrt,
-            stump_snd_fsrt,
-            stump_rot_fsrt,
-            stump_ltr_fsrt,
-            one_hr_fsrt,
-            ten_hr_fsrt,
-            hun_hr_fsrt,
-            oneK_hr_snd_fsrt,
-            oneK_hr_rot_fsrt,
-            tenK_hr_snd_fsrt,
-            tenK_hr_rot_fsrt,
-            tnkp_hr_snd_fsrt,
-            tnkp_hr_rot_fsrt]
-            )
-
-        # delete extraneous memory hogging variables
-        del (all_fsrt, can_fsrt, shb_fsrt, nw_fsrt, llm_fsrt,
-                gf_fsrt,woody_fsrt, can_over_fsrt, can_mid_fsrt, can_under_fsrt,
-                can_snag1f_fsrt, can_snag1w_fsrt, can_snag1nf_fsrt,
-                can_snag2_fsrt, can_snag3_fsrt, can_ladder_fsrt,
-                shb_prim_fsrt, shb_seco_fsrt,
-                nw_prim_fsrt, nw_seco_fsrt, lit_fsrt, lch_fsrt,
-                moss_fsrt, duff_upper_fsrt, duff_lower_fsrt, bas_fsrt,
-                sqm_fsrt, pile_fsrt, stump_snd_fsrt, stump_rot_fsrt, stump_ltr_fsrt,
-                one_hr_fsrt, ten_hr_fsrt, hun_hr_fsrt, oneK_hr_snd_fsrt,
-                oneK_hr_rot_fsrt, tenK_hr_snd_fsrt, tenK_hr_rot_fsrt,
-                tnkp_hr_snd_fsrt, tnkp_hr_rot_fsrt)
+        self._ucons_data = cons
 
         if self._unique_check:
-            self._cons_data = _unpack(self._ucons_data, self._runlnk)
+            self._cons_data = util._unpack(self._ucons_data, self._runlnk)
+            self._cons_data_piles = util._unpack(self._cons_data_piles, self._runlnk)
         else:
             self._cons_data = self._ucons_data
 
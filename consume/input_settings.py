@@ -1,6 +1,8 @@
 ''' ---------------------------------------------------------------------------
 Code in this file deals with input settings to consume
 ---------------------------------------------------------------------------- '''
+import hashlib
+import itertools
 import numpy as np
 import pandas as pan
 import os
@@ -48,6 +50,37 @@ def validate_list(input_vals, permitted_vals):
 def is_sequence(maybe_seq):
     return iterable(maybe_seq)
 
+def _row_codes(seq):
+    ''' Integer codes identifying equal values in a setting sequence. Floats are
+        compared bit for bit so that, e.g., 0.0 and -0.0 stay distinct.
+    '''
+    arr = np.asarray(seq)
+    if 'f' == arr.dtype.kind:
+        arr = arr.astype(np.float64).view(np.int64)
+    return pan.factorize(arr)[0].astype(np.int64)
+
+def _take_rows(seq, rows):
+    ''' Select rows from a setting sequence, keeping its type
+    '''
+    if isinstance(seq, np.ndarray):
+        return seq[rows]
+    if isinstance(seq, pan.Series):
+        return seq.iloc[rows].reset_index(drop=True)
+    return [seq[i] for i in rows]
+
+# - settings versions, shared by all ConsumeInputSettings so no two of them have the same one
+_VERSIONS = itertools.count(1)
+
+def _update_digest(sha1, value):
+    ''' Add a setting value (single value, sequence, Series, or array) to a sha1 digest
+    '''
+    values = np.asarray(value.values if isinstance(value, pan.Series) else value)
+    sha1.update(repr((values.dtype.kind, values.shape)).encode())
+    if values.dtype.kind in 'biuf':
+        sha1.update(np.ascontiguousarray(values).tobytes())
+    else:
+        sha1.update('\x1f'.join([str(v) for v in values.ravel()]).encode())
+
 
 class ConsumeInputSettings(object):
     '''
@@ -56,6 +89,9 @@ class ConsumeInputSettings(object):
     Settings for a consume run.
     burn_type dictates how many settings are necessary
     There are no defaults.
+    A 'mixed' burn_type takes all the activity settings plus a per-row
+    burn_type setting ('natural' or 'activity') that selects the equations
+    used for each row.
     '''
     #keyword, name, internal name, permitted values, validator function
     ActivityInputVarParameters = {
@@ -80,12 +116,18 @@ class ConsumeInputSettings(object):
         'rotten_cwd_pct_available' : ['Rotten coarse woody debris available for consumption (%)', [0,100], validate_range]
         }
 
+    MixedInputVarParameters = {
+        'burn_type' : ['Burn type of the row (natural, activity)', ['natural', 'activity'], validate_list]
+        }
+
     AllInputParameters = ActivityInputVarParameters.copy()
     AllInputParameters.update(NaturalInputVarParameters)
+    AllInputParameters.update(MixedInputVarParameters)
 
     NaturalSNames = [s for s in NaturalInputVarParameters]
     ActivitySNames = [s for s in ActivityInputVarParameters]
     AllSNames = NaturalSNames + ActivitySNames
+    MixedSNames = AllSNames + [s for s in MixedInputVarParameters]
 
     def __init__(self):
         ### - these are single value settings
@@ -96,6 +138,16 @@ class ConsumeInputSettings(object):
         ### - dictionary of multi-value settings, empty on initialization
         self._settings = {}
 
+        ### - changes whenever a setting does, see _changed()
+        self.version = next(_VERSIONS)
+
+    def _changed(self):
+        ''' A setting that affects the calculations was changed. units don't count,
+            unit conversion changes them after a calculation. Values changed in place
+            in an array returned by get() are not noticed.
+        '''
+        self.version = next(_VERSIONS)
+
     @property
     def burn_type(self): return self._burn_type
     @burn_type.setter
@@ -103,6 +155,7 @@ class ConsumeInputSettings(object):
         tmp = value.lower()
         if tmp in dd.list_valid_burntypes():
             self._burn_type = tmp
+            self._changed()
         else:
             print("Error: the only permitted values for burn_type are:")
             for i in dd.list_valid_burntypes():
@@ -125,15 +178,16 @@ class ConsumeInputSettings(object):
     @fm_type.setter
     def fm_type(self, value):
         if self._burn_type:
-            if self._burn_type == 'activity':
+            if self._burn_type in ['activity', 'mixed']:
                 if value in dd.list_valid_fm_types():
                     self._fm_type = value
+                    self._changed()
                 else:
                     print("\nError: the only permitted values for fm_type are:")
                     for i in dd.list_valid_fm_types():
                         print("\t{}".format(i))
             else:
-                print("\nError: fm_type is valid only when the burn_type is 'activity'.")
+                print("\nError: fm_type is valid only when the burn_type is 'activity' or 'mixed'.")
         else:
             print("\nError: burn_type must be set first as the valid parameter set depends on it.")
 
@@ -145,7 +199,7 @@ class ConsumeInputSettings(object):
         result = False
         if self._burn_type:
             #print("\nSetting {} ...".format(name))
-            valid_names = list(ConsumeInputSettings.NaturalSNames) if 'natural' == self._burn_type else list(ConsumeInputSettings.AllSNames)
+            valid_names = self._get_valid_column_names_no_attributes(self._burn_type)
             if name in valid_names:
                 validator = ConsumeInputSettings.AllInputParameters[name][2]
                 permitted_values = ConsumeInputSettings.AllInputParameters[name][1]
@@ -153,6 +207,7 @@ class ConsumeInputSettings(object):
                 valid, valid_values, invalid_values = validator(sequence, permitted_values)
                 if valid:
                     self._settings[name] = valid_values
+                    self._changed()
                     result = True
                 else:
                     print("Error: the following values are not permitted for setting {}:".format(name))
@@ -175,9 +230,9 @@ class ConsumeInputSettings(object):
     def settings_are_complete(self):
         ''' Have all the required settings been set?
         '''
-        check_props = self._burn_type and self._units and (self._fm_type if 'activity' == self._burn_type else True)
+        check_props = self._burn_type and self._units and (self._fm_type if 'natural' != self._burn_type else True)
         if check_props:
-            valid_names = set(ConsumeInputSettings.NaturalSNames if 'natural' == self._burn_type else ConsumeInputSettings.AllSNames)
+            valid_names = set(self._get_valid_column_names_no_attributes(self._burn_type))
             current_settings = set(self._settings.keys())
             if valid_names == current_settings:
                 self._settings['fuelbeds'] = self._settings['fuelbeds']
@@ -190,7 +245,7 @@ class ConsumeInputSettings(object):
                 needed = []
                 if None == self._burn_type: needed.append('burn_type')
                 if None == self._units: needed.append('units')
-                if 'activity' == self._burn_type and None == self._fm_type: needed.append("fm_type")
+                if self._burn_type in ['activity', 'mixed'] and None == self._fm_type: needed.append("fm_type")
                 print("\n !!! Error settings problem, the following are required:")
                 for i in needed:
                     print("\t{}".format(i))
@@ -203,7 +258,7 @@ class ConsumeInputSettings(object):
         settings = []
         settings.append("burn_type\t{}".format(self._burn_type))
         settings.append("units\t{}".format(self._units))
-        if 'activity' == self._burn_type:
+        if self._burn_type in ['activity', 'mixed']:
             settings.append("fm_type\t{}".format(self._fm_type))
         for k, v in self._settings.items():
             settings.append("{}\t{}".format(k, v))
@@ -211,18 +266,75 @@ class ConsumeInputSettings(object):
         
     def reset_to_empty(self):
         self._settings = {}
-
-    def package(self, dataframeLoadings):
+        self._changed()
+
+    def unique_rows(self):
+        ''' Find the distinct scenarios (fuelbed and all settings) in the current settings.
+            Returns (first, inverse): the index of the first row of each distinct
+            scenario, in input order, and for every row the position of its
+            scenario in first. Returns None if the settings are not all per-row
+            sequences of the same length.
+        '''
+        nrows = len(self._settings.get('fuelbeds', []))
+        if 0 == nrows:
+            return None
+        key = np.zeros(nrows, dtype=np.int64)
+        for name in sorted(self._settings.keys()):
+            seq = self._settings[name]
+            if not is_sequence(seq) or len(seq) != nrows:
+                if is_sequence(seq) and 1 == len(seq):
+                    continue    # - a single value applies to every row
+                return None
+            codes = _row_codes(seq)
+            # - combine with the key so far, then renumber to keep the key small
+            key = pan.factorize(key * (codes.max() + 1) + codes)[0].astype(np.int64)
+        inverse = pan.factorize(key)[0]
+        first = np.full(inverse.max() + 1, nrows, dtype=np.int64)
+        np.minimum.at(first, inverse, np.arange(nrows))
+        return first, inverse
+
+    def fingerprint(self, names=None):
+        ''' A digest of the named settings that changes whenever one of their values
+            does. burn_type and fm_type can be named too; with a 'mixed' burn_type,
+            burn_type is the per-row setting. By default all settings that affect
+            the calculations are included, i.e. everything but units.
+        '''
+        if names is None:
+            names = ['burn_type', 'fm_type'] + sorted([k for k in self._settings.keys() if 'burn_type' != k])
+        sha1 = hashlib.sha1()
+        for name in names:
+            value = self.get(name) if name in self._settings else getattr(self, name)
+            sha1.update(name.encode())
+            _update_digest(sha1, value)
+        return sha1.hexdigest()
+
+    def subset(self, rows):
+        ''' A copy of these settings containing only the specified rows. It is a new
+            object, so it has a version of its own.
+        '''
+        retval = ConsumeInputSettings()
+        retval._units = self._units
+        retval._fm_type = self._fm_type
+        retval._burn_type = self._burn_type
+        nrows = len(self._settings.get('fuelbeds', []))
+        for name, seq in self._settings.items():
+            retval._settings[name] = _take_rows(seq, rows) \
+                if is_sequence(seq) and len(seq) == nrows else seq
+        return retval
+
+    def package(self, fccsDB):
         if self.settings_are_complete():
             add_me = {}
             # - make these settings occur for each line. Allows iterating over results
             #   in a uniform way.
-            get_these = [np.where(i == dataframeLoadings.fccs_id)[0][0] for i in self._settings['fuelbeds']]
+            dataframeLoadings = fccsDB.loadings_data_
+            get_these = fccsDB.positions(self._settings['fuelbeds'])
             if 'filename' in dataframeLoadings.columns:
-                add_me['filename'] = dataframeLoadings.filename[get_these].values
-            add_me['burn_type'] = list([self._burn_type] * len(self._settings.get('fuelbeds')))
+                add_me['filename'] = dataframeLoadings.filename.values[get_these]
+            if 'mixed' != self._burn_type:
+                add_me['burn_type'] = list([self._burn_type] * len(self._settings.get('fuelbeds')))
             add_me['units'] = list([self._units] * len(self._settings.get('fuelbeds')))
-            if 'activity' == self.burn_type:
+            if self._burn_type in ['activity', 'mixed']:
                 add_me['fm_type'] = list([self.fm_type] * len(self._settings.get('fuelbeds')))
             retval = self._settings.copy()
             retval.update(add_me)
@@ -235,7 +347,7 @@ class ConsumeInputSettings(object):
         valid_names = self._get_valid_column_names_no_attributes(burn_type)
         if valid_names:
             valid_names.append('units')
-            if 'activity' == burn_type: valid_names.append('fm_type')
+            if burn_type in ['activity', 'mixed']: valid_names.append('fm_type')
         return valid_names
 
     def _get_valid_column_names_no_attributes(self, burn_type):
@@ -246,6 +358,8 @@ class ConsumeInputSettings(object):
             valid_names = list(ConsumeInputSettings.NaturalSNames)
         elif burn_type == 'activity':
             valid_names = list(ConsumeInputSettings.AllSNames)
+        elif burn_type == 'mixed':
+            valid_names = list(ConsumeInputSettings.MixedSNames)
         return valid_names
 
     def _valid_file_columns(self, burn_type, supplied_columns):
@@ -268,7 +382,7 @@ class ConsumeInputSettings(object):
                     for item in s2.difference(s1):
                         print("\t{}".format(item))
         else:
-            print("\nError: burn_burn_type must be 'natural' or 'activity'.")
+            print("\nError: burn_burn_type must be 'natural', 'activity', or 'mixed'.")
             print(" ---- > {}".format(burn_type))
         return False
 
@@ -285,41 +399,61 @@ class ConsumeInputSettings(object):
         result = False
         if self.burn_type:
             if os.path.exists(filename):
-                contents = pan.read_csv(filename)
-                if self._valid_file_columns(self.burn_type, contents.columns):
-                    # - all of the values should be the same in the following 3 columns
-                    unit_check = self._column_content_identical(contents.units)
-                    fm_type_check = True
-                    if 'activity' == self.burn_type:
-                        fm_type_check = self._column_content_identical(contents.fm_type)
-                        eco_check_must_be_western = self._column_content_identical(contents.ecoregion)
-                        # - brute force, ensure ecoregion is western for activity burn_types
-                        contents.ecoregion = 'western'
-
-                    if unit_check and fm_type_check:
-                        # - assign the single-input-value / property items
-
-                        # ignore "units" column in input file... only way to change units when running
-                        # from command line is via --metric.
-                        # default: tons_ac (consumption columns), lbs_ac (emissions columns)
-                        # self.units = contents.units[0]
-
-                        if 'activity' == self.burn_type: self.fm_type = contents.fm_type[0]
-
-                        # - set the 'tagged' input items
-                        valid_names = self._get_valid_column_names_no_attributes(self.burn_type)
-                        for name in valid_names:
-                            self.set(name, contents.get(name))
-                        result = True
-                    else:
-                        print("\nError: burn_type, units, and fm_type columns must have identical values.")
-                        print("Additionally, if the burn_type is 'activity', the ecoregion must be 'western'.")
+                result = self.load_from_dataframe(pan.read_csv(filename))
             else:
                 print("\nError: filename '{}' does not exist".format(filename))
         else:
             print("\nError: burn_type must be set prior to loading an input file")
         return result
 
+    def load_from_dataframe(self, contents):
+        ''' Load settings from a DataFrame with the same columns as an input file,
+            e.g. one block of rows of a large input file.
+            burn_type MUST be set at this point
+        '''
+        result = False
+        if self.burn_type:
+            # - start from nothing, so a load that fails doesn't leave the settings of a
+            #   previous one (e.g. the block before this one) in place
+            self.reset_to_empty()
+            # - blocks read with pandas chunksize keep the row numbers of the file
+            contents = contents.reset_index(drop=True)
+            if self._valid_file_columns(self.burn_type, contents.columns):
+                # - all of the values should be the same in the following 3 columns
+                unit_check = self._column_content_identical(contents.units)
+                fm_type_check = True
+                if 'activity' == self.burn_type:
+                    fm_type_check = self._column_content_identical(contents.fm_type)
+                    eco_check_must_be_western = self._column_content_identical(contents.ecoregion)
+                    # - brute force, ensure ecoregion is western for activity burn_types
+                    contents.ecoregion = 'western'
+                elif 'mixed' == self.burn_type:
+                    fm_type_check = self._column_content_identical(contents.fm_type)
+                    # - only the activity rows are forced to western
+                    contents.loc[contents.burn_type == 'activity', 'ecoregion'] = 'western'
+
+                if unit_check and fm_type_check:
+                    # - assign the single-input-value / property items
+
+                    # ignore "units" column in input file... only way to change units when running
+                    # from command line is via --metric.
+                    # default: tons_ac (consumption columns), lbs_ac (emissions columns)
+                    # self.units = contents.units[0]
+
+                    if self.burn_type in ['activity', 'mixed']: self.fm_type = contents.fm_type[0]
+
+                    # - set the 'tagged' input items
+                    valid_names = self._get_valid_column_names_no_attributes(self.burn_type)
+                    result = all([self.set(name, contents.get(name)) for name in valid_names])
+                    if not result:
+                        self.reset_to_empty()
+                else:
+                    print("\nError: burn_type, units, and fm_type columns must have identical values.")
+                    print("Additionally, if the burn_type is 'activity', the ecoregion must be 'western'.")
+        else:
+            print("\nError: burn_type must be set prior to loading an input file")
+        return result
+
 
     def load_from_dict(self, params):
         ''' Load settings from a supplied dictionary
@@ -0,0 +1,258 @@
+''' ---------------------------------------------------------------------------
+In-process and on-disk caches of parsed FCCS loadings files.
+
+Parsing the loadings csv with pandas is the largest fixed cost of a short
+consume_batch.py run. The first time a loadings file is loaded, the parsed
+(renamed and scaled) columns are saved next to it as a directory of .npy
+files, one per column, plus a small json header:
+
+    fccs_loadings.csv
+    fccs_loadings.csv.consume_cache/
+        header.json
+        c000.npy
+        c001.npy
+        ...
+
+The header records the path, size, mtime, and sha1 of the source file. A
+cache is only used when all four still match, so editing or replacing the
+loadings file invalidates it automatically. The numeric .npy files can be
+memory mapped.
+
+Failure to write the cache (read-only install directory, etc.) is not an
+error; the loadings are simply parsed again next time.
+
+Within a process, parsed loadings are held by a LoadingsRegistry, a bounded
+LRU keyed on the absolute path of the loadings file. All FCCSDB objects (and
+so the webtool, which runs consume in-process) share the module-level
+REGISTRY, so repeated runs against the same file reuse one parsed copy. A
+file that is only used once, like the loadings the webtool builds for each
+job, should be dropped with REGISTRY.discard() and remove() afterwards.
+---------------------------------------------------------------------------- '''
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pan
+
+# - bump when the layout of the cache directory or the parsing of the loadings file changes
+CACHE_FORMAT_VERSION = 1
+CACHE_SUFFIX = '.consume_cache'
+HEADER_FILE = 'header.json'
+
+# - set to False to always parse the loadings csv
+DISK_CACHE_ENABLED = True
+
+
+def cache_dir_for(loadings_file, variant='all'):
+    ''' variant distinguishes different column selections of the same file
+    '''
+    return loadings_file + ('' if 'all' == variant else '.' + variant) + CACHE_SUFFIX
+
+def remove(loadings_file):
+    ''' Remove the on-disk caches (every variant) of loadings_file, e.g. of a temporary
+        upload that won't be loaded again. Also see LoadingsRegistry.discard().
+    '''
+    directory, name = os.path.split(os.path.abspath(loadings_file))
+    pattern = re.compile(re.escape(name) + r'(\.\w+)?' + re.escape(CACHE_SUFFIX) + '$')
+    for entry in os.listdir(directory):
+        if pattern.match(entry):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+def file_signature(loadings_file):
+    ''' The values that identify a particular version of a loadings file
+    '''
+    st = os.stat(loadings_file)
+    sha1 = hashlib.sha1()
+    with open(loadings_file, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b''):
+            sha1.update(block)
+    return {
+        'path': os.path.abspath(loadings_file),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha1': sha1.hexdigest()
+    }
+
+def _read_header(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, HEADER_FILE), 'r') as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+def _is_current(header, signature):
+    return bool(header) and header.get('format') == CACHE_FORMAT_VERSION and header.get('signature') == signature
+
+def read(loadings_file, signature, mmap=False, variant='all'):
+    ''' Return (loadings_data, extra) from the cache for loadings_file, or None
+        if there is no cache or it does not match the signature.
+        extra is the json-compatible data that was passed to write().
+    '''
+    if not DISK_CACHE_ENABLED:
+        return None
+    cache_dir = cache_dir_for(loadings_file, variant)
+    header = _read_header(cache_dir)
+    if not _is_current(header, signature):
+        return None
+    try:
+        columns = {}
+        for col in header['columns']:
+            data = np.load(os.path.join(cache_dir, col['file']),
+                mmap_mode='r' if mmap and 'str' != col['kind'] else None, allow_pickle=False)
+            if 'str' == col['kind']:
+                data = data.astype(object)
+                if col.get('nulls'):
+                    nulls = np.load(os.path.join(cache_dir, col['nulls']), allow_pickle=False)
+                    data[nulls] = np.nan
+            columns[col['name']] = data
+        return (pan.DataFrame(columns, columns=[col['name'] for col in header['columns']]), header['extra'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def write(loadings_file, loadings_data, extra, signature, variant='all'):
+    ''' Save the parsed loadings next to the source file. Returns True on success.
+        Columns that can't be stored without pickling cause the whole cache to
+        be skipped.
+    '''
+    if not DISK_CACHE_ENABLED:
+        return False
+    cache_dir = cache_dir_for(loadings_file, variant)
+    tmp_dir = None
+    try:
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_dir) + '.',
+            dir=os.path.dirname(os.path.abspath(loadings_file)))
+        columns = []
+        for i, name in enumerate(loadings_data.columns):
+            col = {'name': name, 'file': 'c{:03d}.npy'.format(i)}
+            values = loadings_data[name].values
+            if values.dtype.kind in 'biuf':
+                col['kind'] = 'num'
+            else:
+                nulls = pan.isnull(values)
+                if not all(isinstance(v, str) for v in values[~nulls]):
+                    return False
+                col['kind'] = 'str'
+                if nulls.any():
+                    col['nulls'] = 'c{:03d}_nulls.npy'.format(i)
+                    np.save(os.path.join(tmp_dir, col['nulls']), nulls)
+                values = np.where(nulls, '', values).astype(str)
+            np.save(os.path.join(tmp_dir, col['file']), values)
+            columns.append(col)
+
+        header = {'format': CACHE_FORMAT_VERSION, 'signature': signature, 'columns': columns, 'extra': extra}
+        with open(os.path.join(tmp_dir, HEADER_FILE), 'w') as outfile:
+            json.dump(header, outfile, indent=1)
+
+        # - if another process got there first, keep theirs; readers may already be using it
+        if _is_current(_read_header(cache_dir), signature):
+            return True
+        # - anything else there is stale. Readers reject a stale cache on its header before
+        #   they load any column, so it can be removed. If another process renames its cache
+        #   into place in between, the rename fails and theirs is kept.
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        os.rename(tmp_dir, cache_dir)
+        tmp_dir = None
+        return True
+    except OSError:
+        return False
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class LoadingsRegistry(object):
+    ''' A bounded, thread safe LRU of parsed loadings files.
+
+        Entries are keyed on the absolute path (and the variant, i.e. which columns
+        were loaded) and remember the size, mtime, and
+        sha1 of the file they were parsed from. A changed size or mtime causes
+        the file to be hashed again and, if the content changed, reloaded.
+        The least recently used entries are dropped once there are more than
+        max_entries of them or they hold more than max_bytes.
+    '''
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+    def get(self, loadings_file, loader, variant='all'):
+        ''' Return the parsed loadings for loadings_file. On a miss, loader is
+            called as loader(loadings_file, signature, variant) and must return
+            a tuple whose first item is a DataFrame (used to size the entry).
+        '''
+        path = os.path.abspath(loadings_file)
+        key = (path, variant)
+        with self._lock:
+            st = os.stat(path)
+            entry = self._entries.get(key)
+            if entry:
+                sig = entry['signature']
+                if sig['size'] != st.st_size or sig['mtime_ns'] != st.st_mtime_ns:
+                    signature = file_signature(path)
+                    if signature['sha1'] == sig['sha1']:
+                        entry['signature'] = signature
+                    else:
+                        del self._entries[key]
+                        self._invalidations += 1
+                        entry = None
+            if entry:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return entry['value']
+
+            self._misses += 1
+            signature = file_signature(path)
+            value = loader(loadings_file, signature, variant)
+            nbytes = int(value[0].memory_usage(deep=True).sum())
+            self._entries[key] = {'signature': signature, 'value': value, 'nbytes': nbytes}
+            self._evict()
+            return value
+
+    def _evict(self):
+        # - always keep the most recent entry, even if it is larger than max_bytes
+        while len(self._entries) > 1 and \
+            (len(self._entries) > self.max_entries or self._nbytes() > self.max_bytes):
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _nbytes(self):
+        return sum([e['nbytes'] for e in self._entries.values()])
+
+    def discard(self, loadings_file):
+        ''' Drop a file from the registry, e.g. when a temporary upload is deleted
+        '''
+        path = os.path.abspath(loadings_file)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes(),
+                'hits': self._hits,
+                'misses': self._misses,
+                'invalidations': self._invalidations,
+                'evictions': self._evictions,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+# - shared by every FCCSDB in the process
+REGISTRY = LoadingsRegistry()
@@ -0,0 +1,232 @@
+''' ---------------------------------------------------------------------------
+Monte Carlo uncertainty estimates for consumption and emissions.
+
+A MonteCarlo object wraps a FuelConsumption object whose scenario (fuelbeds
+and settings) is already set. Any of the numeric input settings can be given
+a distribution with vary(), and any loadings column a distribution of
+multipliers with scale_loadings():
+
+    mc = MonteCarlo(fc_obj, seed=1)
+    mc.vary('fm_duff', normal(10))
+    mc.vary('fm_1000hr', uniform(5))
+    mc.scale_loadings('duff_upper_loading', lognormal(0.2))
+    summary = mc.run(1000)
+
+The draws are not run one at a time. A batch of draws is an extra dimension
+of the input rows (draw-major, like a scenario grid, see
+FuelConsumption.load_scenario_grid()), so each batch is one pass through the
+vectorized consumption and emissions calculations. The loadings are kept
+once per fuelbed; multipliers are applied as the columns are read.
+
+Each batch is folded into running statistics and then dropped, so memory use
+depends on the batch size, not on the number of draws:
+    - the mean and standard deviation are updated exactly (Welford / Chan)
+    - quantiles are estimated with the P-square algorithm (Jain and
+      Chlamtac, 1985), five markers per quantile per output value
+
+run() returns per-fuelbed statistics of the total consumption (tons/acre)
+and of the total emissions of each species (lbs/acre), by combustion phase
+(flaming, smoldering, residual, total).
+---------------------------------------------------------------------------- '''
+import numpy as np
+from . import data_desc as dd
+from . emissions import Emissions
+from . input_settings import ConsumeInputSettings, validate_range
+
+def normal(sd):
+    ''' Normally distributed around the base value with standard deviation sd
+    '''
+    return lambda rng, base: base + rng.normal(0.0, sd, base.shape)
+
+def uniform(half_width):
+    ''' Uniformly distributed within half_width of the base value
+    '''
+    return lambda rng, base: base + rng.uniform(-half_width, half_width, base.shape)
+
+def lognormal(sigma):
+    ''' The base value times a lognormal factor with median 1
+    '''
+    return lambda rng, base: base * rng.lognormal(0.0, sigma, base.shape)
+
+
+class RunningMoments(object):
+    ''' Mean and variance of a stream of arrays, updated a batch at a time
+    '''
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def add(self, batch):
+        ''' batch is (number of observations,) + shape
+        '''
+        n = len(batch)
+        if 0 == n:
+            return
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self._m2 = self._m2 + batch_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    def variance(self, ddof=1):
+        return self._m2 / (self.count - ddof) if self.count > ddof else np.full(self.mean.shape, np.nan)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+
+class P2Quantile(object):
+    ''' Streaming estimate of the p quantile of every element of a stream of
+        arrays (the P-square algorithm). Exact until there are 5 observations.
+    '''
+    def __init__(self, p, shape):
+        self.p = p
+        self.count = 0
+        self._first = []
+        self._q = None      # - marker heights, (5,) + shape
+        self._n = None      # - marker positions, (5,) + shape
+        self._desired = np.array([0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0])
+        self._increment = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+        self._shape = shape
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        if self._q is None:
+            self._first.append(x)
+            if 5 == len(self._first):
+                self._q = np.sort(np.array(self._first), axis=0)
+                self._n = np.broadcast_to(
+                    np.arange(5.0).reshape((5,) + (1,) * x.ndim), self._q.shape).copy()
+                self._first = []
+            return
+
+        q, n = self._q, self._n
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        # - the cell x falls in; markers above it move up one position
+        k = (q[1:4] <= x).sum(axis=0)
+        for i in range(1, 5):
+            n[i] += (k < i)
+        self._desired += self._increment
+
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            if not move.any():
+                continue
+            d = np.where(move, np.sign(d), 0.0)
+            parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            neighbour_q = np.where(d > 0, q[i + 1], q[i - 1])
+            neighbour_n = np.where(d > 0, n[i + 1], n[i - 1])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                linear = q[i] + d * (neighbour_q - q[i]) / (neighbour_n - n[i])
+            in_order = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(in_order, parabolic, linear), q[i])
+            n[i] += d
+
+    @property
+    def value(self):
+        if self._q is not None:
+            return self._q[2].copy()
+        if self._first:
+            return np.quantile(np.array(self._first), self.p, axis=0)
+        return np.full(self._shape, np.nan)
+
+
+class MonteCarlo(object):
+    ''' Monte Carlo runs of the scenario set on a FuelConsumption object, see
+        the top of this file.
+    '''
+    def __init__(self, fuel_consumption_object, seed=None):
+        self._base = fuel_consumption_object
+        self._rng = np.random.default_rng(seed)
+        self._inputs = {}
+        self._loadings = {}
+
+    def vary(self, name, distribution):
+        ''' Draw the named input setting from distribution, called as
+            distribution(rng, base) with base the (draws, fuelbeds) array of the
+            set values. Draws are clipped to the permitted range of the setting.
+        '''
+        assert name in ConsumeInputSettings.AllInputParameters and \
+            validate_range == ConsumeInputSettings.AllInputParameters[name][2], \
+            "Error: '{}' is not a numeric input setting".format(name)
+        self._inputs[name] = distribution
+
+    def scale_loadings(self, column, distribution):
+        ''' Multiply the named loadings column by draws from distribution, called
+            as distribution(rng, ones). Negative multipliers are clipped to 0.
+        '''
+        assert column in dd.LoadingsMatrixIndex, "Error: '{}' is not a loadings column".format(column)
+        self._loadings[column] = distribution
+
+    def run(self, draws, batch_size=100, quantiles=(0.05, 0.5, 0.95), species=None, no_sera=False):
+        ''' Run draws draws and return a dictionary of per-fuelbed statistics.
+            Values are (phase, fuelbed) arrays, quantiles (quantile, phase, fuelbed):
+
+            {'draws': ..., 'quantiles': ..., 'fuelbeds': ...,
+             'consumption': {'mean': ..., 'std': ..., 'quantiles': ...},
+             'emissions': {'co2': {'mean': ..., 'std': ..., 'quantiles': ...}, ...}}
+        '''
+        from . fuel_consumption import FuelConsumption
+        base = self._base
+        assert base._settings.settings_are_complete(), "Error: the scenario is not complete"
+        fuelbeds = np.asarray([str(f) for f in base._settings.get('fuelbeds')])
+        nrows = len(fuelbeds)
+
+        # - the draws are all distinct rows, so deduplication can't help
+        engine = FuelConsumption(fccs_file=base.FCCS.loadings_file_, msg_level=base.msg_level)
+        engine.deduplicate = False
+        emissions = Emissions(engine)
+        emissions.no_sera = no_sera
+        emissions.species = species
+        emissions.strata = 'summary'
+        outputs = 1 + len(emissions.species)
+
+        shape = (outputs, 4, nrows)
+        moments = RunningMoments(shape)
+        estimators = [P2Quantile(p, shape) for p in quantiles]
+
+        done = 0
+        while done < draws:
+            batch = min(batch_size, draws - done)
+            settings = base._settings.subset(np.tile(np.arange(nrows), batch))
+            for name, distribution in self._inputs.items():
+                permitted = ConsumeInputSettings.AllInputParameters[name][1]
+                values = np.broadcast_to(np.asarray(base._settings.get(name), dtype=float), nrows)
+                drawn = distribution(self._rng, np.tile(values, (batch, 1)))
+                valid = settings.set(name, np.clip(drawn, permitted[0], permitted[1]).ravel())
+                assert valid, "Error: '{}' is not a setting of this burn_type".format(name)
+            # - a new settings object, so emissions recalculates consumption
+            engine.replace_settings(settings, grid=(batch, fuelbeds))
+            engine.set_loadings_scale({column: np.clip(distribution(self._rng, np.ones((batch, nrows))), 0, None).ravel()
+                for column, distribution in self._loadings.items()})
+
+            assert emissions._calculate(), "Error: Monte Carlo calculation failed"
+            results = np.concatenate([engine._cons_data[np.newaxis, 0], emissions._emis_data[:, 0]])
+            results = results.reshape(outputs, 4, batch, nrows).transpose(2, 0, 1, 3)
+
+            moments.add(results)
+            for draw in results:
+                for estimator in estimators:
+                    estimator.add(draw)
+            done += batch
+
+        mean = moments.mean
+        std = moments.std()
+        values = np.array([e.value for e in estimators])
+        def stats(i):
+            return {'mean': mean[i], 'std': std[i], 'quantiles': values[:, i]}
+        return {
+            'draws': draws,
+            'quantiles': tuple(quantiles),
+            'fuelbeds': list(fuelbeds),
+            'consumption': stats(0),
+            'emissions': {sp: stats(1 + i) for i, sp in enumerate(emissions.species)}
+        }
@@ -2,9 +2,10 @@ import numpy as np
 import math
 from . import data_desc as dd
 
-# - use to approximate Pandas pre 0.13 behavior
+# - use to approximate Pandas pre 0.13 behavior. df can be a DataFrame or a
+#   fccs_db.LoadingsMatrix
 def values(df, key):
-    return df[key].values
+    return np.asarray(df[key])
 
 # - Piles were added later and need to be treated differently
 #   so they do not use values from the emission factor file
@@ -64,7 +65,7 @@ def coerce_if_possible(x):
         return x
 
 
-def make_dictionary_of_lists(cons_data, heat_data, emis_data, inputs):
+def make_dictionary_of_lists(cons_data, heat_data, emis_data, inputs, emis_species=dd.EmissionsSpecies):
     """
 
     Creates a dictionary of lists (accessed by calling the 'results' property)
@@ -75,6 +76,9 @@ def make_dictionary_of_lists(cons_data, heat_data, emis_data, inputs):
     Note: the dictionary can be created without 'emis_data' if only consumption
           data is desired/needed.
 
+    emis_species names the species in the rows of 'emis_data'. The 'stratum'
+    emissions are only included when 'emis_data' holds the 1st-order strata.
+
     """
     def cons_dict(s):
         """ Return consumption dictionary for specified index"""
@@ -203,62 +207,11 @@ def make_dictionary_of_lists(cons_data, heat_data, emis_data, inputs):
 
 
     if len(emis_data) != 0:
-        pm_emis = emis_dict(0, 0)
-        pm10_emis = emis_dict(0, 1)
-        pm25_emis = emis_dict(0, 2)
-        co_emis = emis_dict(0, 3)
-        co2_emis = emis_dict(0, 4)
-        ch4_emis = emis_dict(0, 5)
-        nmhc_emis = emis_dict(0, 6)
-        nmoc_emis = emis_dict(0, 7)
-        nh3_emis = emis_dict(0, 8)
-        no_emis = emis_dict(0, 9)
-        no2_emis = emis_dict(0, 10)
-        nox_emis = emis_dict(0, 11)
-        so2_emis = emis_dict(0, 12)
-
-        pm_detail = emis_dict_detail(0)
-        pm10_detail = emis_dict_detail(1)
-        pm25_detail = emis_dict_detail(2)
-        co_detail = emis_dict_detail(3)
-        co2_detail = emis_dict_detail(4)
-        ch4_detail = emis_dict_detail(5)
-        nmhc_detail = emis_dict_detail(6)
-        nmoc_detail = emis_dict_detail(7)
-        nh3_detail = emis_dict_detail(8)
-        no_detail = emis_dict_detail(9)
-        no2_detail = emis_dict_detail(10)
-        nox_detail = emis_dict_detail(11)
-        so2_detail = emis_dict_detail(12)
-
-
-        results['emissions'] = { 'pm' : pm_emis,
-                                    'pm10' : pm10_emis,
-                                    'pm25' : pm25_emis,
-                                    'co' : co_emis,
-                                    'co2' : co2_emis,
-                                    'ch4' : ch4_emis,
-                                    'nmhc' : nmhc_emis,
-                                    'nmoc' : nmoc_emis,
-                                    'nh3' : nh3_emis,
-                                    'no' : no_emis,
-                                    'no2' : no2_emis,
-                                    'nox' : nox_emis,
-                                    'so2' : so2_emis,
-                                    'stratum' : {
-                                        'pm' : pm_detail,
-                                        'pm10' : pm10_detail,
-                                        'pm25' : pm25_detail,
-                                        'co' : co_detail,
-                                        'co2' : co2_detail,
-                                        'ch4' : ch4_detail,
-                                        'nmhc' : nmhc_detail,
-                                        'nmoc' : nmoc_detail,
-                                        'nh3' : nh3_detail,
-                                        'no' : no_detail,
-                                        'no2' : no2_detail,
-                                        'nox' : nox_detail,
-                                        'so2' : so2_detail,}}
+        # - one entry per species, e.g. 'pm' : emis_dict(0, <row of pm>)
+        results['emissions'] = dict([(species, emis_dict(0, p)) for p, species in enumerate(emis_species)])
+        if len(emis_data[0]) >= dd.EmissionsStrataCount['first-order']:
+            results['emissions']['stratum'] = \
+                dict([(species, emis_dict_detail(p)) for p, species in enumerate(emis_species)])
 
     return results
 
@@ -270,40 +223,26 @@ def make_dictionary_of_lists(cons_data, heat_data, emis_data, inputs):
 ############################################################################
 
 
-def _unpack(data, runlnk):
+def to_grid(results, shape):
     """
-    Unpacks unique scenarios into a data output that contains all scenarios
+    Reshapes the per-row values (lists and arrays) of a results() dictionary to
+    shape, e.g. (scenarios, fuelbeds) for a scenario grid. Other values are
+    left as they are.
     """
-    def trans(d):
-        """ Transposes data """
-        return d.transpose()
-
-    def trans2(d):
-        """ Transposes data again """
-        return np.transpose(d)
-
-    def trans3(d):
-        """ Returns array of listed data """
-        return np.array(d)
-
-    dt = []
-    cdtemp = []
-
-    datat = trans(data)
-
-    for run in runlnk:
-        cdtemp.append(datat[run[1]])
-
-    del datat
-    cdtemp = trans2(cdtemp)
-
-    for i in range(0, len(data)):
-        dt.append(cdtemp[i])
+    if isinstance(results, dict):
+        return dict([(k, to_grid(v, shape)) for k, v in results.items()])
+    if hasattr(results, '__len__') and not isinstance(results, str) and len(results) == shape[0] * shape[1]:
+        return np.asarray(results).reshape(shape)
+    return results
 
-    del cdtemp
-    dt = trans3(dt)
 
-    return dt
+def _unpack(data, runlnk):
+    """
+    Unpacks unique scenarios into a data output that contains all scenarios.
+    runlnk holds, for every scenario, the index of its unique scenario along
+    the last axis of data.
+    """
+    return np.take(data, runlnk, axis=-1)
 
 
 def unit_conversion(data, area, from_units, output_units):
@@ -357,9 +296,29 @@ def unit_conversion(data, area, from_units, output_units):
         #assert(from_units != output_units, "Don't call this function if no conversion is necessary")
 
 # Repeated functions
-def csdist(tot, csd):
-    """Portions consumption by consumption stage"""
-    return np.array([tot * csd[0], tot * csd[1], tot * csd[2], tot * sum(csd)])
+def csdist(tot, csd, out=None):
+    """Portions consumption by consumption stage. If out (a (4, N) array, usually
+       a slice of the consumption output buffer) is supplied, the result is
+       written into it."""
+    if out is None:
+        return np.array([tot * csd[0], tot * csd[1], tot * csd[2], tot * sum(csd)])
+    np.multiply(tot, csd[0], out=out[0])
+    np.multiply(tot, csd[1], out=out[1])
+    np.multiply(tot, csd[2], out=out[2])
+    np.multiply(tot, sum(csd), out=out[3])
+    return out
+
+def slot(out, i):
+    """ out[i], or None if there is no output buffer """
+    return None if out is None else out[i]
+
+def sum_into(out, parts):
+    """ In-place category summation: out = sum(parts). Adds in the same order
+        as the builtin sum() so results are identical. """
+    out.fill(0.0)
+    for part in parts:
+        out += part
+    return out
 
 def propcons(x):
     """ Equation to calculate proportion consumed for various strata"""
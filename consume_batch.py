@@ -18,13 +18,20 @@ import cmdline
 import pandas as pd
 import pickle
 import unit_convert
+import csv_writer
+import binary_results
 import numpy as np
 import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 DO_PICKLE_OUTPUT = 'pickle'
 DO_RAW_OUTPUT = 'raw'
 
 PRECISION = 2
+# - columns that are written as they are, without rounding
+UNROUNDED_COLUMNS = ('fuelbeds', 'filename')
 
 # -- From stackoverflow.com ---
 import collections.abc as colls
@@ -117,6 +124,17 @@ def read_col_cfg_file(filename):
                     assert False, "Malformed line: {}".format(line)
     return retval
 
+class OutputColumns(object):
+    ''' The columns of a column configuration file. It is read once, before anything is
+        calculated, so that the calculation can be limited to what the columns need.
+        required holds the (category, stratum, phase, species) tuples of the result
+        columns, see consume.consume_results.column_keys().
+    '''
+    def __init__(self, col_cfg_file):
+        self.columns = read_col_cfg_file(col_cfg_file)
+        keys = consume.consume_results.column_keys()
+        self.required = set([keys[col[0]] for col in self.columns if col[0] in keys])
+
 def write_feps_emissions_input(all_results, feps_input_filename):
     '''
     FEPS expects an input file that looks like this:
@@ -130,7 +148,6 @@ def write_feps_emissions_input(all_results, feps_input_filename):
     '''
     
 
-    LBS_PER_TON = 2000
     '''
     emissions = {
         'Phase' : ['Flame', 'Smold', 'Resid'],
@@ -160,7 +177,6 @@ def write_feps_emissions_input(all_results, feps_input_filename):
     # In the old (wrong) code above the rate just added 12 and 24 to get a rate of 36. This would be the rate for 800 acres.   
     total_area = np.sum(all_results['parameters_area'])
     emissions = {
-        'Phase' : ['Flame', 'Smold', 'Resid'],
         'CO2' : [np.sum(all_results['emissions_co2_flaming'] * all_results['parameters_area'] / total_area), 
                     np.sum(all_results['emissions_co2_smoldering'] * all_results['parameters_area'] / total_area),
                     np.sum(all_results['emissions_co2_residual'] * all_results['parameters_area'] / total_area)],
@@ -183,12 +199,52 @@ def write_feps_emissions_input(all_results, feps_input_filename):
                     np.sum(all_results['emissions_nmhc_smoldering'] * all_results['parameters_area'] / total_area),
                     np.sum(all_results['emissions_nmhc_residual'] * all_results['parameters_area'] / total_area)],
     }
+    write_feps_file(emissions, feps_input_filename)
+
+def write_feps_file(emissions, feps_input_filename):
+    ''' emissions holds the area-weighted [flaming, smoldering, residual] rates, in lbs,
+        for each FEPS pollutant
+    '''
+    LBS_PER_TON = 2000
+    emissions = dict(emissions)
+    emissions['Phase'] = ['Flame', 'Smold', 'Resid']
     df = pd.DataFrame(emissions)
     df = df[['Phase', 'CO2', 'CO', 'CH4', 'PM25', 'PM10', 'NOx', 'SO2', 'NH3', 'NMHC']]
     pollutants = ['CO2', 'CO', 'CH4', 'PM25', 'PM10', 'NOx', 'SO2', 'NH3', 'NMHC']
     for p in pollutants:
         df[p] /= LBS_PER_TON
     df.to_csv(feps_input_filename, index=False, float_format='%.3f')
+
+class FepsAccumulator(object):
+    ''' Builds the FEPS emissions input file from results that arrive in blocks of rows.
+        The area-weighted sums are accumulated and divided by the total area at the end,
+        so the rates can differ from write_feps_emissions_input() in the last digits.
+    '''
+    POLLUTANTS = [('CO2', 'co2'), ('CO', 'co'), ('CH4', 'ch4'), ('PM25', 'pm25'), ('PM10', 'pm10'), ('NMHC', 'nmhc')]
+    PHASES = ['flaming', 'smoldering', 'residual']
+
+    def __init__(self):
+        self._total_area = 0.0
+        self._weighted = dict([(p[0], np.zeros(len(self.PHASES))) for p in self.POLLUTANTS])
+
+    def add(self, all_results):
+        area = all_results['parameters_area']
+        self._total_area += np.sum(area)
+        for name, species in self.POLLUTANTS:
+            for i, phase in enumerate(self.PHASES):
+                self._weighted[name][i] += np.sum(all_results['emissions_{}_{}'.format(species, phase)] * area)
+
+    def merge(self, other):
+        ''' Add the sums of another accumulator, e.g. from another block of rows '''
+        self._total_area += other._total_area
+        for name in self._weighted:
+            self._weighted[name] += other._weighted[name]
+
+    def write(self, feps_input_filename):
+        emissions = dict([(name, list(self._weighted[name] / self._total_area)) for name, species in self.POLLUTANTS])
+        for name in ['NOx', 'SO2', 'NH3']:
+            emissions[name] = [0.0, 0.0, 0.0]
+        write_feps_file(emissions, feps_input_filename)
     
 def round_to(df):
     ''' Our packaged version of Pandas doesn't have round.
@@ -197,19 +253,75 @@ def round_to(df):
     newdf = newdf.round(PRECISION)
     '''
     for col in df.columns:
-        if 'fuelbeds' == col or 'filename' == col: continue
+        if col in UNROUNDED_COLUMNS: continue
         df[col] = np.round(df.get(col), PRECISION)
     return df
 
 
-def write_results(all_results, outfile, feps_input_filename, do_metric, col_cfg_file=None):
-    # calculated results are in a hierarchical dictionary. Flatten the entire structure
-    #  so that any chosen datum can be specified
+def flatten_results(all_results):
+    ''' calculated results are in a hierarchical dictionary. Flatten the entire structure
+        so that any chosen datum can be specified
+    '''
     tmp = {}
     for k,v in flattenDict(all_results).items():
         colname = '_'.join(k)
         colname = colname.replace(' ', '_')
         tmp[colname] = v
+    return tmp
+
+def select_output_columns(tmp, do_metric, output_columns):
+    ''' Select, convert, and rename the output columns listed in the column
+        configuration file (an OutputColumns). Returns a list of (name, values).
+    '''
+    # - pick conversion method
+    converter = unit_convert.column_convert if do_metric else unit_convert.column_convert_none
+
+    columns_to_print = output_columns.columns
+    add_these = []
+    for col in columns_to_print:
+        key = col[0]
+        new_key = col[1]
+        if key in tmp.keys():
+            add_these.append((new_key, converter(key, tmp[key])))
+    # - a repeated name keeps its first position and its last values, like a dict
+    return list(dict(add_these).items())
+
+def make_output_frame(tmp, do_metric, output_columns):
+    ''' The output columns as a rounded DataFrame '''
+    newdf = pd.DataFrame.from_dict(dict(select_output_columns(tmp, do_metric, output_columns)))
+    return round_to(newdf)
+
+def round_columns(columns):
+    ''' Round the numeric columns of a list of (name, values) the way round_to() does '''
+    rounded = []
+    for name, values in columns:
+        if name not in UNROUNDED_COLUMNS and np.asarray(values).dtype.kind in 'f':
+            values = np.round(values, PRECISION)
+        rounded.append((name, values))
+    return rounded
+
+def format_output(tmp, do_metric, output_columns, output_format='csv'):
+    ''' The output columns ready for the writer of output_format (see open_writer()), as
+        the tuple of arguments to its write(). For csv that is the (header, rows) bytes,
+        the same text as make_output_frame(...).to_csv(index=False), see csv_writer.py.
+        For the binary formats it is the rounded columns.
+    '''
+    columns = select_output_columns(tmp, do_metric, output_columns)
+    if 'csv' == output_format:
+        return (csv_writer.format_header([name for name, values in columns]),
+            csv_writer.format_rows(columns, PRECISION, UNROUNDED_COLUMNS))
+    return (round_columns(columns),)
+
+def open_writer(outfile, output_format):
+    ''' A csv_writer.CsvWriter or, for npy and npz, a binary_results.BinaryWriter '''
+    if 'csv' == output_format:
+        return csv_writer.CsvWriter(outfile)
+    return binary_results.BinaryWriter(outfile, output_format)
+
+def write_results(all_results, outfile, feps_input_filename, do_metric, col_cfg_file=None, output_columns=None,
+        output_format='csv'):
+    # - a ConsumeResults is already keyed by the flattened names
+    tmp = all_results if isinstance(all_results, consume.ConsumeResults) else flatten_results(all_results)
 
     # always write the FEPS emissions input file
     write_feps_emissions_input(tmp, feps_input_filename)
@@ -218,33 +330,54 @@ def write_results(all_results, outfile, feps_input_filename, do_metric, col_cfg_
     # I've retained this, but it is no longer the default action. We have a default
     # output formatting file specified in the command line parser.
     if pickle_output(col_cfg_file):
-        pickle.dump(tmp, open(outfile, 'wb'))
+        pickle.dump(dict(tmp), open(outfile, 'wb'))
     # this is for debugging or generating all the keys
     elif do_raw_output(col_cfg_file):
         for key in sorted(tmp.keys()):
             print('{}:   {}'.format(key, str(tmp[key])))
     # This is the common case
     else:
-        # - pick conversion method
-        converter = unit_convert.column_convert if do_metric else unit_convert.column_convert_none
-
         if col_cfg_file:
-            columns_to_print = read_col_cfg_file(col_cfg_file)
-            add_these = []
-            for col in columns_to_print:
-                key = col[0]
-                new_key = col[1]
-                if key in tmp.keys():
-                    add_these.append((new_key, converter(key, tmp[key])))
-            newdf = pd.DataFrame.from_dict(dict(add_these))
-#           	 newdf = pd.DataFrame.from_items(add_these)
-            newdf = round_to(newdf)
-
-            newdf.to_csv(outfile, index=False)
+            columns = select_output_columns(tmp, do_metric,
+                output_columns if output_columns else OutputColumns(col_cfg_file))
+            if 'csv' == output_format:
+                csv_writer.write_csv(outfile, columns, PRECISION, UNROUNDED_COLUMNS)
+            else:
+                with binary_results.BinaryWriter(outfile, output_format) as out:
+                    out.write(round_columns(columns))
         else:
             # The command line parser should preclude getting here.
             print("\nError: bad or missing column configuration file!\n")
 
+def emissions_selection(output_columns):
+    ''' The emissions species and level of strata detail needed for the columns in an
+        OutputColumns. The FEPS species are always included because the FEPS emissions
+        input file is always written. Returns (species, strata).
+    '''
+    needed = set([p[1] for p in FepsAccumulator.POLLUTANTS])
+    strata = 'summary'
+    for category, stratum, phase, species in output_columns.required:
+        if species:
+            needed.add(species)
+            if ('summary', 'total') != (category, stratum):
+                strata = 'first-order'
+    return ([s for s in consume.data_desc.EmissionsSpecies if s in needed], strata)
+
+def make_emissions(consumer, no_sera, output_columns):
+    ''' An Emissions object that calculates only what the output needs. Without
+        output_columns (pickled and raw output) everything is calculated. '''
+    emissions = consume.Emissions(consumer)
+    emissions.no_sera = True if no_sera else False
+    if output_columns:
+        emissions.species, emissions.strata = emissions_selection(output_columns)
+    return emissions
+
+def get_output_columns(col_cfg_file):
+    ''' The OutputColumns of a column configuration file, None for pickled and raw output '''
+    if col_cfg_file and not pickle_output(col_cfg_file) and not do_raw_output(col_cfg_file):
+        return OutputColumns(col_cfg_file)
+    return None
+
 def write_units(outfile, do_metric):
     cons_units = 'tons_ac'
     emis_units = 'lbs_ac'
@@ -264,7 +397,97 @@ def write_units(outfile, do_metric):
     print("\nSuccess!!! Description of units used \"{}\"".format(outfile))
 
 
-def run(burn_type, csv_input, do_metric, msg_level, outfile, feps_input_filename, fuel_loadings=None, col_cfg=None, no_sera=False):
+def run_block(consumer, contents, no_sera, do_metric, output_columns, output_format='csv'):
+    ''' Calculate one block of input rows. Returns the block formatted for the output
+        writer (see format_output()) and its FEPS sums, or None if the block could not
+        be loaded. Formatting here lets worker processes share the cost of writing the csv.
+    '''
+    if not consumer.load_scenario_from_dataframe(contents, display=False):
+        return None
+    emissions = make_emissions(consumer, no_sera, output_columns)
+    tmp = emissions.results(columnar=True)
+    feps = FepsAccumulator()
+    feps.add(tmp)
+    return format_output(tmp, do_metric, output_columns, output_format), feps
+
+# - per-process state of the worker processes used by run_parallel_blocks()
+_worker = {}
+
+def _init_worker(burn_type, msg_level, fuel_loadings, no_sera, do_metric, output_columns, output_format):
+    # - the parent has already parsed the loadings file, so this is a read of the
+    #   on-disk loadings cache (or, with fork, of the inherited registry)
+    consumer = consume.FuelConsumption(fccs_file=fuel_loadings, msg_level=msg_level) \
+        if fuel_loadings else consume.FuelConsumption(msg_level=msg_level)
+    consumer.burn_type = burn_type
+    _worker.update(consumer=consumer, no_sera=no_sera, do_metric=do_metric, output_columns=output_columns,
+        output_format=output_format)
+
+def _run_worker_block(contents):
+    return run_block(_worker['consumer'], contents, _worker['no_sera'], _worker['do_metric'], _worker['output_columns'],
+        _worker['output_format'])
+
+def run_parallel_blocks(blocks, workers, initargs):
+    ''' Calculate blocks in a pool of worker processes, yielding the results in input
+        order. At most 2 * workers blocks are in flight so memory stays bounded.
+    '''
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = deque()
+        for contents in blocks:
+            pending.append(pool.submit(_run_worker_block, contents))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def count_input_rows(csv_input):
+    with open(csv_input, 'r') as infile:
+        return max(0, sum(1 for line in infile if line.strip()) - 1)
+
+def single_value_columns_identical(csv_input, burn_type):
+    ''' units (and fm_type for activity and mixed runs) must have one value for the whole
+        file. Loading a block only checks the rows of that block, so a file that is split
+        into blocks is checked here first, reading just those columns.
+    '''
+    columns = ['units'] + (['fm_type'] if burn_type in ['activity', 'mixed'] else [])
+    contents = pd.read_csv(csv_input, usecols=lambda c: c in columns)
+    for col in contents.columns:
+        if 1 != len(contents[col].unique()):
+            print("\nError: burn_type, units, and fm_type columns must have identical values.")
+            return False
+    return True
+
+def run_chunked(results, outfile, feps_input_filename, output_format='csv'):
+    ''' Write blocks of results as they arrive. Each block is appended to outfile, so
+        memory use depends on the block size rather than on the size of the input file.
+        outfile is only created (or replaced) once every block has succeeded; if one
+        fails, or raises, the blocks before it are discarded.
+    '''
+    feps = FepsAccumulator()
+    out = open_writer(outfile, output_format)
+    try:
+        for result in results:
+            if result is None:
+                out.abort()
+                return False
+            output, block_feps = result
+            feps.merge(block_feps)
+            # - csv: only the first block's header line is written
+            out.write(*output)
+            del result, output
+    except BaseException:
+        out.abort()
+        raise
+    if not out.started:
+        # - no blocks at all
+        out.abort()
+        return False
+    out.close()
+    feps.write(feps_input_filename)
+    return True
+
+def run(burn_type, csv_input, do_metric, msg_level, outfile, feps_input_filename, fuel_loadings=None, col_cfg=None, no_sera=False,
+        chunk_size=None, workers=1, output_format='csv'):
+    ''' Returns True if the results were written '''
     # validate alternate loadings file if provide. Throws exception on invalid
     if fuel_loadings: validate_fuel_loadings(fuel_loadings)
 
@@ -275,21 +498,50 @@ def run(burn_type, csv_input, do_metric, msg_level, outfile, feps_input_filename
     # run the calculator and either pickle results for later output
     #  or output as specified
     consumer.burn_type = burn_type
-    if consumer.load_scenario(csv_input, display=False):
-        emissions = consume.Emissions(consumer)
-        if no_sera:
-            emissions.no_sera = True
+
+    # - the output columns decide what is calculated, so read them first
+    output_columns = get_output_columns(col_cfg)
+
+    # - binary results go to a directory or npz file, the units file keeps the csv name
+    units_file = outfile
+    if 'csv' != output_format:
+        assert output_columns, "Error: the '{}' format needs a column configuration file".format(output_format)
+        outfile = binary_results.output_path(outfile, output_format)
+
+    # - block-wise processing only applies to csv output; pickled and raw output need everything at once
+    workers = workers if workers else 1
+    if (chunk_size or workers > 1) and output_columns:
+        if not chunk_size:
+            # - one shard per worker
+            chunk_size = max(1, -(-count_input_rows(csv_input) // workers))
+        if not single_value_columns_identical(csv_input, burn_type):
+            return False
+        blocks = pd.read_csv(csv_input, chunksize=chunk_size)
+        if workers > 1:
+            results = run_parallel_blocks(blocks, workers,
+                (burn_type, msg_level, fuel_loadings, no_sera, do_metric, output_columns, output_format))
         else:
-            emissions.no_sera = False
+            results = (run_block(consumer, contents, no_sera, do_metric, output_columns, output_format)
+                for contents in blocks)
+        if not run_chunked(results, outfile, feps_input_filename, output_format):
+            return False
+        write_units(units_file, do_metric)
+        print("\nSuccess!!! Results are in \"{}\"".format(outfile))
+        return True
 
-        results = emissions.results()
+    if consumer.load_scenario(csv_input, display=False):
+        emissions = make_emissions(consumer, no_sera, output_columns)
+        results = emissions.results(columnar=True)
 
-        write_results(results, outfile, feps_input_filename, do_metric, col_cfg_file=col_cfg)
+        write_results(results, outfile, feps_input_filename, do_metric, col_cfg_file=col_cfg,
+            output_columns=output_columns, output_format=output_format)
 
-        write_units(outfile, do_metric)
+        write_units(units_file, do_metric)
 
         if not pickle_output(col_cfg):
             print("\nSuccess!!! Results are in \"{}\"".format(outfile))
+        return True
+    return False
 
 #-------------------------------------------------------------------------------
 # Main
@@ -302,13 +554,17 @@ def main():
         if parser.no_sera == True:
             print("no_sera is True... run without SERA emissions values")
         
-        run(parser.burn_type, parser.csv_file, parser.do_metric, parser.msg_level, parser.output_filename, parser.feps_input_filename,
-            parser.fuel_loadings_file, parser.col_cfg_file, parser.no_sera)
+        if not run(parser.burn_type, parser.csv_file, parser.do_metric, parser.msg_level, parser.output_filename,
+                parser.feps_input_filename, parser.fuel_loadings_file, parser.col_cfg_file, parser.no_sera,
+                parser.chunk_size, parser.workers, parser.output_format):
+            sys.exit(1)
     except Exception as e:
         tb = sys.exc_info()[2]
         traceback.print_tb(tb, limit=-5, file=sys.stdout)
         print(e)
+        sys.exit(1)
         
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()    # - worker processes in the frozen executable
     main()
\ No newline at end of file
@@ -0,0 +1,199 @@
+''' ---------------------------------------------------------------------------
+Fast csv formatting of batch results.
+
+The output of consume_batch.py is mostly float columns rounded to a fixed
+number of decimals. DataFrame.to_csv() formats those one value at a time.
+Here a block of rows is formatted column by column with numpy: the digits of
+every rounded value are computed as integers and scattered into one byte
+buffer that holds the whole block, which is then written in one piece.
+
+The output is byte-identical to
+
+    df = pd.DataFrame.from_dict(dict(columns))
+    round_to(df).to_csv(outfile, index=False)
+
+i.e. floats are written as str() of the rounded value ('12.5', '-0.0',
+'1e+16'), NaN as an empty field, and text is quoted only when it has to be
+(csv.QUOTE_MINIMAL). Values the integer path can't represent (inf, very large
+values) fall back to str().
+---------------------------------------------------------------------------- '''
+import os
+import numpy as np
+
+# - rows per formatted block, bounds the temporary arrays
+BLOCK_ROWS = 16384
+
+# - rounded values below this are formatted from their digits, the rest with str()
+_FAST_LIMIT = 1e13
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+_COMMA = ord(',')
+_DOT = ord('.')
+_MINUS = ord('-')
+_ZERO = ord('0')
+
+def _quote(text, single_column=False):
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    # - the csv module writes an empty single-field row as "" so the row isn't blank
+    return '""' if single_column and not text else text
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+def _scatter(buf, starts, lengths, data):
+    ''' Copy the concatenated fields in data to buf, field i at starts[i] '''
+    if len(data):
+        offsets = np.cumsum(lengths) - lengths
+        buf[np.repeat(starts - offsets, lengths) + np.arange(len(data))] = data
+
+
+class _TextField(object):
+    ''' Fields formatted with str() '''
+    def __init__(self, values, single_column):
+        encoded = [_quote('' if _is_null(v) else str(v), single_column).encode('utf-8') for v in values]
+        self.lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self._data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    def write(self, buf, starts):
+        _scatter(buf, starts, self.lengths, self._data)
+
+
+class _FloatField(object):
+    ''' Rounded float64 values, formatted from their digits '''
+    def __init__(self, values, precision, single_column):
+        self._precision = precision
+        self._fast = np.isfinite(values) & (np.abs(values) < _FAST_LIMIT)
+        fast = values[self._fast]
+        self._negative = np.signbit(fast)
+        whole = np.abs(np.rint(fast * _POW10[precision])).astype(np.int64)
+        self._int, self._frac = np.divmod(whole, _POW10[precision])
+        self._int_digits = np.searchsorted(_POW10[1:], self._int, side='right') + 1
+        # - str() drops trailing zeros of the decimals but keeps at least one
+        self._frac_digits = np.full(len(fast), precision, dtype=np.int64)
+        for i in range(1, precision + 1):
+            self._frac_digits -= (self._frac % _POW10[i] == 0)
+        np.maximum(self._frac_digits, 1, out=self._frac_digits)
+
+        self.lengths = np.empty(len(values), dtype=np.int64)
+        self.lengths[self._fast] = self._negative + self._int_digits + 1 + self._frac_digits
+        self._slow = None
+        if not self._fast.all():
+            self._slow = _TextField(list(values[~self._fast]), single_column)
+            self.lengths[~self._fast] = self._slow.lengths
+
+    def write(self, buf, starts):
+        if self._slow is not None:
+            self._slow.write(buf, starts[~self._fast])
+        starts = starts[self._fast]
+        buf[starts[self._negative]] = _MINUS
+        first = starts + self._negative
+        for i in range(int(self._int_digits.max()) if len(first) else 0):
+            have = self._int_digits > i
+            buf[(first + self._int_digits - 1 - i)[have]] = _ZERO + (self._int[have] // _POW10[i]) % 10
+        dot = first + self._int_digits
+        buf[dot] = _DOT
+        for i in range(self._precision if self._precision else 1):
+            have = self._frac_digits > i
+            digit = (self._frac[have] // _POW10[self._precision - 1 - i]) % 10 if self._precision else 0
+            buf[(dot + 1 + i)[have]] = _ZERO + digit
+
+
+def _field(values, precision, rounded, single_column):
+    if not isinstance(values, np.ndarray):
+        array = np.asarray(values)
+        # - keep lists of text as they are, numpy would turn None and NaN into text
+        values = array if array.dtype.kind in 'biuf' else values
+    if not isinstance(values, np.ndarray):
+        return _TextField(values, single_column)
+    if rounded and values.dtype.kind in 'iu':
+        return _TextField(values.tolist(), single_column)
+    if rounded and values.dtype.kind == 'f':
+        values = np.round(values, precision)
+        if values.dtype == np.float64:
+            return _FloatField(values, precision, single_column)
+        return _TextField(values, single_column)
+    return _TextField(values.tolist() if values.dtype.kind in 'biuf' else values, single_column)
+
+def format_header(names, lineterminator=os.linesep):
+    ''' The header line for columns named names '''
+    line = ','.join([_quote(str(name), 1 == len(names)) for name in names])
+    return (line + lineterminator).encode('utf-8')
+
+def format_rows(columns, precision=2, exempt=(), lineterminator=os.linesep):
+    ''' Format the rows of columns, a list of (name, values) tuples, as csv and
+        return them as bytes, without a header. Numeric columns are rounded to
+        precision decimals except those named in exempt.
+    '''
+    return b''.join(iter_rows(columns, precision, exempt, lineterminator))
+
+def iter_rows(columns, precision=2, exempt=(), lineterminator=os.linesep, block_rows=BLOCK_ROWS):
+    ''' Like format_rows() but yields the csv text a block of rows at a time '''
+    if not columns:
+        return
+    nrows = len(columns[0][1])
+    terminator = np.frombuffer(lineterminator.encode('utf-8'), dtype=np.uint8)
+    single_column = 1 == len(columns)
+    for begin in range(0, nrows, block_rows):
+        end = min(nrows, begin + block_rows)
+        fields = [_field(values[begin:end], precision, name not in exempt, single_column)
+            for name, values in columns]
+
+        row_lengths = np.full(end - begin, len(fields) - 1 + len(terminator), dtype=np.int64)
+        for field in fields:
+            row_lengths += field.lengths
+        pos = np.cumsum(row_lengths) - row_lengths
+        buf = np.empty(int(row_lengths.sum()), dtype=np.uint8)
+        for i, field in enumerate(fields):
+            field.write(buf, pos)
+            pos += field.lengths
+            if i < len(fields) - 1:
+                buf[pos] = _COMMA
+                pos += 1
+        for i, c in enumerate(terminator):
+            buf[pos + i] = c
+        yield buf.tobytes()
+
+
+class CsvWriter(object):
+    ''' Writes csv blocks to a file as they become available. Only the first
+        header passed to write() is kept. The blocks go to a temporary file next
+        to outfile, which replaces outfile when the writer is closed; abort()
+        removes it, so a run that fails part way leaves no partial results.
+    '''
+    def __init__(self, outfile, buffer_size=1 << 22):
+        self.outfile = outfile
+        self._tmp_file = '{}.{}.part'.format(outfile, os.getpid())
+        self._out = open(self._tmp_file, 'wb', buffering=buffer_size)
+        self.started = False
+
+    def write(self, header, rows):
+        if not self.started:
+            self._out.write(header)
+            self.started = True
+        self._out.write(rows)
+
+    def close(self):
+        ''' Finish the file and move it into place, replacing any existing outfile '''
+        self._out.close()
+        os.replace(self._tmp_file, self.outfile)
+
+    def abort(self):
+        self._out.close()
+        if os.path.exists(self._tmp_file):
+            os.remove(self._tmp_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+def write_csv(outfile, columns, precision=2, exempt=()):
+    ''' Write columns, a list of (name, values) tuples, to outfile '''
+    with CsvWriter(outfile) as out:
+        out.write(format_header([name for name, values in columns]), b'')
+        for rows in iter_rows(columns, precision, exempt):
+            out.write(b'', rows)
@@ -9,6 +9,9 @@
 #-------------------------------------------------------------------------------
 import os
 import sys
+import heapq
+import itertools
+import tempfile
 import pandas as pd
 import numpy as np
 import pickle
@@ -18,10 +21,16 @@ import re
 import argparse
 import logging
 import unit_convert
+import binary_results
 
 CONSUME_RESULTS = 'consume_results.csv'
 FEPS_FILE = 'feps_input_from_consume.csv'
 
+# - rows per block when results files are merged, bounds the memory use
+MERGE_CHUNK_ROWS = 50000
+# - fuelbeds read from each run at a time during a merge
+MERGE_KEY_ROWS = 1024
+
 TONS_PER_ACRE_TO_MG_PER_ACRE = 2.24170231  # tons/acre to Mg/ha
 LBS_PER_ACRE_TO_KG_PER_HA = 1.12085116
 
@@ -229,9 +238,10 @@ def make_parser():
     # - build the parser
     parser = argparse.ArgumentParser()
 
-    # - specify a pickle file(s). If multiple, results are combined
+    # - specify a results file(s). If multiple, results are combined
     parser.add_argument('-r', action='store', nargs='*', dest='results_files', metavar='results files',
-        help='Specify the name of the file(s) with results. More than one will be combined')
+        help='Specify the name of the file(s) with results: csv files, or npy directories or npz files \
+            written with consume_batch.py --format. More than one will be combined')
 
     # - specify metric conversion for all columns
     parser.add_argument('--metric', dest='do_metric', action='store_true',
@@ -297,69 +307,143 @@ class PostProcessParser(object):
 #-------------------------------------------------------------------------------
 # Custom sorting strategy. Needs to stay in sync with FFT
 #-------------------------------------------------------------------------------
-def sort_fuelbeds(df):
+def fuelbed_sort_key(fuelbed):
     ''' Fuelbed number is actually a string and can be anything. However, to get nicer sorting
         we are using the following strategy:
             - try to break the string into an initial numeric component and a string remainder
             - sort on the components
-        To sort the dataframe you need to add a column that ties the sorting strategy to an existing
-        column. Then you sort by the ranking column (the one you added).
+        Fuelbeds without a numeric component sort after all of those with one. Ties (the same
+        fuelbed, or e.g. '7a' and '07a', which have the same key) are left in input order by
+        sort_fuelbeds() and merge_results(). The sort_values() ranking this replaced was not
+        stable, so it left tied rows in no particular order.
+    '''
+    m = re.match('^([0-9]+)(.*$)', fuelbed)
+    if m and 2 == m.lastindex:
+        return (int(m.group(1)), m.group(2))
+    return (sys.maxsize, fuelbed)
+
+def normalize_fuelbeds(fuelbeds):
+    ''' Fuelbeds as text, with all-digit ones written as the number ('052' becomes '52'),
+        which is how they come out when the results files are read as numbers.
+    '''
+    text = pd.Series(fuelbeds, dtype=object).astype(str)
+    digits = text.str.fullmatch('[0-9]+')
+    text[digits] = text[digits].str.lstrip('0').replace('', '0')
+    return text.values
+
+def sort_fuelbeds(df):
+    ''' Sort the rows of a results DataFrame by fuelbed (see fuelbed_sort_key()). Rows with
+        the same fuelbed keep their order.
     '''
-    def sort_chunkify(s):
-        ''' Break into numeric and other '''
-        m = re.match('^([0-9]+)(.*$)', s)
-        retval = (sys.maxsize, s, s)
-        if m:
-            if 2 == m.lastindex:
-                retval = (int(m.group(1)), m.group(2), s)
-        return retval
-
-    def sort_sort_and_flatten(results):
-        ''' Incoming argument is a dictionary of lists:
-            - the keys are the numeric component, sort them
-            - if the value portion has more than one element sort that list
-            - add single or sorted lists
-        '''
-        flattened = []
-        for key in sorted(results.keys()):
-            if 1 == len(results[key]):
-                flattened.extend(results[key])
-            else:
-                flattened.extend(sorted(results[key], key=lambda tup: tup[1]))
-        return flattened
-
-    result = {}
     df[['fuelbeds']] = df[['fuelbeds']].astype(str)
-    for item in df.fuelbeds:
-        chunked = sort_chunkify(str(item))
-        if chunked[0] in result.keys():
-            result[chunked[0]].append(chunked)
-        else:
-            result[chunked[0]] = [chunked]
-    sorted_list = sort_sort_and_flatten(result)
-    ranking_column = dict([(v[2], i) for i, v in enumerate(sorted_list)])
-    df['Fb_Rank'] = df.fuelbeds.map(ranking_column)
-    #df.sort(['Fb_Rank'], inplace = True)
-    df.sort_values(by=['Fb_Rank'], inplace = True)
-    return df.drop('Fb_Rank', 1)
+    keys = [fuelbed_sort_key(item) for item in df.fuelbeds]
+    return df.iloc[sorted(range(len(keys)), key=keys.__getitem__)]
+
+def read_results_chunks(results_file, chunk_rows=MERGE_CHUNK_ROWS):
+    ''' Read a results file as DataFrames of at most chunk_rows rows. The file is csv, or the
+        binary columns written by consume_batch.py --format (see binary_results.py), which
+        are read as arrays without parsing any text.
+    '''
+    if binary_results.is_binary_results(results_file):
+        results = binary_results.BinaryResults(results_file)
+        try:
+            for start in range(0, results.rows, chunk_rows):
+                rows = slice(start, start + chunk_rows)
+                chunk = pd.DataFrame(dict([(name, results.take(name, rows)) for name in results]),
+                    columns=list(results))
+                chunk['fuelbeds'] = normalize_fuelbeds(chunk['fuelbeds'])
+                yield chunk
+        finally:
+            results.close()
+    else:
+        # - fuelbeds are read as text so the type doesn't depend on the rows in a chunk
+        for chunk in pd.read_csv(results_file, chunksize=chunk_rows, dtype={'fuelbeds': str}):
+            chunk['fuelbeds'] = normalize_fuelbeds(chunk['fuelbeds'])
+            yield chunk
+
+def results_columns(results_file):
+    ''' The column names of a results file '''
+    if binary_results.is_binary_results(results_file):
+        results = binary_results.BinaryResults(results_file)
+        results.close()
+        return list(results)
+    return list(pd.read_csv(results_file, nrows=0).columns)
 
 #-------------------------------------------------------------------------------
 # Take a list of results, combine if necessary. You could have a list of results because FFT
 #  runs activity and natural scenarios and then combines the results.
+#
+# Any number of results files are merged with an external merge sort: each file is read
+#  a block at a time, each block is sorted and saved as a run (a binary results directory,
+#  see binary_results.py), and the runs are merged on the fuelbed sort key. The merged rows
+#  come out a block at a time, so memory use depends on the block size and the number of
+#  runs, not on the size of the files.
 #-------------------------------------------------------------------------------
+def _run_keys(run, run_index):
+    ''' (sort key, run, row) of each row of a sorted run, in order '''
+    for start in range(0, run.rows, MERGE_KEY_ROWS):
+        fuelbeds = run.take('fuelbeds', slice(start, start + MERGE_KEY_ROWS))
+        for row, fuelbed in enumerate(fuelbeds, start):
+            yield (fuelbed_sort_key(str(fuelbed)), run_index, row)
+
+def _gather(runs, columns, run_ids, rows):
+    ''' The block of merged rows, run_ids[i] and rows[i] are the run and row of row i '''
+    parts = []
+    for run_index in np.unique(run_ids):
+        positions = np.flatnonzero(run_ids == run_index)
+        run = runs[run_index]
+        parts.append(pd.DataFrame(dict([(name, run.take(name, rows[positions])) for name in run]),
+            columns=list(run), index=positions))
+    return pd.concat(parts).sort_index().reindex(columns=columns).reset_index(drop=True)
+
+def merge_results(all_results, chunk_rows=MERGE_CHUNK_ROWS, tmp_parent=None):
+    ''' Merge any number of results files, yielding the rows sorted by fuelbed as DataFrames
+        of at most chunk_rows rows. Rows with the same sort key keep the order of the files and
+        of the rows within them: all of the tied rows of the first file, in file order, then
+        those of the second file, and so on (the old two-file sort mixed them in no particular
+        order). The columns are those of all of the files, in the order they
+        are first seen. The runs are kept in a temporary directory in tmp_parent.
+    '''
+    columns = []
+    for results_file in all_results:
+        columns.extend([name for name in results_columns(results_file) if name not in columns])
+
+    with tempfile.TemporaryDirectory(prefix='post_process.', dir=tmp_parent) as tmp_dir:
+        runs = []
+        for results_file in all_results:
+            for chunk in read_results_chunks(results_file, chunk_rows):
+                chunk = sort_fuelbeds(chunk)
+                run_dir = os.path.join(tmp_dir, 'run{:05d}'.format(len(runs)))
+                with binary_results.BinaryWriter(run_dir, 'npy') as out:
+                    out.write([(name, chunk[name].values) for name in chunk.columns])
+                runs.append(binary_results.BinaryResults(run_dir))
+
+        merged = heapq.merge(*[_run_keys(run, i) for i, run in enumerate(runs)])
+        done = False
+        while True:
+            picked = list(itertools.islice(merged, chunk_rows))
+            if not picked:
+                break
+            run_ids = np.array([p[1] for p in picked])
+            rows = np.array([p[2] for p in picked])
+            del picked
+            yield _gather(runs, columns, run_ids, rows)
+            done = True
+        if not done:
+            # - no rows at all, still yield the columns
+            yield pd.DataFrame(columns=columns)
+        del merged, runs
+
 def get_combined_results(all_results):
+    ''' All of the results files merged into one DataFrame, see merge_results() '''
     df = None
     if len(all_results) > 0:
-        df = pd.read_csv(all_results[0])
-        if 2 == len(all_results):
-            df2 = pd.read_csv(all_results[1])
-            df = pd.concat([df, df2])
-        df = sort_fuelbeds(df)
+        df = pd.concat(list(merge_results(all_results)), ignore_index=True)
     else:
         print("\nError: results file corrupted.\n")
     return df
 
-def write_results_feps(results, directory):
+def write_results_feps(results, directory, append=False):
     df = pd.DataFrame({
         'fuelbeds': results.get('fuelbeds'),
         'cons_flm': results.get('c_total_f'),
@@ -370,7 +454,7 @@ def write_results_feps(results, directory):
     })
     try:
         feps_file = os.path.join(directory, FEPS_FILE)
-        df.to_csv(feps_file, index=False)
+        df.to_csv(feps_file, index=False, header=not append, mode='a' if append else 'w')
     except Exception as e:
         print('\nException in write_results_feps() : {}'.format(e))
 
@@ -402,13 +486,24 @@ def convert_units(all_results, do_metric):
 #-------------------------------------------------------------------------------
 # Main
 #-------------------------------------------------------------------------------
+def write_combined_results(all_results, output_file, do_metric, feps_directory, chunk_rows=MERGE_CHUNK_ROWS):
+    ''' Merge the results files, convert the units, and write the output and FEPS files
+        in one pass, a block of rows at a time
+    '''
+    first = True
+    with open(output_file, 'w', newline='') as out:
+        for block in merge_results(all_results, chunk_rows, os.path.dirname(output_file)):
+            if len(block):
+                block = convert_units(block, do_metric)
+            write_results_feps(block, feps_directory, append=not first)
+            block.to_csv(out, index=False, header=first)
+            first = False
+
 def main():
     parser = PostProcessParser()
     parser.do_parse(sys.argv)
-    results = get_combined_results(parser.results_files)
-    results = convert_units(results, parser.do_metric)
-    write_results_feps(results, os.path.split(parser.results_files[0])[0])
-    results.to_csv(parser.output_file, index=False)
+    write_combined_results(parser.results_files, parser.output_file, parser.do_metric,
+        os.path.split(parser.results_files[0])[0])
 
 if __name__ == '__main__':
     main()
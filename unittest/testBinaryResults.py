@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import binary_results
+
+class TestBinaryResults(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_blocks(self, outfile, output_format):
+        with binary_results.BinaryWriter(outfile, output_format) as out:
+            out.write([('fuelbeds', ['1', '52']), ('filename', np.array([np.nan, np.nan])),
+                ('c_total', np.array([1.5, 2.25])), ('count', np.array([1, 2]))])
+            out.write([('fuelbeds', ['7a']), ('filename', ['loadings.csv']),
+                ('c_total', np.array([-0.0])), ('count', np.array([np.nan]))])
+        # - nothing is left behind but the output
+        self.assertEqual([os.path.basename(outfile)], os.listdir(self.tmp_dir))
+
+    def check_results(self, results):
+        self.assertEqual(3, results.rows)
+        self.assertEqual(['fuelbeds', 'filename', 'c_total', 'count'], list(results))
+        self.assertEqual(['1', '52', '7a'], list(results['fuelbeds']))
+        self.assertTrue(np.isnan(results['filename'][0]))
+        self.assertEqual('loadings.csv', results['filename'][2])
+        np.testing.assert_array_equal(np.array([1.5, 2.25, -0.0]), results['c_total'])
+        self.assertTrue(np.signbit(results['c_total'][2]))
+        # - an int column with a NaN in a later block becomes float
+        np.testing.assert_array_equal(np.array([1.0, 2.0, np.nan]), results['count'])
+        df = results.to_dataframe(['c_total', 'fuelbeds'])
+        self.assertEqual(['c_total', 'fuelbeds'], list(df.columns))
+
+    def test_npy(self):
+        outfile = os.path.join(self.tmp_dir, 'results')
+        self.write_blocks(outfile, 'npy')
+        self.assertTrue(binary_results.is_binary_results(outfile))
+        results = binary_results.BinaryResults(outfile)
+        self.assertTrue(isinstance(results['c_total'], np.memmap))
+        self.check_results(results)
+
+    def test_npz(self):
+        outfile = os.path.join(self.tmp_dir, 'results.npz')
+        self.write_blocks(outfile, 'npz')
+        self.assertTrue(binary_results.is_binary_results(outfile))
+        results = binary_results.BinaryResults(outfile)
+        self.check_results(results)
+        results.close()
+
+        # - the columns are plain .npy members, so numpy can read them too
+        with np.load(outfile, allow_pickle=False) as npz:
+            np.testing.assert_array_equal(np.array([1.5, 2.25, -0.0]), npz['c002'])
+
+    def test_replace_and_abort(self):
+        outfile = os.path.join(self.tmp_dir, 'results')
+        self.write_blocks(outfile, 'npy')
+        with binary_results.BinaryWriter(outfile, 'npy') as out:
+            out.write([('c_total', np.array([3.0]))])
+        self.assertEqual(['c_total'], list(binary_results.BinaryResults(outfile)))
+
+        try:
+            with binary_results.BinaryWriter(outfile, 'npy') as out:
+                out.write([('c_total', np.array([4.0]))])
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual([3.0], list(binary_results.BinaryResults(outfile)['c_total']))
+        self.assertEqual(['results'], os.listdir(self.tmp_dir))
+
+    def test_output_path(self):
+        self.assertEqual('out', binary_results.output_path('out.csv', 'npy'))
+        self.assertEqual('out.npz', binary_results.output_path('out.CSV', 'npz'))
+        self.assertEqual('out.bin', binary_results.output_path('out.bin', 'npz'))
+        self.assertFalse(binary_results.is_binary_results(os.path.join(self.tmp_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
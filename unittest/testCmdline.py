@@ -59,6 +59,41 @@ class TestCmdline(unittest.TestCase):
         self.assertEqual(p.fuel_loadings_file, os.path.abspath('consume_batch.py'))
         self.assertEqual(p.col_cfg_file, os.path.abspath('consume_batch.py'))
 
+    def testPassingWithChunkSize(self):
+        ''' Use consume_batch.py as a file that should always be there
+        '''
+        p = cmd.ConsumeParser()
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py'])
+        self.assertEqual(p.chunk_size, None)
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py', '--chunksize', '5000'])
+        self.assertEqual(p.chunk_size, 5000)
+        self.assertRaises(cmd.ConsumeParserException, p.do_parse,
+            ['app_name_placeholder', 'natural', 'consume_batch.py', '--chunksize', '0'])
+
+    def testPassingWithWorkers(self):
+        ''' Use consume_batch.py as a file that should always be there
+        '''
+        p = cmd.ConsumeParser()
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py'])
+        self.assertEqual(p.workers, 1)
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py', '--workers', '4'])
+        self.assertEqual(p.workers, 4)
+        self.assertRaises(cmd.ConsumeParserException, p.do_parse,
+            ['app_name_placeholder', 'natural', 'consume_batch.py', '--workers', 'x'])
+
+    def testPassingWithFormat(self):
+        ''' Use consume_batch.py as a file that should always be there
+        '''
+        p = cmd.ConsumeParser(['pickle'])
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py'])
+        self.assertEqual(p.output_format, 'csv')
+        p.do_parse(['app_name_placeholder', 'natural', 'consume_batch.py', '--format', 'NPZ'])
+        self.assertEqual(p.output_format, 'npz')
+        self.assertRaises(cmd.ConsumeParserException, p.do_parse,
+            ['app_name_placeholder', 'natural', 'consume_batch.py', '--format', 'hdf5'])
+        self.assertRaises(cmd.ConsumeParserException, p.do_parse,
+            ['app_name_placeholder', 'natural', 'consume_batch.py', '--format', 'npy', '-x', 'pickle'])
+
     def testBadBurnType(self):
         p = cmd.ConsumeParser()
         try:
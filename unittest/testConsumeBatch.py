@@ -0,0 +1,65 @@
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+import pandas as pd
+import consume_batch
+
+class TestConsumeBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def input_file(self, **columns):
+        filename = os.path.join(self.tmp_dir, 'input.csv')
+        pd.DataFrame(dict(fuelbeds=['1', '2', '3', '4'], **columns)).to_csv(filename, index=False)
+        return filename
+
+    def test_single_value_columns(self):
+        same = self.input_file(units=['tons_ac'] * 4, fm_type=['MEAS-Th'] * 4)
+        self.assertTrue(consume_batch.single_value_columns_identical(same, 'activity'))
+
+        # - a later block with another fm_type fails, even though each block on its own would pass
+        mixed = self.input_file(units=['tons_ac'] * 4, fm_type=['MEAS-Th', 'MEAS-Th', 'NFDRS-Th', 'NFDRS-Th'])
+        self.assertFalse(consume_batch.single_value_columns_identical(mixed, 'activity'))
+        self.assertFalse(consume_batch.single_value_columns_identical(mixed, 'mixed'))
+        # - natural runs don't use fm_type
+        self.assertTrue(consume_batch.single_value_columns_identical(mixed, 'natural'))
+
+        units = self.input_file(units=['tons_ac', 'tons_ac', 'tons', 'tons'])
+        self.assertFalse(consume_batch.single_value_columns_identical(units, 'natural'))
+
+    def test_failed_block(self):
+        here = os.path.dirname(os.path.abspath(consume_batch.__file__))
+        contents = pd.read_csv(os.path.join(here, 'test', 'regression_input_western.csv')).iloc[:20]
+        col_cfg = os.path.join(here, 'output_all.csv')
+        outfile = os.path.join(self.tmp_dir, 'out.csv')
+        feps_file = os.path.join(self.tmp_dir, 'feps.csv')
+
+        def run(filename, **kwargs):
+            return consume_batch.run('natural', filename, False, logging.ERROR, outfile, feps_file, col_cfg=col_cfg, **kwargs)
+
+        # - a value that doesn't validate in the last block
+        invalid = os.path.join(self.tmp_dir, 'invalid.csv')
+        contents.assign(fm_duff=[80] * 17 + [-500] * 3).to_csv(invalid, index=False)
+        for kwargs in [dict(chunk_size=5), dict(chunk_size=5, workers=2), dict(chunk_size=5, output_format='npz'), {}]:
+            self.assertFalse(run(invalid, **kwargs), kwargs)
+            self.assertEqual(['invalid.csv'], os.listdir(self.tmp_dir), kwargs)
+
+        # - an unknown fuelbed raises, and still leaves no output
+        unknown = os.path.join(self.tmp_dir, 'unknown.csv')
+        contents.assign(fuelbeds=['1'] * 17 + ['99999'] * 3).to_csv(unknown, index=False)
+        with self.assertRaises(AssertionError):
+            run(unknown, chunk_size=5)
+        self.assertEqual(['invalid.csv', 'unknown.csv'], sorted(os.listdir(self.tmp_dir)))
+
+        self.assertTrue(run(os.path.join(here, 'test', 'regression_input_western.csv'), chunk_size=100))
+        self.assertTrue(os.path.exists(outfile))
+
+
+if __name__ == '__main__':
+    unittest.main()
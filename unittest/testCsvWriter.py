@@ -0,0 +1,61 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import csv_writer
+
+def to_csv(columns, precision=2, exempt=('fuelbeds', 'filename')):
+    ''' What DataFrame.to_csv() writes for the rounded columns '''
+    df = pd.DataFrame.from_dict(dict(columns))
+    for col in df.columns:
+        if col not in exempt:
+            df[col] = np.round(df.get(col), precision)
+    return df.to_csv(index=False).encode('utf-8')
+
+class TestCsvWriter(unittest.TestCase):
+
+    def format(self, columns, precision=2, exempt=('fuelbeds', 'filename')):
+        return csv_writer.format_header([name for name, values in columns]) + \
+            csv_writer.format_rows(columns, precision, exempt)
+
+    def test_edge_values(self):
+        values = np.array([0.0, -0.0, 0.004, -0.004, 0.005, 0.015, 1.005, 2.675, 12.5, -12.5, 100.0,
+            123456.785, 9999999999999.99, 1e13, -1e16, 1e300, 1e-5, np.nan, np.inf, -np.inf])
+        columns = [('fuelbeds', ['1', 'a,b', 'say "x"', '', None, np.nan] * 3 + ['52', '2']),
+            ('area', values), ('count', np.arange(len(values))), ('listed', list(values[::-1]))]
+        for precision in [2, 0, 3]:
+            self.assertEqual(to_csv(columns, precision), self.format(columns, precision))
+
+    def test_random_values(self):
+        rng = np.random.default_rng(1)
+        for scale in [1e-3, 1.0, 1e4, 1e12, 1e15]:
+            columns = [('c_{}'.format(i), rng.normal(0, scale, 5000)) for i in range(4)]
+            self.assertEqual(to_csv(columns), self.format(columns))
+
+    def test_blocks(self):
+        columns = [('fuelbeds', [str(i) for i in range(100)]), ('value', np.linspace(-3, 3, 100))]
+        blocks = list(csv_writer.iter_rows(columns, 2, ('fuelbeds',), block_rows=7))
+        self.assertEqual(15, len(blocks))
+        self.assertEqual(to_csv(columns), csv_writer.format_header(['fuelbeds', 'value']) + b''.join(blocks))
+
+    def test_single_column(self):
+        columns = [('value', np.array([np.nan, 1.0]))]
+        self.assertTrue(self.format(columns).startswith(('value' + os.linesep + '""' + os.linesep).encode()))
+        self.assertEqual(to_csv(columns), self.format(columns))
+
+    def test_write_csv(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            outfile = os.path.join(tmp_dir, 'out.csv')
+            columns = [('fuelbeds', ['1', '2']), ('value', np.array([0.123, 4.0]))]
+            csv_writer.write_csv(outfile, columns, 2, ('fuelbeds',))
+            with open(outfile, 'rb') as infile:
+                self.assertEqual(to_csv(columns), infile.read())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+import consume
+from consume.emissions_db import EmissionsFactorDB, SeraFactorTable
+import consume.data_desc as dd
+import helper
+
+class TestEmissionsDB(unittest.TestCase):
+
+    def setUp(self):
+        self._db = EmissionsFactorDB()
+
+    def test_factor_array(self):
+        ''' The dense factor array holds the same numbers as the per-group dictionaries '''
+        groups = sorted(self._db.data.keys())
+        factors = self._db.get_factors(groups)
+        self.assertEqual((len(groups), len(dd.EmissionsSpecies), 4), factors.shape)
+        co2 = dd.EmissionsSpecies.index('co2')
+        nh3 = dd.EmissionsSpecies.index('nh3')
+        for i, group in enumerate(groups):
+            data = self._db.data[group]
+            self.assertEqual(data['CO2_flaming'], factors[i, co2, 0])
+            self.assertEqual(data['CO2_smold_resid'], factors[i, co2, 1])
+            self.assertEqual(data['CO2_smold_resid'], factors[i, co2, 2])
+            self.assertEqual(0.0, factors[i, co2, 3])
+            self.assertTrue(np.all(0.0 == factors[i, nh3]))
+
+        # - repeated and unordered group ids
+        picked = self._db.get_factors([groups[-1], groups[0], groups[-1]])
+        self.assertTrue(np.array_equal(factors[[-1, 0, -1]], picked))
+        self.assertRaises(AssertionError, self._db.get_factors, [max(groups) + 1000])
+
+    def test_get_efgs(self):
+        ''' All-at-once lookup of the emissions factor groups matches the per-fuelbed lookup '''
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'natural'
+        db = EmissionsFactorDB(fuel_consumption_object=fc)
+        fuelbeds = list(fc.FCCS.loadings_data_.fccs_id.values[:5]) * 2
+        expected = [db._get_emissions_factor_eqid(f)['natural'] for f in fuelbeds]
+        self.assertEqual(expected, db.get_efgs(fuelbeds))
+
+    def test_sera_factor_table(self):
+        ''' Each cover type is resolved once and gathered per fuelbed '''
+        table = SeraFactorTable()
+        cover_types = [13, 4, 13, 4, 13]
+        factors = table.gather(cover_types)
+        self.assertEqual((5, len(dd.EmissionsSpecies), 4), factors.shape)
+        self.assertEqual(2, len(table._factors))
+        for i, ct in enumerate(cover_types):
+            self.assertTrue(np.array_equal(table.get(ct), factors[i]))
+
+        pm25 = table.get(13)[dd.EmissionsSpecies.index('pm25')]
+        pm10 = table.get(13)[dd.EmissionsSpecies.index('pm10')]
+        self.assertTrue(np.array_equal(pm25[:2] * 1.111, pm10[:2]))
+        self.assertEqual(pm25[1], pm25[2])
+        self.assertTrue(np.all(0.0 == table.get(13)[dd.EmissionsSpecies.index('nmhc')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -113,6 +113,63 @@ class TestFCCSDB(unittest.TestCase):
             self.assertFalse(True, msg='Error: No info returned from info()')
 
 
+    def test_positions(self):
+        ids = self.db.loadings_data_.fccs_id
+        pos = self.db.positions(['1', 52, 'not-a-fuelbed', 1])
+        self.assertEqual(4, len(pos))
+        self.assertEqual('1', ids.iloc[pos[0]])
+        self.assertEqual('52', ids.iloc[pos[1]])
+        self.assertEqual(-1, pos[2])
+        self.assertEqual(pos[0], pos[3])
+
+    def test_gather(self):
+        pos = self.db.positions(['52', '1', '52'])
+        LD = self.db.gather(pos)
+        self.assertEqual(3, len(LD))
+        self.assertTrue(LD.data.flags['C_CONTIGUOUS'])
+        self.assertEqual(['52', '1', '52'], list(LD['fccs_id']))
+        for col in ['litter_loading', 'duff_upper_depth', 'shrub_prim_pctlv']:
+            expected = self.db.loadings_data_[col].values[pos]
+            self.assertTrue((expected == LD[col]).all(), col)
+
+    def test_gather_tiled(self):
+        import numpy as np
+        pos = self.db.positions(['52', '1'])
+        scale = {'litter_loading': np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])}
+        LD = self.db.gather(pos, repeats=3, scale=scale)
+        self.assertEqual(6, len(LD))
+        self.assertEqual(['52', '1'] * 3, list(LD['fccs_id']))
+        litter = self.db.loadings_data_['litter_loading'].values[pos]
+        self.assertTrue((np.tile(litter, 3) * scale['litter_loading'] == LD['litter_loading']).all())
+        # - a column is expanded once, then the same read-only array is returned
+        self.assertTrue(LD['litter_loading'] is LD['litter_loading'])
+        self.assertFalse(LD['litter_loading'].flags['WRITEABLE'])
+        self.assertEqual(2, LD.data.shape[1])
+
+        # - only the requested columns, scaled the same way
+        columns = ('pile_clean_loading', 'litter_loading')
+        part = self.db.gather(pos, repeats=3, scale=scale, columns=columns)
+        self.assertEqual((2, 2), part.data.shape)
+        self.assertEqual(columns, part.columns)
+        for col in columns:
+            self.assertTrue((LD[col] == part[col]).all(), col)
+        self.assertTrue((LD.take([1, 4])['litter_loading'] == part.take([1, 4])['litter_loading']).all())
+        flat = self.db.gather(pos, columns=columns)
+        self.assertTrue((self.db.gather(pos)['pile_clean_loading'] == flat['pile_clean_loading']).all())
+        self.assertRaises(KeyError, lambda: flat['duff_upper_depth'])
+
+    def test_column_projection(self):
+        from consume import data_desc as dd
+        engine_columns = set(dict(dd.LoadDefs).get(c, c) for c in dd.list_engine_load_columns())
+        self.assertTrue(set(self.db.loadings_data_.columns).issubset(engine_columns))
+        self.assertTrue(self.db.descriptive_data_ is None)
+        self.db.info('1', detail=False, ret=True)
+        self.assertFalse(self.db.descriptive_data_ is None)
+
+        full = FCCSDB(load_all_columns=True)
+        for c in self.db.loadings_data_.columns:
+            self.assertTrue((self.db.loadings_data_[c].values == full.loadings_data_[c].values).all(), c)
+
     def test_check_info(self):
         check_good = self.db.info('1', detail=False, ret=True)
         self.assertTrue('not found' not in check_good)
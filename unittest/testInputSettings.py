@@ -265,6 +265,47 @@ class TestInputSettings(unittest.TestCase):
         do_failed_load(data, 'units', 'tons_ac')
         do_failed_load(data, 'fm_type', 'MEAS-Th')
         do_failed_load(data, 'ecoregion', 'southern')
+
+    def test_unique_rows(self):
+        ''' Repeated scenarios are found, in input order, and subset() selects them '''
+        s = ConsumeInputSettings()
+        s.burn_type = 'natural'
+        s.set('fuelbeds', [1, 2, 1, 1, 2])
+        s.set('fm_duff', [10, 20, 10, 15, 20])
+        s.set('ecoregion', pan.Series(['western', 'western', 'western', 'western', 'boreal']))
+        s.set('area', [100])
+        first, inverse = s.unique_rows()
+        self.assertEqual([0, 1, 3, 4], list(first))
+        self.assertEqual([0, 1, 0, 2, 3], list(inverse))
+
+        sub = s.subset(first)
+        self.assertEqual('natural', sub.burn_type)
+        self.assertEqual(['1', '2', '1', '2'], sub.get('fuelbeds'))
+        self.assertEqual([10, 20, 15, 20], list(sub.get('fm_duff')))
+        self.assertEqual(['western', 'western', 'western', 'boreal'], list(sub.get('ecoregion')))
+        self.assertEqual([100], list(sub.get('area')))
+
+    def test_version(self):
+        ''' The version changes with the settings that affect the calculations, not units '''
+        s = ConsumeInputSettings()
+        versions = [s.version]
+        s.burn_type = 'activity'
+        versions.append(s.version)
+        s.fm_type = 'MEAS-Th'
+        versions.append(s.version)
+        s.set('fm_duff', [10, 20])
+        versions.append(s.version)
+        self.assertEqual(len(versions), len(set(versions)))
+
+        s.units = 'kg_ha'
+        s.set('fm_duff', [-10])
+        s.burn_type = 'kjell'
+        self.assertEqual(versions[-1], s.version)
+
+        # - a copy has a version of its own
+        self.assertNotEqual(s.version, s.subset([0]).version)
+        s.reset_to_empty()
+        self.assertNotEqual(versions[-1], s.version)
             
         '''
                 retval = {
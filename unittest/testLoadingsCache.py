@@ -0,0 +1,96 @@
+import unittest
+import os
+import shutil
+import tempfile
+import pandas as pan
+from consume import loadings_cache
+from consume.fccs_db import _load_data_from_csv
+import helper
+
+class TestLoadingsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.loadings_file = os.path.join(self.tmp_dir, 'loadings.csv')
+        shutil.copy(helper.get_test_loadingsfile(), self.loadings_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        parsed, metadata = _load_data_from_csv(self.loadings_file)
+        self.assertTrue(os.path.isdir(loadings_cache.cache_dir_for(self.loadings_file)))
+        cached, cached_metadata = _load_data_from_csv(self.loadings_file)
+        pan.testing.assert_frame_equal(parsed, cached, check_exact=True)
+        self.assertEqual(metadata, cached_metadata)
+
+    def test_invalidation(self):
+        _load_data_from_csv(self.loadings_file)
+        signature = loadings_cache.file_signature(self.loadings_file)
+        self.assertTrue(loadings_cache.read(self.loadings_file, signature))
+
+        with open(self.loadings_file, 'a') as outfile:
+            outfile.write('\n')
+        changed = loadings_cache.file_signature(self.loadings_file)
+        self.assertNotEqual(signature['sha1'], changed['sha1'])
+        self.assertEqual(None, loadings_cache.read(self.loadings_file, changed))
+
+    def test_keep_current_cache(self):
+        parsed, metadata = _load_data_from_csv(self.loadings_file)
+        cache_dir = loadings_cache.cache_dir_for(self.loadings_file)
+        marker = os.path.join(cache_dir, 'marker')
+        open(marker, 'w').close()
+
+        # - a second writer keeps the cache that is already there
+        signature = loadings_cache.file_signature(self.loadings_file)
+        self.assertTrue(loadings_cache.write(self.loadings_file, parsed, {}, signature))
+        self.assertTrue(os.path.exists(marker))
+        self.assertEqual([os.path.basename(cache_dir)],
+            [f for f in os.listdir(self.tmp_dir) if loadings_cache.CACHE_SUFFIX in f])
+
+        # - a stale one is replaced
+        changed = dict(signature, sha1='0')
+        self.assertTrue(loadings_cache.write(self.loadings_file, parsed, {}, changed))
+        self.assertFalse(os.path.exists(marker))
+        self.assertTrue(loadings_cache.read(self.loadings_file, changed))
+
+    def test_remove(self):
+        other = os.path.join(self.tmp_dir, 'loadings.csv.bak.csv')
+        shutil.copy(self.loadings_file, other)
+        for loadings_file, variant in [(self.loadings_file, 'all'), (self.loadings_file, 'engine'), (other, 'all')]:
+            parsed, metadata = _load_data_from_csv(loadings_file)
+            signature = loadings_cache.file_signature(loadings_file)
+            self.assertTrue(loadings_cache.write(loadings_file, parsed, {}, signature, variant))
+
+        # - every variant goes, the caches of other files stay
+        loadings_cache.remove(self.loadings_file)
+        self.assertEqual([os.path.basename(loadings_cache.cache_dir_for(other))],
+            [f for f in os.listdir(self.tmp_dir) if loadings_cache.CACHE_SUFFIX in f])
+
+    def test_registry(self):
+        registry = loadings_cache.LoadingsRegistry(max_entries=1)
+        first = registry.get(self.loadings_file, _load_data_from_csv)
+        self.assertTrue(first is registry.get(self.loadings_file, _load_data_from_csv))
+        stats = registry.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertTrue(stats['bytes'] > 0)
+
+        # - rewriting the file in place must not return stale data
+        with open(self.loadings_file, 'a') as outfile:
+            outfile.write('\n')
+        os.utime(self.loadings_file, ns=(0, 0))
+        self.assertFalse(first is registry.get(self.loadings_file, _load_data_from_csv))
+        self.assertEqual(1, registry.stats()['invalidations'])
+
+        # - only max_entries files are kept
+        other = os.path.join(self.tmp_dir, 'other.csv')
+        shutil.copy(helper.get_test_loadingsfile(), other)
+        registry.get(other, _load_data_from_csv)
+        stats = registry.stats()
+        self.assertEqual(1, stats['entries'])
+        self.assertEqual(1, stats['evictions'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import pandas as pan
+import consume
+from consume import monte_carlo as mc
+import helper
+
+class TestMonteCarlo(unittest.TestCase):
+
+    def _consumer(self):
+        scenarios = pan.read_csv(helper.get_test_inputfile()).iloc[:5]
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'natural'
+        self.assertTrue(fc.load_scenario_from_dataframe(scenarios, display=False))
+        return fc
+
+    def test_running_moments(self):
+        data = np.random.default_rng(0).normal(3.0, 2.0, (250, 2, 3))
+        moments = mc.RunningMoments((2, 3))
+        for batch in np.array_split(data, 7):
+            moments.add(batch)
+        self.assertTrue(np.allclose(data.mean(axis=0), moments.mean))
+        self.assertTrue(np.allclose(data.var(axis=0, ddof=1), moments.variance()))
+
+    def test_p2_quantile(self):
+        data = np.random.default_rng(1).lognormal(0.0, 0.5, (5000, 4))
+        for p in [0.05, 0.5, 0.95]:
+            estimator = mc.P2Quantile(p, (4,))
+            for x in data:
+                estimator.add(x)
+            expected = np.quantile(data, p, axis=0)
+            self.assertTrue(np.allclose(expected, estimator.value, rtol=0.05), p)
+
+        # - exact for the first few observations
+        estimator = mc.P2Quantile(0.5, (4,))
+        for x in data[:3]:
+            estimator.add(x)
+        self.assertTrue(np.array_equal(np.median(data[:3], axis=0), estimator.value))
+
+    def test_no_variation(self):
+        ''' With nothing varied every draw is the deterministic result '''
+        fc = self._consumer()
+        expected = consume.Emissions(fc).results()
+        summary = mc.MonteCarlo(fc).run(7, batch_size=3, species=['co2', 'pm25'])
+        self.assertEqual(['pm25', 'co2'], list(summary['emissions'].keys()))
+        total = expected['consumption']['summary']['total']
+        for i, phase in enumerate(['flaming', 'smoldering', 'residual', 'total']):
+            self.assertTrue(np.allclose(total[phase], summary['consumption']['mean'][i]))
+            self.assertTrue(np.allclose(expected['emissions']['co2'][phase],
+                summary['emissions']['co2']['quantiles'][1][i]))
+        self.assertTrue(np.allclose(0, summary['consumption']['std']))
+
+    def test_reproducible(self):
+        def run(seed):
+            sim = mc.MonteCarlo(self._consumer(), seed=seed)
+            sim.vary('fm_duff', mc.normal(10))
+            sim.scale_loadings('duff_upper_loading', mc.lognormal(0.3))
+            return sim.run(20, batch_size=8, species=['co2'])
+        first = run(3)
+        self.assertTrue(np.array_equal(first['consumption']['mean'], run(3)['consumption']['mean']))
+        self.assertTrue((first['consumption']['std'][3] > 0).any())
+        quantiles = first['emissions']['co2']['quantiles']
+        self.assertTrue((quantiles[0] <= quantiles[2]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
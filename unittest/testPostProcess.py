@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import binary_results
+import post_process as pp
+
+class TestPostProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def results_file(self, name, fuelbeds, c_total_f, **extra):
+        df = pd.DataFrame(dict(fuelbeds=fuelbeds, c_total_f=c_total_f, **extra))
+        filename = os.path.join(self.tmp_dir, name)
+        df.to_csv(filename, index=False)
+        return filename
+
+    def test_sort_key(self):
+        fuelbeds = ['52', 'abc', '7b', '1000', '7a', '7', 'ab', '052x']
+        self.assertEqual(['7', '7a', '7b', '52', '052x', '1000', 'ab', 'abc'],
+            sorted(fuelbeds, key=pp.fuelbed_sort_key))
+
+    def test_merge(self):
+        first = self.results_file('natural.csv', ['52', '7', 'x', '7'], [1.0, 2.0, 3.0, 4.0])
+        second = self.results_file('activity.csv', ['7', '1000', '52'], [5.0, 6.0, 7.0], filename=['a', 'b', 'c'])
+        third = os.path.join(self.tmp_dir, 'third')
+        with binary_results.BinaryWriter(third, 'npy') as out:
+            out.write([('fuelbeds', np.array(['8', '7'])), ('c_total_f', np.array([8.0, 9.0]))])
+
+        for chunk_rows in [1, 2, 100]:
+            df = pd.concat(list(pp.merge_results([first, second, third], chunk_rows, self.tmp_dir)))
+            self.assertEqual(['fuelbeds', 'c_total_f', 'filename'], list(df.columns))
+            self.assertEqual(['7', '7', '7', '7', '8', '52', '52', '1000', 'x'], list(df.fuelbeds))
+            # - the same fuelbed keeps the order of the files and of the rows
+            self.assertEqual([2.0, 4.0, 5.0, 9.0, 8.0, 1.0, 7.0, 6.0, 3.0], list(df.c_total_f))
+            self.assertEqual(['c', 'b'], list(df.filename[df.fuelbeds.isin(['52', '1000'])].dropna()))
+            # - the runs are removed
+            self.assertEqual([], [f for f in os.listdir(self.tmp_dir) if f.startswith('post_process.')])
+
+    def test_merge_ties(self):
+        first = self.results_file('natural.csv', ['7', '52', '07', '7', '52'], [1.0, 2.0, 3.0, 4.0, 5.0])
+        second = self.results_file('activity.csv', ['52', '7', '7'], [6.0, 7.0, 8.0])
+        for chunk_rows in [1, 2, 100]:
+            df = pd.concat(list(pp.merge_results([first, second], chunk_rows, self.tmp_dir)))
+            # - '07' is written as '7', see normalize_fuelbeds()
+            self.assertEqual(['7', '7', '7', '7', '7', '52', '52', '52'], list(df.fuelbeds))
+            # - tied rows of the first file in their order, then those of the second
+            self.assertEqual([1.0, 3.0, 4.0, 7.0, 8.0, 2.0, 5.0, 6.0], list(df.c_total_f))
+
+        expected = pp.get_combined_results([first, second])
+        self.assertEqual([1.0, 3.0, 4.0, 7.0, 8.0, 2.0, 5.0, 6.0], list(expected.c_total_f))
+
+    def test_zero_padded_fuelbeds(self):
+        # - written the way a numeric read of the results gives them, as the old code did
+        self.assertEqual(['52', '0', '7', '052x', 'x01'], list(pp.normalize_fuelbeds(['052', '000', '7', '052x', 'x01'])))
+        first = self.results_file('natural.csv', ['052', '7'], [1.0, 2.0])
+        second = os.path.join(self.tmp_dir, 'second')
+        with binary_results.BinaryWriter(second, 'npy') as out:
+            out.write([('fuelbeds', np.array(['0052', '007a'])), ('c_total_f', np.array([3.0, 4.0]))])
+        df = pp.get_combined_results([first, second])
+        self.assertEqual(['7', '007a', '52', '52'], list(df.fuelbeds))
+        self.assertEqual([2.0, 4.0, 1.0, 3.0], list(df.c_total_f))
+
+        output_file = os.path.join(self.tmp_dir, 'out.csv')
+        pp.write_combined_results([first], output_file, False, self.tmp_dir)
+        self.assertEqual(['7', '52'], list(pd.read_csv(output_file, dtype={'fuelbeds': str}).fuelbeds))
+
+    def test_write_combined_results(self):
+        first = self.results_file('natural.csv', ['52', '7'], [1.0, 2.0], c_upperduff=[0.5, 0.25])
+        second = self.results_file('activity.csv', ['10'], [3.0], c_upperduff=[1.0])
+        output_file = os.path.join(self.tmp_dir, 'out.csv')
+
+        pp.write_combined_results([first, second], output_file, True, self.tmp_dir, chunk_rows=1)
+        expected = pp.convert_units(pp.get_combined_results([first, second]), True)
+        with open(output_file, 'r') as infile:
+            self.assertEqual(expected.to_csv(index=False), infile.read())
+        self.assertEqual(['7', '10', '52'], list(expected.fuelbeds))
+        self.assertAlmostEqual(2.0 * pp.TONS_PER_ACRE_TO_MG_PER_ACRE, expected.c_total_f.iloc[0])
+
+        feps = pd.read_csv(os.path.join(self.tmp_dir, pp.FEPS_FILE))
+        self.assertEqual([7, 10, 52], list(feps.fuelbeds))
+        np.testing.assert_array_equal(expected.c_upperduff.values, feps.cons_duff_upper.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
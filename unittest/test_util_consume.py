@@ -45,6 +45,20 @@ class TestGlobalFunctions(unittest.TestCase):
         self.assertTrue(np.allclose(data.copy() * 2.24170231, cvt_help(data, 'tons_ac', 'tonnes_ha')))
         self.assertTrue(np.allclose(data.copy() * 224.170231, cvt_help(data, 'tons_ac', 'tonnes_km^2')))
 
+    def testcsdist_out(self):
+        tot = np.array([1., 3., 0., 7.5])
+        csd = [0.6, 0.3, 0.1]
+        out = np.full((2, 4, 4), -1.)
+        util.csdist(tot, csd, out[1])
+        self.assertTrue(np.array_equal(util.csdist(tot, csd), out[1]))
+        self.assertTrue(np.all(-1. == out[0]))
+
+    def testsum_into(self):
+        parts = np.random.RandomState(1).rand(5, 4, 3)
+        out = np.full((4, 3), 99.)
+        util.sum_into(out, parts[[2, 0, 4]])
+        self.assertTrue(np.array_equal(sum([parts[2], parts[0], parts[4]]), out))
+
     def testget_consume_version(self):
         pass
 
@@ -1,6 +1,10 @@
 #This file was originally generated by PyScripter's unitest wizard
 
 import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pan
 import consume
 import helper
 
@@ -61,6 +65,246 @@ class TestFuelConsumption(unittest.TestCase):
                 self.assertTrue(out[key][i] == 0.0, msg="Not zero {}:{}".format(key, i))
         '''
 
+    def test_dedup(self):
+        ''' Repeated scenarios are calculated once and give the same results '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        repeated = pan.concat([scenarios] * 3, ignore_index=True)
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            repeated.to_csv(infile, index=False)
+            results = []
+            for dedup in [True, False]:
+                fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+                fc.burn_type = 'natural'
+                fc.deduplicate = dedup
+                self.assertTrue(fc.load_scenario(infile, display=False))
+                fc.results()
+                results.append((fc.dedup_stats, fc._cons_data, fc._cons_data_piles))
+        finally:
+            os.unlink(infile)
+
+        self.assertEqual({'rows': len(repeated), 'unique': len(scenarios)}, results[0][0])
+        self.assertEqual({'rows': len(repeated), 'unique': len(repeated)}, results[1][0])
+        self.assertTrue(np.array_equal(results[1][1], results[0][1]))
+        self.assertTrue(np.array_equal(results[1][2], results[0][2]))
+
+    def test_strata(self):
+        ''' Each stratum calculated on its own matches the full calculation '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        activity = scenarios.assign(windspeed=5, slope=10, length_of_ignition=10, fm_10hr=10,
+            days_since_rain=4, fm_type='MEAS-Th')
+        for burn_type, contents in [('natural', scenarios), ('activity', activity)]:
+            fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            fc.burn_type = burn_type
+            self.assertTrue(fc.load_scenario_from_dataframe(contents, display=False))
+            fc.results()
+            full = fc._cons_data.copy()
+            for i, stratum in enumerate(consume.data_desc.ConsumptionStrata):
+                fc.results(strata=[stratum])
+                self.assertTrue(np.array_equal(full[i], fc._cons_data[i]), (burn_type, stratum))
+                if 'summary' != stratum[0]:
+                    # - the total needs everything, so it can't have been calculated
+                    self.assertTrue(np.isnan(fc._cons_data[0]).all())
+
+            fc.results(strata=['canopy', ('woody fuels', 'piles')])
+            self.assertTrue(np.array_equal(full[[1, 7, 27]], fc._cons_data[[1, 7, 27]]))
+            self.assertTrue(np.isnan(fc._cons_data[[0, 2, 6, 20, 31]]).all())
+
+    def test_mixed_burn_types(self):
+        ''' A mixed run gives each row the results of its own burn type '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        activity = scenarios.assign(windspeed=5, slope=10, length_of_ignition=10, fm_10hr=10,
+            days_since_rain=4, fm_type='MEAS-Th')
+        is_activity = np.arange(len(scenarios)) % 3 == 1
+        mixed = activity.assign(burn_type=np.where(is_activity, 'activity', 'natural'))
+
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'mixed'
+        fc.incremental = True
+        self.assertTrue(fc.load_scenario_from_dataframe(mixed, display=False))
+        results = consume.Emissions(fc).results()
+        self.assertEqual(['natural', 'activity', 'natural'], list(results['parameters']['burn_type'][:3]))
+
+        for burn_type, contents, rows in [('natural', scenarios, ~is_activity), ('activity', activity, is_activity)]:
+            single = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            single.burn_type = burn_type
+            self.assertTrue(single.load_scenario_from_dataframe(contents[rows], display=False))
+            expected = consume.Emissions(single).results()
+            self.assertTrue(np.array_equal(single._cons_data, fc._cons_data[:, :, rows]), burn_type)
+            self.assertTrue(np.array_equal(expected['emissions']['pm25']['total'],
+                results['emissions']['pm25']['total'][rows]), burn_type)
+
+        fc.canopy_consumption_pct = np.asarray(fc.canopy_consumption_pct) * 0.5
+        fc.results()
+        self.assertEqual(['canopy'], fc.recalculated)
+
+    def test_columnar_results(self):
+        ''' Columnar results hold views of the arrays under the flattened dictionary names '''
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'natural'
+        self.assertTrue(fc.load_scenario_from_dataframe(pan.read_csv(helper.get_test_inputfile()), display=False))
+        emissions = consume.Emissions(fc)
+        columns = emissions.results(columnar=True)
+        self.assertTrue(isinstance(columns, consume.ConsumeResults))
+
+        def flatten(d, prefix=()):
+            for k, v in d.items():
+                if isinstance(v, dict):
+                    yield from flatten(v, prefix + (k,))
+                else:
+                    yield '_'.join(prefix + (k,)).replace(' ', '_'), v
+        expected = dict(flatten(columns.to_dict()))
+        self.assertEqual(sorted(expected.keys()), sorted(columns.keys()))
+        for name, value in expected.items():
+            self.assertTrue(np.array_equal(np.asarray(value), np.asarray(columns[name])), name)
+        self.assertTrue(np.shares_memory(columns['consumption_summary_total_flaming'], fc._cons_data))
+        self.assertTrue(np.shares_memory(columns['emissions_stratum_co2_canopy_total'], emissions._emis_data))
+        self.assertEqual(len(columns['parameters_fuelbeds']), columns.rows)
+
+        keys = consume.consume_results.column_keys()
+        self.assertEqual(('summary', 'total', 'flaming', None), keys['consumption_summary_total_flaming'])
+        self.assertEqual(('woody fuels', '10k+-hr fuels rotten', 'total', None),
+            keys['consumption_woody_fuels_10k+-hr_fuels_rotten_total'])
+        self.assertEqual(('summary', 'ground fuels', 'residual', 'pm25'), keys['emissions_stratum_pm25_ground_fuels_residual'])
+
+    def test_incremental(self):
+        ''' Changing one setting recalculates only the strata that depend on it '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        activity = scenarios.assign(windspeed=5, slope=10, length_of_ignition=10, fm_10hr=10,
+            days_since_rain=4, fm_type='MEAS-Th')
+        changes = [
+            ('natural', scenarios, 'fuel_moisture_duff_pct', ['litter', 'lichen', 'moss', 'duff',
+                'basal accumulations', 'squirrel middens']),
+            ('natural', scenarios, 'canopy_consumption_pct', ['canopy']),
+            ('activity', activity, 'canopy_consumption_pct', ['canopy']),
+            ('activity', activity, 'duff_pct_available', ['woody', 'lichen', 'moss', 'litter',
+                'duff upper', 'duff lower', 'ff redux proportion', 'basal accumulations', 'squirrel middens'])]
+        for burn_type, contents, setting, expected in changes:
+            fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            fc.burn_type = burn_type
+            fc.incremental = True
+            self.assertTrue(fc.load_scenario_from_dataframe(contents, display=False))
+            emissions = consume.Emissions(fc)
+            emissions.results()
+            setattr(fc, setting, np.asarray(getattr(fc, setting)) * 0.5)
+            changed = emissions.results()
+            self.assertEqual(expected, fc.recalculated)
+
+            fresh = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            fresh.burn_type = burn_type
+            self.assertTrue(fresh.load_scenario_from_dataframe(contents, display=False))
+            setattr(fresh, setting, np.asarray(getattr(fresh, setting)) * 0.5)
+            expected_results = consume.Emissions(fresh).results()
+            # - incremental is opt-in, by default no copy of the results is kept
+            self.assertEqual({}, fresh._node_cache)
+            self.assertTrue(np.array_equal(fresh._cons_data, fc._cons_data))
+            self.assertTrue(np.array_equal(expected_results['emissions']['co2']['total'],
+                changed['emissions']['co2']['total']))
+
+    def test_output_units(self):
+        ''' Non-default output units stay right over repeated results() and setting changes '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        def make(duff_pct=None):
+            fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            fc.burn_type = 'natural'
+            self.assertTrue(fc.load_scenario_from_dataframe(scenarios, display=False))
+            if duff_pct is not None:
+                fc.fuel_moisture_duff_pct = duff_pct
+            emissions = consume.Emissions(fc)
+            emissions.output_units = 'kg_ha'
+            return fc, emissions
+
+        def check(expected, results):
+            self.assertEqual(list(expected['parameters']['units']), list(results['parameters']['units']))
+            self.assertTrue(np.allclose(expected['consumption']['summary']['total']['total'],
+                results['consumption']['summary']['total']['total']))
+            self.assertTrue(np.allclose(expected['emissions']['co2']['total'], results['emissions']['co2']['total']))
+
+        fc, emissions = make()
+        expected = make()[1].results()
+        check(expected, emissions.results())
+        check(expected, emissions.results())
+
+        duff_pct = np.asarray(fc.fuel_moisture_duff_pct) * 0.5
+        fc.fuel_moisture_duff_pct = duff_pct
+        check(make(duff_pct)[1].results(), emissions.results())
+
+    def test_scenario_grid(self):
+        ''' A scenario grid gives the same results as the equivalent list of rows '''
+        scenarios = pan.read_csv(helper.get_test_inputfile())
+        fuelbeds = list(scenarios.fuelbeds.unique()[:4])
+        settings = scenarios.drop(columns='fuelbeds').iloc[:3]
+
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'natural'
+        self.assertEqual(None, fc.grid_shape)
+        self.assertTrue(fc.load_scenario_grid(fuelbeds, settings, display=False))
+        self.assertEqual((3, 4), fc.grid_shape)
+        grid = consume.Emissions(fc).grid_results()
+
+        rows = settings.iloc[np.repeat(np.arange(3), 4)].reset_index(drop=True)
+        rows['fuelbeds'] = fuelbeds * 3
+        flat = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        flat.burn_type = 'natural'
+        self.assertTrue(flat.load_scenario_from_dataframe(rows, display=False))
+        expected = consume.Emissions(flat).results()
+
+        self.assertEqual((3, 4), grid['parameters']['fuelbeds'].shape)
+        self.assertEqual(fuelbeds, list(grid['parameters']['fuelbeds'][2]))
+        for key in ['total', 'woody fuels']:
+            self.assertTrue(np.array_equal(expected['consumption']['summary'][key]['total'],
+                grid['consumption']['summary'][key]['total'].ravel()))
+        self.assertTrue(np.array_equal(expected['emissions']['pm25']['flaming'],
+            grid['emissions']['pm25']['flaming'].ravel()))
+
+        # - a loadings scale is picked up without a settings change
+        emissions = consume.Emissions(fc)
+        before = emissions.results()['consumption']['summary']['total']['total'].copy()
+        fc.set_loadings_scale({'litter_loading': np.full(12, 2.0)})
+        after = emissions.results()['consumption']['summary']['total']['total']
+        self.assertTrue((after >= before).all() and (after > before).any())
+        fc.replace_settings(flat._settings)
+        self.assertEqual(None, fc.grid_shape)
+        self.assertTrue(np.array_equal(expected['consumption']['summary']['total']['total'],
+            emissions.results()['consumption']['summary']['total']['total']))
+
+    def test_emissions_leave_consumption(self):
+        ''' Emissions calculations don't modify the consumption results they read '''
+        fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+        fc.burn_type = 'natural'
+        self.assertTrue(fc.load_scenario(helper.get_test_inputfile(), display=False))
+        fc.results()
+        cons_data = fc._cons_data.copy()
+        for no_sera in [True, False]:
+            emissions = consume.Emissions(fc)
+            emissions.no_sera = no_sera
+            emissions.results()
+            self.assertTrue(np.array_equal(cons_data, fc._cons_data))
+
+    def test_emissions_selection(self):
+        ''' Selected species and strata give the same numbers as a full calculation '''
+        def run(species=None, strata='all'):
+            fc = consume.FuelConsumption(fccs_file=helper.get_test_loadingsfile())
+            fc.burn_type = 'natural'
+            self.assertTrue(fc.load_scenario(helper.get_test_inputfile(), display=False))
+            emissions = consume.Emissions(fc)
+            emissions.species = species
+            emissions.strata = strata
+            return emissions.results()['emissions']
+
+        full = run()
+        for strata in ['summary', 'first-order']:
+            some = run(['pm25', 'co2', 'nmhc'], strata)
+            self.assertEqual(['pm25', 'co2', 'nmhc'], [k for k in some.keys() if 'stratum' != k])
+            self.assertEqual('first-order' == strata, 'stratum' in some)
+            for species in ['pm25', 'co2', 'nmhc']:
+                for phase in ['flaming', 'smoldering', 'residual', 'total']:
+                    self.assertTrue(np.array_equal(full[species][phase], some[species][phase]))
+                    if 'stratum' in some:
+                        self.assertTrue(np.array_equal(full['stratum'][species]['woody fuels'][phase],
+                            some['stratum'][species]['woody fuels'][phase]))
+
     """
     def test_build_input_set(self):
         pass
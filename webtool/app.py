@@ -7,6 +7,7 @@ Routes:
   GET  /stream/<job_id>     → Server-Sent Events progress stream
   GET  /download/<job_id>/<filename>  → download a result file
   GET  /status/<job_id>     → JSON job status (for polling fallback)
+  GET  /loadings-cache      → JSON statistics of the shared loadings registry
 """
 
 import os
@@ -299,6 +300,14 @@ def status(job_id):
         })
 
 
+@app.route('/loadings-cache')
+def loadings_cache_stats():
+    err = _check_api_key()
+    if err:
+        return err
+    return jsonify(workflow.loadings_cache.REGISTRY.stats())
+
+
 @app.route('/download/<job_id>/<filename>')
 def download(job_id, filename):
     err = _check_api_key()
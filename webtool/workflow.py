@@ -25,6 +25,7 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 import consume_batch  # noqa: E402
+from consume import loadings_cache  # noqa: E402
 
 # ── scenario definitions ────────────────────────────────────────────────────
 
@@ -302,17 +303,26 @@ def run_consume(loadings_path, input_path, output_path, feps_path,
     progress(f'  output:   {output_path}')
     progress(f'  units:    {"metric" if do_metric else "imperial"}')
 
-    consume_batch.run(
-        burn_type=burn_type,
-        csv_input=input_path,
-        do_metric=do_metric,
-        msg_level=logging.ERROR,
-        outfile=output_path,
-        feps_input_filename=feps_path,
-        fuel_loadings=loadings_path,
-        col_cfg=col_cfg,
-        no_sera=False,
-    )
+    try:
+        consume_batch.run(
+            burn_type=burn_type,
+            csv_input=input_path,
+            do_metric=do_metric,
+            msg_level=logging.ERROR,
+            outfile=output_path,
+            feps_input_filename=feps_path,
+            fuel_loadings=loadings_path,
+            col_cfg=col_cfg,
+            no_sera=False,
+        )
+        stats = loadings_cache.REGISTRY.stats()
+        progress(f'  loadings cache: {stats["entries"]} file(s), {stats["bytes"] / 1e6:.1f} MB, '
+                 f'{stats["hits"]} hits / {stats["misses"]} misses')
+    finally:
+        # The loadings file is built for this job and used by this run only, so drop
+        # its parsed copy from the shared registry and its cache directories from disk
+        loadings_cache.REGISTRY.discard(loadings_path)
+        loadings_cache.remove(loadings_path)
 
     if os.path.exists(output_path):
         with open(output_path) as f: